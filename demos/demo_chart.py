@@ -11,7 +11,7 @@ Streamlit app template
 
 import streamlit as st 
 
-from os import mkdir, listdir
+from os import mkdir
 from os.path import exists, join, expanduser
 import pickle
 
@@ -21,6 +21,8 @@ import numpy as np
 import yfinance as yf
 import mplfinance as mpf
 # import talib as ta
+from mplfin_ta import wilder_rsi
+from mplfin_index import OTHER_SECTOR, SECTOR, get_chart_index
 
 import altair as alt
 from vega_datasets import data
@@ -92,23 +94,8 @@ def _MACD(df, fast_period=MACD_FAST, slow_period=MACD_SLOW, signal_period=MACD_S
 
 def _RSI(df, n=RSI_PERIOD, rsi_avg=RSI_AVG, band_width=0.5):
     # https://github.com/wgong/mplfinance/blob/master/examples/rsi.py
-    diff = df.w_p.diff().values
-    gains = diff
-    losses = -diff
-    with np.errstate(invalid='ignore'):
-        gains[(gains<0)|np.isnan(gains)] = 0.0
-        losses[(losses<=0)|np.isnan(losses)] = 1e-10 # we don't want divide by zero/NaN
-    m = (n-1) / n
-    ni = 1 / n
-    g = gains[n] = np.nanmean(gains[:n])
-    l = losses[n] = np.nanmean(losses[:n])
-    gains[:n] = losses[:n] = np.nan
-    for i,v in enumerate(gains[n:],n):
-        g = gains[i] = ni*v + m*g
-    for i,v in enumerate(losses[n:],n):
-        l = losses[i] = ni*v + m*l
-    rs = gains / losses
-    df['rsi'] = 100 - (100/(1+rs))
+    # Wilder smoothing is vectorized, see mplfin_ta.py
+    df['rsi'] = wilder_rsi(df.w_p.values, n)
     df["rsi_avg"] = df.rsi.ewm(span=rsi_avg).mean()
     df["rsi_u"] = df["rsi_avg"] + band_width
     df["rsi_d"] = df['rsi_avg'] - band_width
@@ -190,6 +177,7 @@ def _chart(ticker, chart_root=CHART_ROOT):
             figsize=(10,8),
             show_nontrading=True
         )
+    get_chart_index(chart_root).record(ticker, file_png, quote_date=df.index[-1])
     return file_png
 
 def _parse_tickers(s):
@@ -288,12 +276,20 @@ def do_mpl_chart():
     # st.json(images)
     
 def do_review(chart_root=CHART_ROOT):
-    files = [f for f in listdir(chart_root) if f.endswith(".png")]
-    tickers = [i.replace(".png", "") for i in files]
-    selected_tickers = st.multiselect("Select tickers", tickers, [])
+    # listed from the chart index (see mplfin_index.py), no directory scan
+    index = get_chart_index(chart_root)
+    sectors = sorted(set(SECTOR.values())) + [OTHER_SECTOR]
+    selected_sectors = st.multiselect("Sectors", sectors, [])
+    dates = st.date_input("Quote date (range)", value=[])
+    date_from, date_to = (dates[0], dates[-1]) if dates else (None, None)
+    df_charts = index.query(sectors=selected_sectors, date_from=date_from, date_to=date_to)
+    selected_tickers = st.multiselect("Select tickers", df_charts["ticker"].tolist(), [])
+    files = dict(zip(df_charts["ticker"], df_charts["file_img"]))
     for ticker in selected_tickers:
-        file_png = join(chart_root, f"{ticker}.png")
-        st.image(file_png)
+        if not exists(files[ticker]):
+            index.delete([ticker])
+            continue
+        st.image(files[ticker])
 
 #####################################################
 # menu_items
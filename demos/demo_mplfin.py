@@ -7,16 +7,43 @@ Streamlit ETF app
     - https://share.streamlit.io/wgong/streamlitapp/main/demos/demo_mplfin.py
 """
 import streamlit as st
+from streamlit.runtime.scriptrunner import RerunException, StopException, get_script_run_ctx
+from streamlit.runtime.scriptrunner.script_requests import ScriptRequestType
 from datetime import datetime
-from PIL import Image
 from pathlib import Path
 import re
-import pickle
 from traceback import format_exc
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+from itertools import chain
+import time
 import pandas as pd
-import numpy as np
-import yfinance as yf
-import mplfinance as mpf
+
+from mplfin_core import (
+    MAX_NUM_TICKERS, NUM_DAYS_QUOTE, NUM_DAYS_PLOT, NUM_WORKERS, TICKER_TIMEOUT,
+    FIGURE_WIDTH, FIGURE_HEIGHT, CHART_STYLE, CHART_STYLES, YELLOW, CHART_ROOT, QUOTE_ROOT, USE_QUOTE_STORE,
+    CHART_MAX_BYTES, CHART_MAX_FILES, IMAGE_ROOT, COMPACT_CACHE, RSI_PERIOD,
+    _fetch_quote, _fetch_quotes, _calculate_ta, _chart_ta, _chart_worker, _persist_chart, _ta_params,
+)
+from mplfin_store import get_quote_store
+from mplfin_quotes import get_provider
+from mplfin_fetch import fetch_checkpoint
+from mplfin_compact import compact_quotes, expand_quotes, memory_report
+from mplfin_resample import HISTORY_DAYS, get_bars, quote_days
+from mplfin_stream import get_ta_engine
+from mplfin_cache import ta_key, render_key, get_render_cache, get_ta_cache
+from mplfin_panel import QuotePanel, panel_ta, screener
+from mplfin_backtest import MODES, THRESHOLD, COST_BPS, backtest, sector_stats, sweep
+from mplfin_corr import BENCHMARK, CORR_WINDOW, close_frame, corr_heatmap, get_corr_engine, relative_strength
+from mplfin_sweep import DEFAULT_GRID, METRICS, PARAMS, best_by_sector, get_sweep, heatmap_chart, settings
+from mplfin_calendar import quote_epoch, quote_expiry
+from mplfin_etf import WATCH_ETF, ETF_DATA, ETF_SECTORS
+from mplfin_manifest import get_manifest, params_key
+from mplfin_index import OTHER_SECTOR, get_chart_index
+from mplfin_janitor import ChartJanitor
+from mplfin_images import get_image_cache
+from mplfin_interactive import MAX_CANDLES, candlestick_chart, get_payload
+from mplfin_intraday import INTRADAY_INTERVALS, IntradayPoller, is_intraday
+from mplfin_alerts import RULE_COLUMNS, RULE_KINDS, AlertScanner, AlertStore
 
 # Initial page config
 st.set_page_config(
@@ -27,115 +54,8 @@ st.set_page_config(
 
 @st.experimental_memo
 def _load_etf_df():
-    WATCH_ETF = """
-        #####  watch
-        - SPY,SILJ,GDX,AXU,EXK,DBA,WEAT,KHC,TSN,UNG,FCG,XLE,XLB,URA,EWA,XME, tap, argt
-        #####  index-sector
-        - SPY,QQQ,DIA,IWM,SDS,QID,DXD,XLU,XLRE,XLE,XLB,XME,XLK,XLF,XLV,XLI,XLP,XLY,XLC,UUP, FXE, FXY, BITO
-        #####  commodity-agri-metal
-        - GSG,DBC,GLD,SLV,GDX,SILJ,COPX,URA,PALL,LIT,DBA,MOO,RJA,CORN,WEAT,COW,JO,WOOD,PHO
-        #####  overseas
-        - SCHF,SCHC,GWX,EWG,EWQ,EWU,SCZ,ENZL,EWA,EWC,EWW,EWJ,EWY,EWT,IZRL,EIS
-        - EFA,MCHI,FXI,KWEB,ASHR,INDA,RSX,EWZ,ARGT,EZA,KSA,TUR
-        #####  tech-energy
-        - VGT,CLOU,IGV,SMH,USO,BNO,DBO,UNG,BOIL,GRN,ICLN
-    """
-
-    # etf_df = pd.read_csv("./data/wl_futures_etf.csv")
-    etf_data = [
-        {'symbol': 'SPY', 'name': 'S&P 500', 'sector': 'Equity Index', 'order': 0.1} ,
-        {'symbol': 'QQQ', 'name': 'Nasdaq 100', 'sector': 'Equity Index', 'order': 0.2} ,
-        {'symbol': 'DIA', 'name': 'Dow 30', 'sector': 'Equity Index', 'order': 0.3} ,
-        {'symbol': 'IWM', 'name': 'Russell 2000', 'sector': 'Equity Index', 'order': 0.4} ,
-        {'symbol': 'SDS', 'name': 'Short S&P 500', 'sector': 'Equity Index', 'order': 0.7} ,
-        {'symbol': 'QID', 'name': 'Short Nasdaq 100', 'sector': 'Equity Index', 'order': 0.8} ,
-        {'symbol': 'DXD', 'name': 'Short Dow 30', 'sector': 'Equity Index', 'order': 0.9} ,
-        {'symbol': 'XLE', 'name': 'Energy', 'sector': 'Sector', 'order': 1.001} ,
-        {'symbol': 'XME', 'name': 'Metal', 'sector': 'Sector', 'order': 1.002} ,
-        {'symbol': 'XLK', 'name': 'Technology', 'sector': 'Sector', 'order': 1.01} ,
-        {'symbol': 'XLF', 'name': 'Financials', 'sector': 'Sector', 'order': 1.02} ,
-        {'symbol': 'XLV', 'name': 'Health-care', 'sector': 'Sector', 'order': 1.03} ,
-        {'symbol': 'XLI', 'name': 'Industrials', 'sector': 'Sector', 'order': 1.04} ,
-        {'symbol': 'XLB', 'name': 'Materials', 'sector': 'Sector', 'order': 1.05} ,
-        {'symbol': 'XLP', 'name': 'Consumer Staples', 'sector': 'Sector', 'order': 1.06} ,
-        {'symbol': 'XLY', 'name': 'Consumer Discretionary', 'sector': 'Sector', 'order': 1.07} ,
-        {'symbol': 'XLC', 'name': 'Communication Services', 'sector': 'Sector', 'order': 1.08} ,
-        {'symbol': 'XLU', 'name': 'Utilities', 'sector': 'Sector', 'order': 1.09} ,
-        {'symbol': 'XLRE', 'name': 'Real Estate', 'sector': 'Sector', 'order': 1.11} ,
-        {'symbol': 'VGT', 'name': 'Vanguard IT', 'sector': 'Technology', 'order': 2.1} ,
-        {'symbol': 'CLOU', 'name': 'Global X Cloud Computing', 'sector': 'Technology', 'order': 2.2} ,
-        {'symbol': 'IGV', 'name': 'Tech-Software', 'sector': 'Technology', 'order': 2.3} ,
-        {'symbol': 'SMH', 'name': 'Semiconductor Index', 'sector': 'Technology', 'order': 2.4} ,
-        {'symbol': 'UUP', 'name': 'US Dollar', 'sector': 'Currency', 'order': 3.01} ,
-        {'symbol': 'CYB', 'name': 'China Yuan', 'sector': 'Currency', 'order': 3.02} ,
-        {'symbol': 'FXE', 'name': 'Euro', 'sector': 'Currency', 'order': 3.03} ,
-        {'symbol': 'FXY', 'name': 'Japan Yen', 'sector': 'Currency', 'order': 3.04} ,
-        {'symbol': 'UDN', 'name': 'US Dollar - Short', 'sector': 'Currency', 'order': 3.09} ,
-        {'symbol': 'BITO', 'name': 'ProShares Bitcoin Strategy', 'sector': 'Currency', 'order': 3.11} ,
-        {'symbol': 'USO', 'name': 'United States Oil Fund LP', 'sector': 'Energy', 'order': 4.01} ,
-        {'symbol': 'BNO', 'name': 'United States Brent Oil Fund LP', 'sector': 'Energy', 'order': 4.02} ,
-        {'symbol': 'DBO', 'name': 'Invesco DB Oil Fund', 'sector': 'Energy', 'order': 4.03} ,
-        {'symbol': 'UNG', 'name': 'United States Natural Gas Fund LP', 'sector': 'Energy', 'order': 4.05} ,
-        {'symbol': 'BOIL', 'name': 'ProShares Ultra Bloomberg Natural Gas', 'sector': 'Energy', 'order': 4.06} ,
-        {'symbol': 'GRN', 'name': 'iPath Series B Carbon ETN', 'sector': 'Energy-Clean', 'order': 4.11} ,
-        {'symbol': 'ICLN', 'name': 'iShares Global Clean Energy', 'sector': 'Energy-Clean', 'order': 4.12} ,
-        {'symbol': 'GSG', 'name': 'iShares S&P GSCI Commodity-Indexed Trust', 'sector': 'Commodity', 'order': 5.1} ,
-        {'symbol': 'DBC', 'name': 'Invesco DB Commodity Index Tracking Fund', 'sector': 'Commodity', 'order': 5.2} ,
-        {'symbol': 'GLD', 'name': 'Gold', 'sector': 'Metal', 'order': 6.1} ,
-        {'symbol': 'SLV', 'name': 'Silver', 'sector': 'Metal', 'order': 6.2} ,
-        {'symbol': 'GDX', 'name': 'Gold miner', 'sector': 'Metal', 'order': 6.3} ,
-        {'symbol': 'SILJ', 'name': 'Silver miner', 'sector': 'Metal', 'order': 6.4} ,
-        {'symbol': 'COPX', 'name': 'Copper Fund', 'sector': 'Metal', 'order': 6.5} ,
-        {'symbol': 'URA', 'name': 'Global X Uranium', 'sector': 'Metal', 'order': 6.6} ,
-        {'symbol': 'PALL', 'name': 'Palladium', 'sector': 'Metal', 'order': 6.7} ,
-        {'symbol': 'LIT', 'name': 'Global X Lithium & Battery Tech ', 'sector': 'Metal', 'order': 6.8} ,
-        {'symbol': 'DBA', 'name': 'Invesco DB Agriculture Fund', 'sector': 'Agri', 'order': 7.01} ,
-        {'symbol': 'MOO', 'name': 'VanEck Vectors Agribusiness', 'sector': 'Agri', 'order': 7.02} ,
-        {'symbol': 'RJA', 'name': 'Elements Agriculture', 'sector': 'Agri', 'order': 7.03} ,
-        {'symbol': 'CORN', 'name': 'Teucrium Corn Fund', 'sector': 'Agri', 'order': 7.05} ,
-        {'symbol': 'WEAT', 'name': 'Teucrium Wheat Fund', 'sector': 'Agri', 'order': 7.06} ,
-        {'symbol': 'COW', 'name': 'iPath Bloomberg Livestock', 'sector': 'Agri', 'order': 7.07} ,
-        {'symbol': 'JO', 'name': 'iPath Bloomberg Coffee Subindex', 'sector': 'Agri', 'order': 7.08} ,
-        {'symbol': 'WOOD', 'name': 'iShares Global Timber & Forestry', 'sector': 'Agri', 'order': 7.09} ,
-        {'symbol': 'PHO', 'name': 'Invesco Water Resources', 'sector': 'Agri', 'order': 7.11} ,
-        {'symbol': 'SCHF', 'name': 'Schwab International Equity', 'sector': 'International', 'order': 10.1} ,
-        {'symbol': 'SCHC', 'name': 'Schwab International Small-Cap Equity', 'sector': 'International', 'order': 10.11} ,
-        {'symbol': 'GWX', 'name': 'SPDR S&P International Small Cap', 'sector': 'International', 'order': 10.12} ,
-        {'symbol': 'EWG', 'name': 'iShares MSCI Germany', 'sector': 'International', 'order': 10.135} ,
-        {'symbol': 'EWQ', 'name': 'iShares MSCI France', 'sector': 'International', 'order': 10.1351} ,
-        {'symbol': 'EWU', 'name': 'iShares MSCI United Kingdom', 'sector': 'International', 'order': 10.1352} ,
-        {'symbol': 'RSX', 'name': 'VanEck Russia', 'sector': 'International', 'order': 10.1353} ,
-        {'symbol': 'SCZ', 'name': 'iShares MSCI EAFE Small-Cap', 'sector': 'International', 'order': 10.21} ,
-        {'symbol': 'EFA', 'name': 'iShares MSCI EAFE', 'sector': 'International', 'order': 10.22} ,
-        {'symbol': 'FXI', 'name': 'iShares China Large-Cap', 'sector': 'International', 'order': 10.23} ,
-        {'symbol': 'MCHI', 'name': 'iShares MSCI China', 'sector': 'International', 'order': 10.24} ,
-        {'symbol': 'KWEB', 'name': 'KraneShares CSI China Internet', 'sector': 'International', 'order': 10.25} ,
-        {'symbol': 'ASHR', 'name': 'Xtrackers Harvest CSI 300 China A-Shares', 'sector': 'International', 'order': 10.26} ,
-        {'symbol': 'EWJ', 'name': 'iShares MSCI Japan', 'sector': 'International', 'order': 10.27} ,
-        {'symbol': 'EWY', 'name': 'iShares MSCI South Korea', 'sector': 'International', 'order': 10.28} ,
-        {'symbol': 'EWT', 'name': 'iShares MSCI Taiwan', 'sector': 'International', 'order': 10.281} ,
-        {'symbol': 'INDA', 'name': 'iShares MSCI India', 'sector': 'International', 'order': 10.29} ,
-        {'symbol': 'ENZL', 'name': 'iShares MSCI New Zealand', 'sector': 'International', 'order': 10.3} ,
-        {'symbol': 'EWA', 'name': 'iShares MSCI-Australia', 'sector': 'International', 'order': 10.31} ,
-        {'symbol': 'EWC', 'name': 'iShares MSCI Canada', 'sector': 'International', 'order': 10.4} ,
-        {'symbol': 'EWW', 'name': 'iShares MSCI Mexico', 'sector': 'International', 'order': 10.41} ,
-        {'symbol': 'EWZ', 'name': 'iShares MSCI Brazil', 'sector': 'International', 'order': 10.42} ,
-        {'symbol': 'ARGT', 'name': 'Global X MSCI Argentina', 'sector': 'International', 'order': 10.43} ,
-        {'symbol': 'IZRL', 'name': 'ARK Israel Innovative Technology', 'sector': 'International', 'order': 10.6} ,
-        {'symbol': 'EIS', 'name': 'iShares MSCI Israel', 'sector': 'International', 'order': 10.61} ,
-        {'symbol': 'KSA', 'name': 'iShares MSCI Saudi Arabia', 'sector': 'International', 'order': 10.62} ,
-        {'symbol': 'TUR', 'name': 'iShares MSCI Turkey', 'sector': 'International', 'order': 10.63} ,
-        {'symbol': 'EZA', 'name': 'iShares MSCI South Africa', 'sector': 'International', 'order': 10.64} ,
-    ]
-    etf_df = pd.DataFrame.from_dict(etf_data)
-    
-    # etf_sectors = etf_df["sector"].unique().tolist()
-    # manual order
-    etf_sectors = ['Equity Index',  'Sector',
-        'Currency',  'Commodity',
-        'Agri',  'Energy',  'Energy-Clean',
-        'Metal',  'Technology',
-        'International']
+    etf_df = pd.DataFrame.from_dict(ETF_DATA)
+    etf_sectors = ETF_SECTORS
 
     etf_dict = {}
     for sect in etf_sectors:
@@ -143,33 +63,15 @@ def _load_etf_df():
         etf_dict[sect] = dict(zip(sym_name.symbol, sym_name.name))
     
     ticker_name = {}
-    for i in etf_data:
+    for i in ETF_DATA:
         ticker_name[i['symbol']] = i['name']
 
     return etf_df, etf_sectors, etf_dict, ticker_name, WATCH_ETF
 
-# INITIALIZE settings 
-MAX_NUM_TICKERS = 30
-NUM_DAYS_QUOTE, NUM_DAYS_PLOT = 390, 250
-EMA_FAST, EMA_SLOW, EMA_LONG = 15, 50, 150
-EMA_FAST_SCALE, EMA_SLOW_SCALE = 1.4, 2.0 
-MA_VOL = 20
-RSI_PERIOD, RSI_AVG, RSI_BAND_WIDTH = 100, 25, 0.6
-MACD_FAST, MACD_SLOW, MACD_SIGNAL = 12, 26, 9
-
-PANID_PRICE, PANID_VOL, PANID_RSI, PANID_SIGNAL = 0, 3, 2, 1
-PANEL_RATIOS = (8, 1, 8, 1)
-FIGURE_WIDTH, FIGURE_HEIGHT =  17, 13
-YELLOW = '#F5D928'
-LIGHT_BLACK = '#8F8E83'
-
-CHART_ROOT = Path.home() / "charts"
-if not Path.exists(CHART_ROOT):
-    Path.mkdir(CHART_ROOT)
-FILE_CACHE_QUOTES = Path.joinpath(CHART_ROOT, "df_quotes_cache.pickle")
-
 DEFAULT_SECTORS = ['Equity Index']
 PERIOD_DICT = {"daily":"d", "weekly":"w", "monthly":"m"}
+TIMING_COLUMNS = ["cache", "quotes", "ta", "render"]
+INTRADAY_WAIT = 10   # seconds to wait for the first intraday bars of a new ticker
 QUOTE_COLUMNS = ["Date", "Ticker", "Chg(%)", "Close", "Low", "High", "Close-1", "Low-1", "High-1"]
 
 ## i18n strings
@@ -178,6 +80,11 @@ _STR_CHART = "chart"
 _STR_ETF_CHART = "ETF chart"
 _STR_REVIEW_CHART = "review chart"
 _STR_ETF_DATA = "ETF data"
+_STR_ETF_SCREENER = "ETF screener"
+_STR_ETF_BACKTEST = "ETF backtest"
+_STR_ETF_SWEEP = "ETF parameter sweep"
+_STR_ETF_CORR = "ETF correlation"
+_STR_ALERTS = "Signal alerts"
 _STR_APP_NAME = "Mplfinance App"
 
 BACKGROUND_IMG_URL = "https://user-images.githubusercontent.com/329928/155828764-b19a08e4-5346-4567-bba0-0ceeb5c2b241.png"
@@ -187,185 +94,302 @@ etf_df, etf_sectors, etf_dict, ticker_name, WATCH_ETF = _load_etf_df()
 ##############################################
 ## helper functions
 ##############################################
-def _in_us_session(now_str=None):
-    if now_str is None:
-        now_str = datetime.strftime(datetime.now(), '%H:%M:%S')
-    return now_str >= '09:30:00' and now_str <= '16:00:00'
-
 def _parse_tickers(s):
     tmp = {}
     for t in [i.strip().upper() for i in re.sub('[^0-9a-zA-Z]+', ' ', s).split() if i.strip()]:
         tmp[t] = 1
     return list(tmp.keys())
 
-def _title_xy(ticker):
-    # position title manually
-    return {"title": f"{ticker}",  "x": 0.55, "y": 0.945}
-
 def _color_rsi_avg(v):
     if v > 0: return '#DCF7E5'
     elif v < 0: return '#F6D5F7'
     return YELLOW
 
-def _color_signal(v):
-    if v > 0: return 'g'
-    elif v < 0: return 'r'
-    return YELLOW
-
 def _finviz_chart_url(ticker, period="d"):
     return f"https://finviz.com/quote.ashx?t={ticker}&p={period}"
 
-QUOTE_TTL = 900 if _in_us_session() else 10800  # cache quote shorter if in-session
-# st.write(f"QUOTE_TTL={QUOTE_TTL}")
-@st.experimental_memo(ttl=QUOTE_TTL)
-def _download_quote(symbol, num_days=NUM_DAYS_QUOTE):
-    return yf.Ticker(symbol).history(f"{num_days}d")
-
-def _get_quotes(symbol, num_days=NUM_DAYS_QUOTE, cache=False):
+# quotes expire at the next bar close on the NYSE calendar (see mplfin_calendar.py),
+# the memos are keyed by the last bar close, so an entry is never served past it,
+# and hold compact frames (see mplfin_compact.py), expand_quotes() before TA
+@st.experimental_memo(max_entries=500)
+def _download_quote(symbol, num_days=NUM_DAYS_QUOTE, epoch=None):
+    df = _fetch_quote(symbol, num_days=num_days)
+    return compact_quotes(df) if COMPACT_CACHE else df
+
+@st.experimental_memo(max_entries=50)
+def _download_quotes(symbols, num_days=NUM_DAYS_QUOTE, epoch=None):
+    # symbols is a tuple (hashable), one batched request for all of them
+    quotes = _fetch_quotes(list(symbols), num_days=num_days)
+    return {s: compact_quotes(df) for s, df in quotes.items()} if COMPACT_CACHE else quotes
+
+def _prefetch_quotes(symbols, num_days=NUM_DAYS_QUOTE, cache=USE_QUOTE_STORE):
+    """ batched download, returns {} on failure so that callers fall back to per-symbol download
     """
+    if len(symbols) < 2:
+        return {}
+    try:
+        if cache:
+            return get_quote_store(QUOTE_ROOT).get_many(symbols, num_days, ttl=quote_expiry)
+        quotes = _download_quotes(tuple(symbols), num_days=num_days, epoch=quote_epoch())
+        return {s: expand_quotes(df) for s, df in quotes.items()}
+    except Exception:
+        return {}
+
+def _get_quotes(symbol, num_days=NUM_DAYS_QUOTE, cache=USE_QUOTE_STORE):
+    """
+    cache=True reads from the per-symbol arrow store (see mplfin_store.py),
+    only new bars are downloaded once the stored ones expire (next bar close, see mplfin_calendar.py),
+    returns the last num_days, a fixed span for TA whatever the store holds
     check cache:
-        import pickle
-        df = pickle.load(open("df_quotes_cache.pickle", "rb"))
-        df.keys()
+        from mplfin_store import QuoteStore
+        QuoteStore(QUOTE_ROOT).symbols()
     """
     if not cache:
-        return _download_quote(symbol, num_days=num_days)
-        
-    if Path.exists(FILE_CACHE_QUOTES):
-        quote_data = pickle.load(open(FILE_CACHE_QUOTES, "rb"))
-        if symbol in quote_data and num_days == quote_data[symbol]["num_days"]:
-            df = quote_data[symbol]["df"]
-        else:
-            df = _download_quote(symbol, num_days=num_days)
-            quote_data[symbol] = dict(num_days=num_days, df=df)
-            pickle.dump(quote_data, open(FILE_CACHE_QUOTES, "wb"))
+        return expand_quotes(_download_quote(symbol, num_days=num_days, epoch=quote_epoch()))
+    return get_quote_store(QUOTE_ROOT).get(symbol, num_days, ttl=quote_expiry)
+
+def _get_ta(ticker, df, key=None, timeframe="d"):
+    """ TA frame for quote history df, returns (ta, cache_hit)
+    memoized by ta_key (symbol, last bar, parameters); misses are advanced
+    incrementally from the last call (see mplfin_stream.py), same values as _calculate_ta(df)
+    """
+    key = key or ta_key(ticker, df, _ta_params())
+    ta = get_ta_cache().get(key)
+    if ta is not None:
+        return ta, True
+    # weekly/monthly bars have their own incremental state, intraday rings slide every bar
+    ta = get_ta_engine().update(ticker if timeframe == "d" else f"{ticker}@{timeframe}", df, sliding=is_intraday(timeframe))
+    ta.attrs["ticker"] = ticker   # for memory_report
+    get_ta_cache().put(key, ta)
+    return ta, False
+
+def _figsize():
+    return (st.session_state.get("FIGURE_WIDTH", FIGURE_WIDTH), st.session_state.get("FIGURE_HEIGHT", FIGURE_HEIGHT))
+
+def _render_params():
+    # everything besides the TA frame that changes the rendered chart
+    return dict(figsize=_figsize(), 
+                num_days_plot=int(st.session_state.get("NUM_DAYS_PLOT", NUM_DAYS_PLOT)), 
+                style=st.session_state.get("CHART_STYLE", CHART_STYLE))
+
+def _timeframe():
+    label = st.session_state.get("TIMEFRAME", "daily")
+    return INTRADAY_INTERVALS.get(label) or PERIOD_DICT[label]
+
+@st.experimental_singleton
+def _get_intraday_poller():
+    # one poller thread and ring buffer book, shared by all sessions
+    poller = IntradayPoller()
+    poller.start()
+    return poller
+
+def _bars(ticker, df, timeframe):
+    """ bars of timeframe resampled from the daily quotes df (see mplfin_resample.py),
+    intraday bars are read from the poller's ring buffers (df unused, see mplfin_intraday.py)
+    """
+    if is_intraday(timeframe):
+        bars = _get_intraday_poller().book.frame(ticker, timeframe)
     else:
-        df = _download_quote(symbol, num_days=num_days)
-        quote_data = {}
-        quote_data[symbol] = dict(num_days=num_days, df=df)
-        pickle.dump(quote_data, open(FILE_CACHE_QUOTES, "wb"))
-
-    return df
-
-def _ta_MACD(df, fast_period=MACD_FAST, slow_period=MACD_SLOW, signal_period=MACD_SIGNAL):
-    ema_fast = df["Close"].ewm(span=fast_period).mean()
-    ema_slow = df["Close"].ewm(span=slow_period).mean()
-    df["macd"] = ema_fast - ema_slow
-    df["macd_signal"] = df["macd"].ewm(span=signal_period).mean()
-    df["macd_hist"] = df["macd"] - df["macd_signal"]
-    return df
-
-def _ta_RSI(df, n=RSI_PERIOD, avg_period=RSI_AVG, band_width=RSI_BAND_WIDTH):
-    # https://github.com/wgong/mplfinance/blob/master/examples/rsi.py
-    diff = df.w_p.diff().values
-    gains = diff
-    losses = -diff
-    with np.errstate(invalid='ignore'):
-        gains[(gains<0)|np.isnan(gains)] = 0.0
-        losses[(losses<=0)|np.isnan(losses)] = 1e-10 # we don't want divide by zero/NaN
-    m = (n-1) / n
-    ni = 1 / n
-    g = gains[n] = np.nanmean(gains[:n])
-    l = losses[n] = np.nanmean(losses[:n])
-    gains[:n] = losses[:n] = np.nan
-    for i,v in enumerate(gains[n:],n):
-        g = gains[i] = ni*v + m*g
-    for i,v in enumerate(losses[n:],n):
-        l = losses[i] = ni*v + m*l
-    rs = gains / losses
-    df['rsi'] = 50 - (100/(1+rs))
-    df["rsi_avg"] = df.rsi.ewm(span=avg_period).mean()
-    df["rsi_u"] = df["rsi_avg"] + band_width
-    df["rsi_d"] = df['rsi_avg'] - band_width
-    df["rsi_signal"] = df["rsi"] - df["rsi_avg"]
-    return df
-
-def _calculate_ta(df):
-    df["w_p"] = 0.25*(2*df["Close"] + df["High"] + df["Low"])
-    df["ema_fast"] = df.w_p.ewm(span=EMA_FAST).mean()
-    df["ema_slow"] = df.w_p.ewm(span=EMA_SLOW).mean()
-    df["ema_long"] = df.w_p.ewm(span=EMA_LONG).mean()
-
-    # range
-    hl_mean_fast = (df.High - df.Low).ewm(span=EMA_FAST).mean()
-    df["ema_fast_u"] =  df.ema_fast + 0.5*hl_mean_fast * EMA_FAST_SCALE
-    df["ema_fast_d"] =  df.ema_fast - 0.5*hl_mean_fast * EMA_FAST_SCALE
-
-    hl_mean_slow = (df.High - df.Low).ewm(span=EMA_SLOW).mean()
-    df["ema_slow_u"] =  df.ema_slow + 0.5*hl_mean_slow * EMA_SLOW_SCALE
-    df["ema_slow_d"] =  df.ema_slow - 0.5*hl_mean_slow * EMA_SLOW_SCALE
-
-    # trim volume to avoid exponential form
-    df['Volume'] = df['Volume'] / 1000000
-    df["vol_avg"] = df.Volume.ewm(span=MA_VOL).mean()
-
-    return _ta_RSI(df)   
+        bars = get_bars(ticker, df, timeframe)
+    if len(bars) <= RSI_PERIOD + 1:
+        raise ValueError(f"{len(bars)} {timeframe} bars in the stored history, not enough for TA")
+    return bars
+
+def _elapsed(t0):
+    return time.perf_counter() - t0
 
 # @st.experimental_memo(ttl=7200)
-def _chart(ticker, chart_root=CHART_ROOT, panid_price=PANID_PRICE, panid_vol=PANID_VOL, panid_rsi=PANID_RSI, panid_signal=PANID_SIGNAL):
+def _chart(ticker, chart_root=CHART_ROOT, df=None, timeframe="d"):
+    timings = {}
+    t0 = time.perf_counter()
     try:
-        df = _get_quotes(ticker)
+        if df is None and not is_intraday(timeframe):
+            df = _get_quotes(ticker, num_days=quote_days(timeframe))
+        df = _bars(ticker, df, timeframe)
     except:
         err_msg = format_exc()
         return {"ticker": ticker, "err_msg": f"_get_quotes()\n{err_msg}"}
-
+    timings["quotes"] = _elapsed(t0)
+
+    render_params = _render_params()
+    t0 = time.perf_counter()
+    key_ta = ta_key(ticker, df, _ta_params())
+    key = render_key(key_ta, render_params)
+    ticker_dict = get_render_cache().get(key)
+    if ticker_dict:
+        timings.update(cache="render", render=_elapsed(t0))
+        ticker_dict["timings"] = timings
+        return ticker_dict
+
+    t0 = time.perf_counter()
     try:
-        df = _calculate_ta(df)
+        df, ta_hit = _get_ta(ticker, df, key_ta, timeframe)
     except:
         err_msg = format_exc()
         return {"ticker": ticker, "err_msg": f"_calculate_ta()\n{err_msg}"}
+    timings.update(cache="ta" if ta_hit else "miss", ta=_elapsed(t0))
 
-    # slice after done with calculating TA 
-    df = df.iloc[-NUM_DAYS_PLOT:, :]    
+    t0 = time.perf_counter()
+    ticker_dict = _chart_ta(ticker, df, chart_root=chart_root, **render_params)
+    timings["render"] = _elapsed(t0)
+    ticker_dict["timings"] = timings
+    return _cache_chart(key, ticker_dict, persist=timeframe == "d")
 
-    # candle overlay
-    ema_fast_u_plot = mpf.make_addplot(df["ema_fast_u"], panel=panid_price, color=LIGHT_BLACK, linestyle="solid")
-    ema_fast_d_plot = mpf.make_addplot(df["ema_fast_d"], panel=panid_price, color=LIGHT_BLACK, linestyle="solid")
-    ema_slow_plot = mpf.make_addplot(df["ema_slow"], panel=panid_price, color='b', linestyle="solid")
-    ema_long_plot = mpf.make_addplot(df["ema_long"], panel=panid_price, width=2, color='k')  # magenta '#ED8CEB'
-    
-    # RSI
-    # make sure ylim are the same
-    rsi_min, rsi_max = np.nanmin(df['rsi']), np.nanmax(df['rsi'])
-    rsi_plot = mpf.make_addplot(df["rsi"], panel=panid_rsi, color='r', width=1,  ylim=(rsi_min,rsi_max))
-    rsi_avg_plot = mpf.make_addplot(df["rsi_avg"], panel=panid_rsi, color='b', linestyle="dashed", ylim=(rsi_min,rsi_max))
-    rsi_u_plot = mpf.make_addplot(df["rsi_u"], panel=panid_rsi, color='b', linestyle="solid", ylim=(rsi_min,rsi_max))
-    rsi_d_plot = mpf.make_addplot(df["rsi_d"], panel=panid_rsi, color='b', linestyle="solid", ylim=(rsi_min,rsi_max))  # , ylabel=ticker)
-    signal_plot = mpf.make_addplot(df["rsi_signal"], panel=panid_signal, type="bar", 
-                            color=[_color_signal(v) for v in df["rsi_signal"]],ylim=(-1,1))                            
-
-    # volume
-    vol_avg_plot = mpf.make_addplot(df["vol_avg"], panel=panid_vol, color='k')
-
-    # plot
-    plots = [ema_fast_u_plot, ema_fast_d_plot, ema_slow_plot, ema_long_plot  
-            , rsi_avg_plot, rsi_u_plot, rsi_d_plot, rsi_plot 
-            , vol_avg_plot  
-            , signal_plot                             
-        ]
-    # custom style
-    # https://stackoverflow.com/questions/68296296/customizing-mplfinance-plot-python
-    
-    file_img = Path.joinpath(chart_root, f"{ticker}.png")
-    mpf.plot(df, type='candle', 
-            style='yahoo', 
-            fill_between=dict(y1=df["ema_fast_d"].values,y2=df["ema_fast_u"].values,alpha=0.15,color='b'),
-            panel_ratios=PANEL_RATIOS,
-            addplot=plots, 
-            title=_title_xy(ticker),
-            volume=True, volume_panel=panid_vol, 
-            ylabel="", ylabel_lower="",
-            xrotation=0,
-            datetime_format='%m-%d',
-            savefig=file_img,
-            figsize=(st.session_state["FIGURE_WIDTH"],st.session_state["FIGURE_HEIGHT"]),
-            tight_layout=True,
-            show_nontrading=True
-        )
-    # st.dataframe(df)   # ["Close", "Low", "High", "Volume"]
-    _date, _today_quote, _prev_day_quote = df.iloc[-1, :].name, df.iloc[-1, :].to_dict(), df.iloc[-2, :].to_dict()
-    del [df, plots]  
-    return {"ticker": ticker, "file_img": file_img, "date": _date, "today_quote": _today_quote, "prev_day_quote": _prev_day_quote, "err_msg": None}
+def _chart_interactive(ticker, df=None, timeframe="d"):
+    """ bars + indicator lines of the last HISTORY_DAYS for a client-side (Vega-Lite)
+    chart, daily candles for the initial view and downsampled older bars, see mplfin_interactive.py
+    """
+    timings = {}
+    t0 = time.perf_counter()
+    try:
+        if df is None and not is_intraday(timeframe):
+            df = _get_quotes(ticker, num_days=HISTORY_DAYS)
+        df = _bars(ticker, df, timeframe)
+    except:
+        err_msg = format_exc()
+        return {"ticker": ticker, "err_msg": f"_get_quotes()\n{err_msg}"}
+    timings["quotes"] = _elapsed(t0)
+
+    t0 = time.perf_counter()
+    try:
+        # the TA engine only keeps the last NUM_DAYS_QUOTE rows, the payload covers every bar
+        num_days_plot = int(st.session_state.get("NUM_DAYS_PLOT", NUM_DAYS_PLOT))
+        key = ta_key(ticker, df, dict(_ta_params(), interactive=(MAX_CANDLES, num_days_plot)))
+        payload, hit = get_payload(key, lambda: _calculate_ta(df.copy()), num_days_plot)
+    except:
+        err_msg = format_exc()
+        return {"ticker": ticker, "err_msg": f"_calculate_ta()\n{err_msg}"}
+    timings.update(cache="payload" if hit else "miss", ta=_elapsed(t0))
+    return {"ticker": ticker, "payload": payload, "date": df.index[-1],
+            "today_quote": df.iloc[-1].to_dict(), "prev_day_quote": df.iloc[-2].to_dict(),
+            "timings": timings, "err_msg": None}
+
+def _cache_chart(key, ticker_dict, persist=True):
+    """ keep the rendered PNG bytes + quote summary in the render cache,
+    optionally save it for the review page (in the background, daily charts only)
+    """
+    if not ticker_dict.get("err_msg"):
+        if key:
+            get_render_cache().put(key, ticker_dict)
+        if persist and st.session_state.get("PERSIST_CHARTS", True):
+            _persist_chart(ticker_dict)
+    return ticker_dict
+
+def _prerendered(tickers, chart_root=CHART_ROOT):
+    """ {ticker: ticker_dict} for charts pre-rendered by mplfin_batch.py that are still fresh
+    (quotes not expired, same settings)
+    """
+    prerendered = {}
+    key = params_key(_render_params(), _ta_params())
+    for ticker, entry in get_manifest(chart_root).fresh(tickers, key).items():
+        t0 = time.perf_counter()
+        try:
+            img_bytes = Path(entry["file_img"]).read_bytes()
+        except OSError:
+            continue
+        prerendered[ticker] = dict(entry, img_bytes=img_bytes, date=pd.Timestamp(entry["date"]),
+                                   timings={"cache": "manifest", "render": _elapsed(t0)})
+    return prerendered
+
+@st.experimental_singleton
+def _get_janitor(chart_root=CHART_ROOT):
+    # one eviction thread per chart root, shared by all sessions,
+    # the quote store and the finviz image cache live under CHART_ROOT
+    janitor = ChartJanitor(chart_root, max_bytes=CHART_MAX_BYTES, max_files=CHART_MAX_FILES,
+                           cache_roots=[QUOTE_ROOT, IMAGE_ROOT] if chart_root == CHART_ROOT else [])
+    janitor.start()
+    return janitor
+
+def _session_id():
+    ctx = get_script_run_ctx()
+    return ctx.session_id if ctx else "default"
+
+def _stop_requested():
+    """ stop the run if the session asked for a rerun/stop (e.g. changed ticker input),
+    what every st.* call checks, without rendering anything (see fetch_checkpoint)
+    """
+    ctx = get_script_run_ctx()
+    request = ctx.script_requests.on_scriptrunner_yield() if ctx and ctx.script_requests else None
+    if request is None:
+        return
+    if request.type == ScriptRequestType.RERUN:
+        raise RerunException(request.rerun_data)
+    raise StopException()
+
+def _view_charts(tickers, chart_root=CHART_ROOT):
+    """ pin the charts this session shows (never evicted) and mark them viewed
+    """
+    _get_janitor(chart_root).pin(_session_id(), tickers)
+    if tickers:
+        get_chart_index(chart_root).touch(tickers)
+
+@st.experimental_singleton
+def _get_process_pool(num_workers=NUM_WORKERS):
+    # one pool per worker count, shared by all sessions
+    return ProcessPoolExecutor(max_workers=num_workers)
+
+def _chart_parallel(tickers, num_workers=NUM_WORKERS, timeout=TICKER_TIMEOUT, timeframe="d"):
+    """ render tickers concurrently in a process pool,
+    yield ticker_dict as each one finishes (completion order)
+    """
+    pool = _get_process_pool(num_workers)
+    t0 = time.perf_counter()
+    quotes = _prefetch_quotes(tickers, num_days=quote_days(timeframe))
+    t_quotes = _elapsed(t0) / max(1, len(tickers))   # batched, shown per ticker
+    render_params = _render_params()
+    futures, keys, timings = {}, {}, {}
+    for ticker in tickers:
+        ta = None
+        timings[ticker] = {"quotes": t_quotes}
+        if timeframe != "d":
+            # workers only download daily bars, resample here
+            try:
+                df = quotes[ticker] if ticker in quotes else _get_quotes(ticker, num_days=quote_days(timeframe))
+                quotes[ticker] = _bars(ticker, df, timeframe)
+            except:
+                yield {"ticker": ticker, "err_msg": format_exc()}
+                continue
+        if ticker in quotes:
+            t0 = time.perf_counter()
+            key_ta = ta_key(ticker, quotes[ticker], _ta_params())
+            keys[ticker] = render_key(key_ta, render_params)
+            ticker_dict = get_render_cache().get(keys[ticker])
+            if ticker_dict:
+                timings[ticker].update(cache="render", render=_elapsed(t0))
+                ticker_dict["timings"] = timings[ticker]
+                yield ticker_dict
+                continue
+            t0 = time.perf_counter()
+            try:
+                ta, ta_hit = _get_ta(ticker, quotes[ticker], key_ta, timeframe)
+                timings[ticker].update(cache="ta" if ta_hit else "miss", ta=_elapsed(t0))
+            except:
+                pass   # worker recomputes and reports the error
+        df = quotes.get(ticker) if ta is None else None
+        f = pool.submit(_chart_worker, ticker, df=df, ta=ta, num_days=NUM_DAYS_QUOTE, chart_root=CHART_ROOT,
+                        render_params=render_params, timeout=timeout)
+        futures[f] = ticker
+
+    # workers enforce the per-ticker timeout themselves,
+    # this is a backstop in case a worker dies or hangs in C code
+    n_waves = -(-len(tickers) // num_workers)
+    deadline = time.time() + timeout * n_waves + 10
+    pending = set(futures)
+    while pending:
+        done, pending = wait(pending, timeout=max(0, deadline - time.time()), return_when=FIRST_COMPLETED)
+        if not done:
+            break
+        for f in done:
+            ticker = futures[f]
+            try:
+                ticker_dict = f.result()
+                ticker_dict["timings"] = dict(timings[ticker], render=ticker_dict.get("elapsed"))
+                yield _cache_chart(keys.get(ticker), ticker_dict, persist=timeframe == "d")
+            except:
+                yield {"ticker": ticker, "err_msg": format_exc()}
+    for f in pending:
+        f.cancel()
+        yield {"ticker": futures[f], "err_msg": f"timed out after {timeout} sec"}
 
 ##############################################
 ## st handlers
@@ -394,34 +418,377 @@ def _reformat_quote(ticker_dict):
     chg = 100*(1- ticker_dict["prev_day_quote"]["Close"] / ticker_dict["today_quote"]["Close"])
     return [date, ticker, chg, close, low, high, close_1, low_1, high_1]
 
+def _show_chart(ticker_dict):
+    ticker = ticker_dict["ticker"]
+    st.markdown(f"[{ticker}]({_finviz_chart_url(ticker)}) {ticker_name.get(ticker, '')}", unsafe_allow_html=True)
+    err_msg = ticker_dict["err_msg"]
+    if err_msg:
+        st.error(f"Failed ticker: {ticker}\n{err_msg}")
+        return None
+    if ticker_dict.get("payload"):
+        num_days_plot = int(st.session_state.get("NUM_DAYS_PLOT", NUM_DAYS_PLOT))
+        st.altair_chart(candlestick_chart(ticker_dict["payload"], num_days_plot=num_days_plot), use_container_width=True)
+        return _reformat_quote(ticker_dict)
+    if ticker_dict.get("img_bytes"):
+        st.image(ticker_dict["img_bytes"])
+        return _reformat_quote(ticker_dict)
+
 def do_mpl_chart():
     """ chart new ticker
     """
-    quote_data = []
+    quote_data, timings = [], {}
     tickers = st.text_input(f'Enter ticker(s) (max {MAX_NUM_TICKERS})', "SPY") 
-    for ticker in _parse_tickers(tickers)[:MAX_NUM_TICKERS]:
-        st.markdown(f"[{ticker}]({_finviz_chart_url(ticker)}) {ticker_name.get(ticker, '')}", unsafe_allow_html=True)
-        ticker_dict = _chart(ticker)
-        err_msg = ticker_dict["err_msg"]
-        if err_msg:
-            st.error(f"Failed ticker: {ticker}\n{err_msg}")
-            continue
-        file_img = ticker_dict["file_img"]
-        if file_img:
-            quote_data.append(_reformat_quote(ticker_dict))
-            st.image(Image.open(file_img))
+    tickers = _parse_tickers(tickers)[:MAX_NUM_TICKERS]
+
+    _view_charts(tickers)
+
+    # charts pre-rendered by mplfin_batch.py (daily) are served as is
+    timeframe = _timeframe()
+    interactive = st.session_state.get("INTERACTIVE", False)
+    prerendered = _prerendered(tickers) if timeframe == "d" and not interactive else {}
+    to_render = [t for t in tickers if t not in prerendered]
+    if is_intraday(timeframe):
+        # bars are polled in the background from now on, the first poll backfills
+        _get_intraday_poller().watch(tickers, timeout=INTRADAY_WAIT)
+
+    # worker processes have no access to the intraday ring buffers
+    if (st.session_state.get("PARALLEL_RENDER", False) and len(to_render) > 1 and not interactive
+            and not is_intraday(timeframe)):
+        # one placeholder per ticker keeps input order, filled as each chart finishes
+        placeholders = {ticker: st.empty() for ticker in tickers}
+        quotes = {}
+        rendered = _chart_parallel(to_render, 
+                num_workers=int(st.session_state.get("NUM_WORKERS", NUM_WORKERS)), 
+                timeout=st.session_state.get("TICKER_TIMEOUT", TICKER_TIMEOUT), timeframe=timeframe)
+        for ticker_dict in chain(prerendered.values(), rendered):
+            ticker = ticker_dict["ticker"]
+            with placeholders[ticker].container():
+                quotes[ticker] = _show_chart(ticker_dict)
+            timings[ticker] = ticker_dict.get("timings")
+        quote_data = [quotes[t] for t in tickers if quotes.get(t)]
+    else:
+        t0 = time.perf_counter()
+        if is_intraday(timeframe):
+            quotes = {}
+        else:
+            # interactive charts cover the last HISTORY_DAYS
+            quotes = _prefetch_quotes(to_render, num_days=HISTORY_DAYS if interactive else quote_days(timeframe))
+        t_quotes = _elapsed(t0) / max(1, len(to_render))   # batched, shown per ticker
+        for ticker in tickers:
+            if interactive:
+                ticker_dict = _chart_interactive(ticker, df=quotes.get(ticker), timeframe=timeframe)
+            else:
+                ticker_dict = prerendered.get(ticker) or _chart(ticker, df=quotes.get(ticker), timeframe=timeframe)
+            timings[ticker] = ticker_dict.get("timings")
+            if timings[ticker] and ticker in quotes:
+                timings[ticker]["quotes"] += t_quotes
+            quote = _show_chart(ticker_dict)
+            if quote:
+                quote_data.append(quote)
             
     st.dataframe(pd.DataFrame(quote_data, columns=QUOTE_COLUMNS), height=800)
 
+    if st.session_state.get("SHOW_TIMINGS", False):
+        # seconds per stage, cache: render (no TA, no redraw) / ta (redraw only) / miss
+        df_timings = pd.DataFrame.from_dict({t: v for t, v in timings.items() if v}, orient="index")
+        st.dataframe(df_timings.reindex(columns=TIMING_COLUMNS))
+
 def do_review(chart_root=CHART_ROOT):
     """ review existing charts
     """
-    tickers = sorted([f.stem for f in Path(chart_root).glob("*.png")])
-    selected_tickers = st.multiselect("Select tickers", tickers, [])
+    for label, cache in [("Render", get_render_cache()), ("TA", get_ta_cache())]:
+        cache_stats = cache.stats()
+        c1, c2, c3, c4 = st.columns(4)
+        c1.metric(f"{label} cache hits", cache_stats["hits"])
+        c2.metric(f"{label} cache misses", cache_stats["misses"])
+        c3.metric("Hit rate", f'{100*cache_stats["hit_rate"]:.0f} %')
+        c4.metric("Entries", f'{cache_stats["entries"]} ({cache_stats["bytes"]/1e6:.1f} MB)')
+
+    with st.expander("Memory per symbol"):
+        # bytes held in this process, see mplfin_compact.py
+        df_mem = memory_report(get_ta_engine(), get_ta_cache(), get_render_cache())
+        st.caption(f'{len(df_mem)} symbols, {df_mem["Total"].sum()/2**20:.1f} MB'
+                   f'{" (compact)" if COMPACT_CACHE else ""}')
+        st.dataframe(df_mem)
+
+    # quote downloads shared by concurrent sessions, see mplfin_flight.py
+    flight_stats = get_provider().flight.stats()
+    c1, c2, c3, c4 = st.columns(4)
+    c1.metric("Quote requests", flight_stats["requested"])
+    c2.metric("Downloaded", flight_stats["fetched"])
+    c3.metric("Coalesced", flight_stats["coalesced"])
+    c4.metric("Wait time", f'{flight_stats["wait_time"]:.1f} sec')
+
+    # disk budget, see mplfin_janitor.py
+    usage = _get_janitor(chart_root).usage()
+    c1, c2, c3, c4 = st.columns(4)
+    c1.metric("Charts on disk", usage["files"], help=f'budget: {usage["max_files"] or "none"}')
+    c2.metric("Disk usage", f'{usage["bytes"]/2**20:.1f} MB',
+              help=(f'{usage["cache_bytes"]/2**20:.1f} MB quotes and finviz images, ' +
+                    (f'budget: {usage["max_bytes"]/2**20:.0f} MB' if usage["max_bytes"] else "budget: none")))
+    c3.metric("Pinned (open sessions)", usage["pinned"])
+    c4.metric("Evicted", f'{usage["evicted_files"]} ({usage["evicted_bytes"]/2**20:.1f} MB)')
+
+    # listed from the chart index (see mplfin_index.py), no directory scan
+    index = get_chart_index(chart_root)
+    c1, c2 = st.columns(2)
+    sectors = c1.multiselect("Sectors", etf_sectors + [OTHER_SECTOR], [], key="review_sectors")
+    dates = c2.date_input("Quote date (range)", value=[], key="review_dates")
+    date_from, date_to = (dates[0], dates[-1]) if dates else (None, None)
+    df_charts = index.query(sectors=sectors, date_from=date_from, date_to=date_to)
+    selected_tickers = st.multiselect(f"Select tickers ({len(df_charts)} charts)", df_charts["ticker"].tolist(), [])
+    charts = df_charts.set_index("ticker")
+    _view_charts(selected_tickers, chart_root)
     for ticker in selected_tickers:
-        file_img = Path.joinpath(chart_root, f"{ticker}.png")
-        st.image(Image.open(file_img))
-        st.markdown(f"[{ticker}]({_finviz_chart_url(ticker)})", unsafe_allow_html=True)
+        file_img = charts.at[ticker, "file_img"]
+        try:
+            st.image(Path(file_img).read_bytes())
+        except FileNotFoundError:
+            index.delete([ticker])
+            st.warning(f"{ticker}: chart was removed")
+            continue
+        st.markdown(f"[{ticker}]({_finviz_chart_url(ticker)}) quote date: {charts.at[ticker, 'quote_date']}", unsafe_allow_html=True)
+
+def _universe_quotes(sectors, num_days=NUM_DAYS_QUOTE):
+    """ {symbol: quotes} of the ETFs in sectors, one batched download,
+    reports the symbols without quotes
+    """
+    symbols = etf_df[etf_df["sector"].isin(sectors)]["symbol"].tolist()
+    quotes = _prefetch_quotes(symbols, num_days=num_days)
+    if not quotes:
+        st.error("Failed to download quotes")
+        return {}
+    missing = [s for s in symbols if s not in quotes]
+    if missing:
+        st.warning(f"No quotes for: {', '.join(missing)}")
+    return quotes
+
+def do_etf_screener():
+    """ TA of the whole ETF universe in one vectorized pass (see mplfin_panel.py)
+    """
+    sectors = st.session_state.get("screener_sectors", etf_sectors)
+    t0 = time.perf_counter()
+    quotes = _universe_quotes(sectors)
+    t_quotes = _elapsed(t0)
+    if not quotes:
+        return
+
+    t0 = time.perf_counter()
+    panel = QuotePanel(quotes)
+    df = screener(panel, panel_ta(panel))
+    t_ta = _elapsed(t0)
+    sector = dict(zip(etf_df["symbol"], etf_df["sector"]))
+    df.insert(1, "Name", df["Ticker"].map(ticker_name))
+    df.insert(2, "Sector", df["Ticker"].map(sector))
+    st.caption(f"{len(df)} symbols: quotes {t_quotes:.2f} sec, panel TA + screener {1e3*t_ta:.0f} ms")
+    st.dataframe(df.style.format(precision=2).map(lambda v: f"background-color: {_color_rsi_avg(v)}", subset=["RSI signal"]), height=800)
+
+def do_etf_backtest():
+    """ rsi_signal long/flat or long/short backtest of the ETF universe (see mplfin_backtest.py)
+    """
+    sectors = st.session_state.get("backtest_sectors", etf_sectors)
+    years = st.session_state.get("backtest_years", 5)
+    mode = st.session_state.get("backtest_mode", MODES[0])
+    threshold = st.session_state.get("backtest_threshold", THRESHOLD)
+    cost_bps = st.session_state.get("backtest_cost", COST_BPS)
+    t0 = time.perf_counter()
+    quotes = _universe_quotes(sectors, num_days=int(years*365))
+    # the quote store returns all stored bars
+    quotes = {s: df[df.index > df.index[-1] - pd.DateOffset(years=years)] for s, df in quotes.items()}
+    t_quotes = _elapsed(t0)
+    if not quotes:
+        return
+
+    t0 = time.perf_counter()
+    panel = QuotePanel(quotes)
+    ta = panel_ta(panel)
+    stats, equity = backtest(panel, ta, threshold=threshold, mode=mode, cost_bps=cost_bps)
+    t_backtest = _elapsed(t0)
+    sector = dict(zip(etf_df["symbol"], etf_df["sector"]))
+    st.caption(f"{len(stats)} symbols x {len(equity)} bars: quotes {t_quotes:.2f} sec, panel TA + backtest {1e3*t_backtest:.0f} ms")
+
+    st.subheader("By sector")
+    st.dataframe(sector_stats(stats, sector).style.format(precision=2))
+
+    st.subheader("Equal-weight equity")
+    # rows are the union of the symbols' dates (see QuotePanel)
+    close = pd.DataFrame(panel["Close"], index=panel.dates, columns=panel.symbols)
+    buy_hold = (close / close.bfill().iloc[0]).ffill().fillna(1.0)
+    st.line_chart(pd.DataFrame({"rsi_signal": equity.mean(axis=1), "buy & hold": buy_hold.mean(axis=1)}))
+
+    st.subheader("By symbol")
+    stats.insert(0, "Name", stats.index.map(ticker_name))
+    stats.insert(1, "Sector", stats.index.map(sector))
+    st.dataframe(stats.style.format(precision=2), height=600)
+
+    with st.expander("Parameter sweep (threshold x mode, universe mean)"):
+        t0 = time.perf_counter()
+        grid = sweep(panel, ta, cost_bps=cost_bps)
+        st.caption(f"{len(grid)} settings in {1e3*_elapsed(t0):.0f} ms")
+        st.dataframe(grid.style.format(precision=2).background_gradient(subset=["Return(%)", "Sharpe"], cmap="RdYlGn"))
+
+def _sweep_grid():
+    # comma separated values per parameter from the sidebar, default grid for invalid input
+    grid = {}
+    for p in PARAMS:
+        values = re.findall(r"\d+", st.session_state.get(f"sweep_{p}", ""))
+        grid[p] = sorted({int(v) for v in values if int(v) > 0}) or DEFAULT_GRID[p]
+    return grid
+
+def do_etf_sweep():
+    """ grid of indicator settings backtested over the ETF universe (see mplfin_sweep.py)
+    """
+    sectors = st.session_state.get("sweep_sectors", etf_sectors)
+    years = st.session_state.get("sweep_years", 5)
+    metric = st.session_state.get("sweep_metric", METRICS[0])
+    mode = st.session_state.get("sweep_mode", MODES[0])
+    grid = _sweep_grid()
+    if not settings(grid):
+        st.warning("No valid setting in the grid: EMA_FAST < EMA_SLOW < EMA_LONG is needed for at least one combination")
+        return
+    t0 = time.perf_counter()
+    quotes = _universe_quotes(sectors, num_days=int(years*365))
+    quotes = {s: df[df.index > df.index[-1] - pd.DateOffset(years=years)] for s, df in quotes.items()}
+    t_quotes = _elapsed(t0)
+    if not quotes:
+        return
+
+    t0 = time.perf_counter()
+    panel = QuotePanel(quotes)
+    results, hit = get_sweep(panel, grid, mode=mode)
+    sector = dict(zip(etf_df["symbol"], etf_df["sector"]))
+    st.caption(f"{len(settings(grid))} settings x {len(panel)} symbols: quotes {t_quotes:.2f} sec, "
+               f"sweep {_elapsed(t0):.2f} sec{' (cached)' if hit else ''}")
+
+    st.subheader(f"Best settings per sector ({metric})")
+    st.dataframe(best_by_sector(results, sector, metric).style.format(precision=2))
+    st.subheader("Top settings x sector")
+    st.caption("* best setting of the sector")
+    st.altair_chart(heatmap_chart(results, sector, metric), use_container_width=True)
+
+def do_etf_corr():
+    """ rolling return correlation (clustered heatmap) and relative strength vs a benchmark (see mplfin_corr.py)
+    """
+    sectors = st.session_state.get("corr_sectors", etf_sectors)
+    window = st.session_state.get("corr_window", CORR_WINDOW)
+    benchmark = st.session_state.get("corr_benchmark", BENCHMARK)
+    t0 = time.perf_counter()
+    quotes = _universe_quotes(sectors)
+    if quotes and benchmark not in quotes:
+        # benchmark outside the selected sectors
+        try:
+            quotes[benchmark] = _get_quotes(benchmark)
+        except Exception:
+            st.warning(f"No quotes for benchmark {benchmark}")
+    t_quotes = _elapsed(t0)
+    if len(quotes) < 2:
+        return
+
+    t0 = time.perf_counter()
+    engine = get_corr_engine()
+    close = close_frame(quotes)
+    corr = engine.update(close, window=window)
+    rs = relative_strength(close, benchmark=benchmark)
+    t_corr = _elapsed(t0)
+    st.caption(f"{len(close.columns)} symbols, {window} bar window: quotes {t_quotes:.2f} sec, "
+               f"correlation + RS {1e3*t_corr:.0f} ms (updates: {engine.stats['full']} full, "
+               f"{engine.stats['incremental']} incremental, {engine.stats['bars_pushed']} bars pushed)")
+
+    st.subheader(f"Relative strength vs {benchmark}")
+    sector = dict(zip(etf_df["symbol"], etf_df["sector"]))
+    rs.insert(0, "Name", rs.index.map(ticker_name))
+    rs.insert(1, "Sector", rs.index.map(sector))
+    if benchmark in corr:
+        rs[f"Corr {benchmark}"] = corr[benchmark]
+    st.dataframe(rs.style.format(precision=2), height=500)
+
+    st.subheader(f"{window} bar return correlation (clustered)")
+    st.altair_chart(corr_heatmap(corr, height=max(300, 12*len(corr))), use_container_width=True)
+
+def _scanner_quotes(symbols):
+    # runs in the scanner thread: no streamlit memo, the quote store is thread-safe
+    if USE_QUOTE_STORE:
+        return get_quote_store(QUOTE_ROOT).get_many(symbols, NUM_DAYS_QUOTE, ttl=quote_expiry)
+    return _fetch_quotes(symbols, num_days=NUM_DAYS_QUOTE)
+
+@st.experimental_singleton
+def _get_alert_scanner(chart_root=CHART_ROOT):
+    # one scanner thread over the whole ETF universe, shared by all sessions,
+    # it advances the same TA engine state as the chart page (see mplfin_alerts.py)
+    scanner = AlertScanner(etf_df["symbol"].tolist(), AlertStore(chart_root), _scanner_quotes)
+    scanner.start()
+    return scanner
+
+def _onclick_save_rule():
+    name = st.session_state.get("alerts_rule_name", "").strip()
+    if not name:
+        st.warning("rule name is missing")
+        return
+    _get_alert_scanner().store.save_rule(name, st.session_state["alerts_rule_kind"], st.session_state["alerts_rule_a"],
+        st.session_state["alerts_rule_b"], st.session_state["alerts_rule_factor"])
+
+def _onclick_enable_rules():
+    _get_alert_scanner().store.set_enabled(st.session_state.get("alerts_enabled", []))
+
+def _onclick_delete_rule():
+    _get_alert_scanner().store.delete_rule(st.session_state.get("alerts_delete_rule"))
+
+def _alert_rules(store):
+    """ rule table, plus add / enable / delete forms
+    """
+    rules = store.rules()
+    st.dataframe(rules)
+    names = rules["name"].tolist()
+    with st.form(key="alerts_enable_rules"):
+        st.multiselect("Enabled rules", names, rules[rules["enabled"] == 1]["name"].tolist(), key="alerts_enabled")
+        st.form_submit_button("Apply", on_click=_onclick_enable_rules)
+
+    with st.form(key="alerts_save_rule", clear_on_submit=True):
+        c1, c2, c3, c4, c5 = st.columns([3, 2, 2, 2, 1])
+        c1.text_input("Name", key="alerts_rule_name")
+        c2.selectbox("Kind", RULE_KINDS, key="alerts_rule_kind")
+        c3.selectbox("Value", RULE_COLUMNS, index=RULE_COLUMNS.index("rsi"), key="alerts_rule_a")
+        c4.selectbox("Reference", RULE_COLUMNS, index=RULE_COLUMNS.index("rsi_avg"), key="alerts_rule_b")
+        c5.number_input("x", value=1.0, step=0.5, key="alerts_rule_factor")
+        st.form_submit_button("Save rule", on_click=_onclick_save_rule)
+
+    with st.form(key="alerts_delete_rules"):
+        st.selectbox("Rule", names, key="alerts_delete_rule")
+        st.form_submit_button("Delete rule", on_click=_onclick_delete_rule)
+
+def do_alerts():
+    """ alerts of the background scanner (see mplfin_alerts.py)
+    """
+    scanner = _get_alert_scanner()
+    store = scanner.store
+    days = st.session_state.get("alerts_days", 5)
+    rules = st.session_state.get("alerts_rules", [])
+
+    if st.button("Scan now"):
+        t0 = time.perf_counter()
+        n_new = scanner.scan(force=True)
+        st.success(f"{n_new} new alerts in {1e3*_elapsed(t0):.0f} ms")
+    stats = scanner.stats
+    if stats["last_scan"]:
+        st.caption(f"last scan {datetime.fromtimestamp(stats['last_scan']):%Y-%m-%d %H:%M:%S}: {stats['symbols']} symbols, "
+                   f"{stats['fresh']} with new bars, quotes {1e3*stats['quotes_time']:.0f} ms, TA {1e3*stats['ta_time']:.0f} ms, "
+                   f"rules {1e3*stats['eval_time']:.0f} ms ({stats['scans']} scans, {stats['errors']} errors)")
+    else:
+        st.caption("first scan running ...")
+
+    since = pd.Timestamp.now().normalize() - pd.tseries.offsets.BDay(days)
+    df = store.query(since=since, rules=rules)
+    st.subheader(f"{len(df)} alerts since {since.date()}")
+    if not df.empty:
+        sector = dict(zip(etf_df["symbol"], etf_df["sector"]))
+        df.insert(1, "Name", df["symbol"].map(ticker_name))
+        df.insert(2, "Sector", df["symbol"].map(sector))
+        df["created_at"] = df["created_at"].map(lambda t: f"{datetime.fromtimestamp(t):%Y-%m-%d %H:%M}")
+        df["provisional"] = df["provisional"].astype(bool)
+        st.dataframe(df.drop(columns=["updated_at"]).style.format(precision=2), height=600)
+
+    with st.expander("Rules"):
+        _alert_rules(store)
 
 def do_show_etf_data():
     st.dataframe(etf_df)
@@ -433,10 +800,16 @@ def do_show_etf_chart():
     period_item = st.session_state.get("period", "daily")
     period = PERIOD_DICT[period_item]
 
-    for sect in st.session_state.get("selected_sectors", DEFAULT_SECTORS):
+    # fetched once on the server for all sessions (see mplfin_images.py),
+    # the browser falls back to finviz for images that failed
+    sectors = st.session_state.get("selected_sectors", DEFAULT_SECTORS)
+    image_cache = get_image_cache(IMAGE_ROOT)
+    images = image_cache.get_many([k for sect in sectors for k in etf_dict[sect]], period)
+
+    for sect in sectors:
         st.subheader(sect)
         for k,v in etf_dict[sect].items():
-            st.image(f"https://finviz.com/chart.ashx?t={k}&p={period}")
+            st.image(images.get(k) or image_cache.url(k, period))
             st.markdown(f" [{k}]({_finviz_chart_url(k, period)}) : {v} ", unsafe_allow_html=True)
             # don't know how to get futures chart img
 
@@ -450,6 +823,11 @@ menu_dict = {
     _STR_CHART: {"fn": do_mpl_chart},
     _STR_REVIEW_CHART: {"fn": do_review},
     _STR_ETF_CHART: {"fn": do_show_etf_chart},
+    _STR_ETF_SCREENER: {"fn": do_etf_screener},
+    _STR_ETF_BACKTEST: {"fn": do_etf_backtest},
+    _STR_ETF_SWEEP: {"fn": do_etf_sweep},
+    _STR_ETF_CORR: {"fn": do_etf_corr},
+    _STR_ALERTS: {"fn": do_alerts},
     _STR_ETF_DATA: {"fn": do_show_etf_data},
 }
 
@@ -467,6 +845,33 @@ def do_sidebar():
             st.selectbox('Period:', list(PERIOD_DICT.keys()), index=0, key="period")
             st.multiselect("Sectors", etf_sectors, DEFAULT_SECTORS, key="selected_sectors")
 
+        if menu_item == _STR_ETF_SCREENER:
+            st.multiselect("Sectors", etf_sectors, etf_sectors, key="screener_sectors")
+
+        if menu_item == _STR_ETF_BACKTEST:
+            st.multiselect("Sectors", etf_sectors, etf_sectors, key="backtest_sectors")
+            st.selectbox("History (years)", [2, 5, 10], index=1, key="backtest_years")
+            st.radio("Positions", MODES, index=0, key="backtest_mode")
+            st.number_input("Signal threshold", min_value=0.0, value=THRESHOLD, step=0.5, key="backtest_threshold")
+            st.number_input("Cost per trade (bps)", min_value=0.0, value=COST_BPS, step=1.0, key="backtest_cost")
+
+        if menu_item == _STR_ETF_CORR:
+            st.multiselect("Sectors", etf_sectors, etf_sectors, key="corr_sectors")
+            st.selectbox("Window (bars)", [20, 60, 120, 250], index=1, key="corr_window")
+            st.selectbox("Benchmark", etf_df["symbol"].tolist(), index=etf_df["symbol"].tolist().index(BENCHMARK), key="corr_benchmark")
+
+        if menu_item == _STR_ALERTS:
+            st.selectbox("Days back", [1, 5, 20, 60], index=1, key="alerts_days")
+            st.multiselect("Rules", _get_alert_scanner().store.rules()["name"].tolist(), [], key="alerts_rules")
+
+        if menu_item == _STR_ETF_SWEEP:
+            st.multiselect("Sectors", etf_sectors, etf_sectors, key="sweep_sectors")
+            st.selectbox("History (years)", [2, 5, 10], index=1, key="sweep_years")
+            st.radio("Positions", MODES, index=0, key="sweep_mode")
+            st.selectbox("Metric", METRICS, index=0, key="sweep_metric")
+            for p in PARAMS:
+                st.text_input(p, ", ".join(str(v) for v in DEFAULT_GRID[p]), key=f"sweep_{p}")
+
 
         if menu_item == _STR_REVIEW_CHART:
             st.image(BACKGROUND_IMG_URL)  # padding
@@ -475,16 +880,32 @@ def do_sidebar():
             if btn_cleanup:
                 for f in Path(CHART_ROOT).glob("*.png"):
                     f.unlink()
+                get_chart_index(CHART_ROOT).delete()
 
         if menu_item == _STR_CHART:
+            st.selectbox("Timeframe", list(PERIOD_DICT.keys()) + list(INTRADAY_INTERVALS.keys()), index=0, key="TIMEFRAME")
+            st.checkbox("Interactive chart (zoom/pan in browser)", value=False, key="INTERACTIVE")
             st.number_input("Figure width", value=FIGURE_WIDTH, key="FIGURE_WIDTH")
             st.number_input("Figure height", value=FIGURE_HEIGHT, key="FIGURE_HEIGHT")
+            st.number_input("Days plotted", min_value=20, max_value=NUM_DAYS_QUOTE, value=NUM_DAYS_PLOT, key="NUM_DAYS_PLOT")
+            st.selectbox("Style", CHART_STYLES, index=CHART_STYLES.index(CHART_STYLE), key="CHART_STYLE")
+            st.checkbox("Show stage timings", value=False, key="SHOW_TIMINGS")
+            st.checkbox("Save charts for review", value=True, key="PERSIST_CHARTS")
+            st.checkbox("Parallel rendering", value=False, key="PARALLEL_RENDER")
+            if st.session_state.get("PARALLEL_RENDER", False):
+                st.number_input("Workers", min_value=1, max_value=32, value=NUM_WORKERS, key="NUM_WORKERS")
+                st.number_input("Timeout per ticker (sec)", min_value=5, value=TICKER_TIMEOUT, key="TICKER_TIMEOUT")
 
 
 # body
 def do_body():
     menu_item = st.session_state.menu_item  
-    menu_dict[menu_item]["fn"]()
+    if menu_item not in [_STR_CHART, _STR_REVIEW_CHART]:
+        _get_janitor().pin(_session_id(), [])   # no charts in use
+    # a yahoo_async download checks for a rerun while it waits, so that
+    # a changed ticker input stops the run right away and cancels the download
+    with fetch_checkpoint(_stop_requested):
+        menu_dict[menu_item]["fn"]()
 
 
 def main():
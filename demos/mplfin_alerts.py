@@ -0,0 +1,284 @@
+"""
+Signal alerts for demo_mplfin.py (alerts page)
+
+a background thread (AlertScanner) scans the ETF universe whenever fresh
+bars land (it sleeps until the quotes expire, see quote_expiry in
+mplfin_calendar.py):
+- symbols whose last bar changed are advanced by the shared TA engine
+  (mplfin_stream.py, one incremental step per new bar, same state the
+  chart page uses), the others are not touched
+- the rules are then evaluated on the last two TA rows of those symbols
+  at once (TaEngine.last_rows, numpy arrays of symbols), no TA frame is
+  built: a scan of the universe is a few milliseconds plus about half a
+  millisecond per symbol with a new bar
+- matches are written to CHART_ROOT/alerts.db, one row per (symbol,
+  rule, bar): a rescan of the same bar updates it, an in-session bar is
+  flagged provisional until the session closes
+
+rules (table rules, editable on the alerts page): kind, a, b, factor over
+the TA columns in RULE_COLUMNS
+- cross_above : a crosses above factor*b (prev a <= factor*b, last a > factor*b)
+- cross_below : a crosses below factor*b
+- above       : a > factor*b on the last bar (e.g. Volume > 2*vol_avg)
+
+scan timing with a synthetic universe:
+    python mplfin_alerts.py
+"""
+from pathlib import Path
+from threading import Lock
+import sqlite3 as sql
+import time
+
+import numpy as np
+import pandas as pd
+
+from mplfin_calendar import get_calendar, quote_expiry
+from mplfin_stream import get_ta_engine
+from mplfin_worker import PeriodicThread
+
+ALERTS_FILE = "alerts.db"
+RULE_KINDS = ["cross_above", "cross_below", "above"]
+RULE_COLUMNS = ["Close", "Volume", "rsi", "rsi_avg", "rsi_signal", "ema_slow", "ema_long", "vol_avg"]   # kept by the compact TA engine
+DEFAULT_RULES = [
+    # name, kind, a, b, factor
+    ("RSI above avg", "cross_above", "rsi", "rsi_avg", 1.0),
+    ("RSI below avg", "cross_below", "rsi", "rsi_avg", 1.0),
+    ("Close above EMA long", "cross_above", "Close", "ema_long", 1.0),
+    ("Close below EMA long", "cross_below", "Close", "ema_long", 1.0),
+    ("Volume spike", "above", "Volume", "vol_avg", 2.0),
+]
+MAX_SCAN_WAIT = 15*60   # seconds, rescan at least this often
+
+class AlertStore:
+    def __init__(self, root):
+        self.path = Path(root) / ALERTS_FILE
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("""create table if not exists rules (
+                name text primary key, kind text not null, a text not null, b text not null,
+                factor real default 1.0, enabled integer default 1)""")
+            conn.execute("""create table if not exists alerts (
+                symbol text, rule text, bar_time text, a real, b real, close real,
+                provisional integer, created_at real, updated_at real,
+                primary key (symbol, rule, bar_time))""")
+            conn.execute("create index if not exists alerts_created on alerts (created_at)")
+            if conn.execute("select count(*) from rules").fetchone()[0] == 0:
+                conn.executemany("insert into rules (name, kind, a, b, factor) values (?,?,?,?,?)", DEFAULT_RULES)
+
+    def _connect(self):
+        # short-lived connections, the scanner writes from its own thread
+        return sql.connect(self.path, timeout=10)
+
+    def rules(self, enabled_only=False):
+        with self._connect() as conn:
+            return pd.read_sql("select * from rules" + (" where enabled = 1" if enabled_only else "") + " order by name", conn)
+
+    def save_rule(self, name, kind, a, b, factor=1.0, enabled=True):
+        if kind not in RULE_KINDS or a not in RULE_COLUMNS or b not in RULE_COLUMNS:
+            raise ValueError(f"invalid rule: {kind} {a} {b}")
+        with self._connect() as conn:
+            conn.execute("insert or replace into rules values (?,?,?,?,?,?)", (name, kind, a, b, float(factor), int(enabled)))
+
+    def set_enabled(self, names):
+        """ enable exactly the rules in names
+        """
+        with self._connect() as conn:
+            conn.execute(f"update rules set enabled = name in ({','.join('?' * len(names))})", list(names))
+
+    def delete_rule(self, name):
+        with self._connect() as conn:
+            conn.execute("delete from rules where name = ?", (name,))
+
+    def record(self, events):
+        """ upsert alert rows [(symbol, rule, bar_time, a, b, close, provisional)], returns the number of new alerts
+        """
+        if not events:
+            return 0
+        now = time.time()
+        with self._connect() as conn:
+            before = conn.execute("select count(*) from alerts").fetchone()[0]
+            conn.executemany("""insert into alerts values (?,?,?,?,?,?,?,?,?)
+                on conflict (symbol, rule, bar_time) do update set
+                a = excluded.a, b = excluded.b, close = excluded.close,
+                provisional = excluded.provisional, updated_at = excluded.updated_at""",
+                [(*e, now, now) for e in events])
+            return conn.execute("select count(*) from alerts").fetchone()[0] - before
+
+    def query(self, since=None, rules=None, symbols=None, limit=1000):
+        """ dataframe of alerts, newest bar first
+        """
+        where, params = [], []
+        if since is not None:
+            where.append("bar_time >= ?")
+            params.append(str(pd.Timestamp(since).date()))
+        for col, values in [("rule", rules), ("symbol", symbols)]:
+            if values:
+                where.append(f"{col} in ({','.join('?' * len(values))})")
+                params += list(values)
+        stmt = "select * from alerts" + (" where " + " and ".join(where) if where else "")
+        with self._connect() as conn:
+            return pd.read_sql(stmt + " order by bar_time desc, created_at desc limit ?", conn, params=params + [limit])
+
+    def delete(self):
+        with self._connect() as conn:
+            conn.execute("delete from alerts")
+
+def evaluate(rules, symbols, rows, times):
+    """ [(symbol, rule, bar_time, a, b, close)] of the rules matching the last bar,
+    rules: AlertStore.rules(), rows: last two TA rows (2 x symbols x RULE_COLUMNS),
+    times: last bar time per symbol (see TaEngine.last_rows)
+    """
+    col = {c: j for j, c in enumerate(RULE_COLUMNS)}
+    close = rows[1, :, col["Close"]]
+    events = []
+    for rule in rules.itertuples():
+        a, b = rows[:, :, col[rule.a]], rule.factor * rows[:, :, col[rule.b]]
+        with np.errstate(invalid='ignore'):
+            if rule.kind == "cross_above":
+                hit = (a[0] <= b[0]) & (a[1] > b[1])
+            elif rule.kind == "cross_below":
+                hit = (a[0] >= b[0]) & (a[1] < b[1])
+            else:
+                hit = a[1] > b[1]
+        for j in np.flatnonzero(hit):
+            events.append((symbols[j], rule.name, _bar_time(times[j]), float(a[1, j]), float(b[1, j]), float(close[j])))
+    return events
+
+def _bar_time(ts):
+    # daily bars by date, intraday ones by time
+    return str(ts.date()) if ts == ts.normalize() else str(ts)
+
+def _bar_signature(df):
+    # a revised in-session bar always moves Volume
+    return len(df), df.index[-1], df["Close"].values[-1], df["Volume"].values[-1]
+
+class AlertScanner(PeriodicThread):
+    def __init__(self, symbols, store, quotes_fn, engine=None, max_wait=MAX_SCAN_WAIT):
+        """ quotes_fn(symbols) -> {symbol: daily bars}, the same bars as the chart page
+        """
+        super().__init__("alert-scanner", max_wait)
+        self.symbols, self.store, self.quotes_fn = list(symbols), store, quotes_fn
+        self.engine = engine or get_ta_engine()
+        self._seen = {}   # symbol: last bar signature
+        self._lock = Lock()
+        self.stats = {"scans": 0, "last_scan": None, "symbols": 0, "fresh": 0, "alerts": 0,
+                      "quotes_time": 0.0, "ta_time": 0.0, "eval_time": 0.0, "errors": 0}
+
+    def scan(self, force=False):
+        """ one pass over the universe, returns the number of new alerts,
+        force: evaluate the rules on every symbol (e.g. after a rule change), not only the fresh ones
+        """
+        with self._lock:
+            t0 = time.perf_counter()
+            quotes = self.quotes_fn(self.symbols)
+            t1 = time.perf_counter()
+            fresh = []
+            for symbol, df in quotes.items():
+                if df is None or df.empty:
+                    continue
+                sig = _bar_signature(df)
+                if self._seen.get(symbol) != sig:
+                    try:
+                        self.engine.advance(symbol, df)
+                    except Exception:
+                        self.stats["errors"] += 1
+                        continue
+                    self._seen[symbol] = sig
+                    fresh.append(symbol)
+            t2 = time.perf_counter()
+            n_new = 0
+            targets = [s for s in quotes if s in self._seen] if force else fresh
+            if targets:
+                # rules on the fresh symbols only, the others were scanned with the same bar before
+                rows, times = self.engine.last_rows(targets, RULE_COLUMNS)
+                for s, t in zip(targets, times):
+                    if t is None:
+                        self._seen.pop(s, None)   # dropped from the engine meanwhile, advance on the next scan
+                today = str(get_calendar().now().date())
+                in_session = get_calendar().in_session()
+                events = evaluate(self.store.rules(enabled_only=True), targets, rows, times)
+                n_new = self.store.record([(*e, int(in_session and e[2] == today)) for e in events])
+            t3 = time.perf_counter()
+            self.stats.update(scans=self.stats["scans"] + 1, last_scan=time.time(), symbols=len(quotes),
+                fresh=len(fresh), alerts=self.stats["alerts"] + n_new,
+                quotes_time=t1 - t0, ta_time=t2 - t1, eval_time=t3 - t2)
+            return n_new
+
+    def step(self):
+        self.scan()
+
+    def on_error(self, e):
+        self.stats["errors"] += 1
+
+    def next_wait(self):
+        # until the quotes expire (next bar close + settle), at most interval (max_wait)
+        return min(self.interval, max(5.0, quote_expiry(time.time()) - time.time()))
+
+##############################################
+## scan timing
+##############################################
+if __name__ == '__main__':
+    import tempfile
+    from mplfin_core import _calculate_ta
+    from mplfin_quotes import synthetic_quotes
+    from mplfin_stream import TaEngine
+
+    symbols = [f"ETF{i:02d}" for i in range(80)]
+    full = {s: synthetic_quotes(s, end_date="2024-06-28").tail(600) for s in symbols}
+    day = [500]
+    quotes_fn = lambda syms: {s: full[s].iloc[:day[0]] for s in syms}
+
+    with tempfile.TemporaryDirectory() as root:
+        store = AlertStore(root)
+        assert len(store.rules()) == len(DEFAULT_RULES)
+        scanner = AlertScanner(symbols, store, quotes_fn, engine=TaEngine(compact=True))
+        scanner.scan()   # first scan: full TA per symbol
+        first = dict(scanner.stats)
+        times = []
+        for day[0] in range(501, 601):
+            scanner.scan()
+            times.append((scanner.stats["ta_time"], scanner.stats["eval_time"]))
+        assert scanner.engine.stats["full"] == len(symbols), scanner.engine.stats
+
+        # every recorded alert matches the rule on a full recompute, and nothing is missed
+        alerts = store.query(limit=100000)
+        rules = store.rules().set_index("name")
+        expected = set()
+        for s in symbols:
+            ta = _calculate_ta(full[s].copy())
+            for name, r in rules.iterrows():
+                a, b = ta[r.a].values, r.factor * ta[r.b].values
+                if r.kind == "cross_above":
+                    hit = (a[:-1] <= b[:-1]) & (a[1:] > b[1:])
+                elif r.kind == "cross_below":
+                    hit = (a[:-1] >= b[:-1]) & (a[1:] < b[1:])
+                else:
+                    hit = a[1:] > b[1:]
+                expected |= {(s, name, str(d.date())) for d in ta.index[1:][hit] if d >= full[s].index[499]}
+        got = set(zip(alerts.symbol, alerts.rule, alerts.bar_time))
+        assert got == expected, (len(got), len(expected), sorted(got ^ expected)[:5])
+
+        # a rescan without new bars touches nothing, a new rule applies on a forced scan
+        n = len(alerts)
+        assert scanner.scan() == 0 and scanner.stats["fresh"] == 0
+        idle = scanner.stats["ta_time"] + scanner.stats["eval_time"]
+        store.save_rule("RSI signal > 1", "above", "rsi_signal", "rsi_avg", 0.0)
+        store.set_enabled(["RSI signal > 1"])
+        new = scanner.scan(force=True)
+        assert new == sum(_calculate_ta(full[s].copy()).rsi_signal.values[-1] > 0 for s in symbols), new
+        # a revised (in-session) last bar updates its alert row
+        full["ETF00"].iloc[-1, full["ETF00"].columns.get_loc("Close")] *= 1.05
+        scanner.scan()
+        assert scanner.stats["fresh"] == 1 and len(store.query(limit=100000)) in (n + new, n + new + 1)
+        # background loop: one scan on start, stops and joins
+        scans = scanner.stats["scans"]
+        scanner.start()
+        scanner.stop()
+        scanner.join(timeout=30)
+        assert not scanner.is_alive() and scanner.stats["scans"] <= scans + 1 and scanner.stats["errors"] == 0
+        print(store.query(limit=5))
+        ta_time, eval_time = 1e3*np.median(times, axis=0)
+        print(f"alerts ok: {n} alerts over {len(times)} bars x {len(symbols)} symbols")
+        print(f"first scan (full TA) {1e3*first['ta_time']:.0f} ms, per new bar: TA {ta_time:.1f} ms + rules {eval_time:.1f} ms, "
+              f"rescan without new bars {1e3*idle:.1f} ms")
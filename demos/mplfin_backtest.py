@@ -0,0 +1,212 @@
+"""
+Vectorized rsi_signal backtest for demo_mplfin.py (ETF backtest page)
+
+positions come from rsi_signal (rsi - rsi_avg, see _ta_RSI) of the
+QuotePanel TA (dates x symbols, mplfin_panel.py), for every symbol at once:
+- long when rsi_signal crosses above +threshold, out (long_flat) or
+  short (long_short) when it crosses below -threshold, held in between
+- decided on the close of bar t, earns the close-to-close return of
+  bar t+1 (no look-ahead), cost_bps per unit of position change
+- no position before the RSI is seeded (RSI_PERIOD bars)
+- rows are dates: over a missing bar the position is held and the next
+  return spans the gap, after a symbol's last bar it earns nothing;
+  the sharpe only counts the bars from listing to the last bar
+
+backtest() returns per-symbol stats: return, buy & hold return over the
+same bars, max drawdown, trades, hit rate (winning trades), exposure,
+annualized sharpe. sector_stats() averages them per sector, sweep() runs
+a grid of thresholds x modes on the same TA in one 3-D pass.
+
+check against a per-symbol loop + timing:
+    python mplfin_backtest.py
+"""
+import numpy as np
+import pandas as pd
+
+from mplfin_ta import _first_valid
+
+MODES = ["long_flat", "long_short"]
+THRESHOLD = 0.0
+COST_BPS = 5.0
+BARS_PER_YEAR = 252
+SWEEP_THRESHOLDS = [0.0, 0.5, 1.0, 1.5, 2.0, 3.0, 4.0, 5.0]
+STATS_COLUMNS = ["Return(%)", "Buy&hold(%)", "Max DD(%)", "Trades", "Hit rate(%)", "Exposure(%)", "Sharpe"]
+
+def positions(signal, threshold=THRESHOLD, mode="long_flat"):
+    """ position (1, 0, -1) per bar and symbol from signal (bars x symbols),
+    threshold may be an array of k thresholds: result is k x bars x symbols
+    """
+    th = np.asarray(threshold, dtype=float)
+    th = th.reshape(th.shape + (1,)*signal.ndim)
+    short = -1.0 if mode == "long_short" else 0.0
+    with np.errstate(invalid='ignore'):
+        state = np.where(signal > th, 1.0, np.where(signal < -th, short, np.nan))
+    before = np.arange(signal.shape[-2])[:, None] < _first_valid(signal)
+    state = np.where(before, 0.0, state)   # flat until the signal exists, held over missing bars after
+    # hold the last state inside the band (forward fill along the bars)
+    axis = state.ndim - 2
+    rows = np.arange(state.shape[axis]).reshape((-1, 1))
+    last = np.maximum.accumulate(np.where(np.isnan(state), 0, rows), axis=axis)
+    pos = np.take_along_axis(state, last, axis=axis)
+    return np.nan_to_num(pos)
+
+def _returns(close):
+    # a missing bar: the next bar's return spans the gap, zero after the last bar
+    close = pd.DataFrame(close).ffill().values
+    with np.errstate(invalid='ignore', divide='ignore'):
+        ret = np.vstack([np.full((1, close.shape[1]), np.nan), close[1:] / close[:-1] - 1])
+    return np.nan_to_num(ret)
+
+def _listed(close):
+    """ rows from each symbol's first to its last bar (dates x symbols)
+    """
+    rows = np.arange(len(close))[:, None]
+    last = len(close) - 1 - _first_valid(close[::-1])
+    return (rows >= _first_valid(close)) & (rows <= last)
+
+def _trade_stats(pos, strat):
+    """ (trades, winning trades) per symbol, a trade is a run of the same nonzero position
+    """
+    k, n, m = pos.shape
+    prev = np.concatenate([np.zeros((k, 1, m)), pos[:, :-1]], axis=1)
+    # column-major flatten: each (k, symbol) column is one run of bars
+    p = pos.transpose(0, 2, 1).ravel()
+    starts = (p != 0) & (p != prev.transpose(0, 2, 1).ravel())
+    trade = np.cumsum(starts) - 1
+    # a trade earns from the bar after its entry until the bar after its exit
+    held = np.concatenate([np.zeros((k, 1, m)), pos[:, :-1]], axis=1).transpose(0, 2, 1).ravel()
+    held_trade = np.concatenate([[-1], trade[:-1]])
+    column = np.repeat(np.arange(k*m), n)
+    same_column = np.concatenate([[False], column[1:] == column[:-1]])
+    in_trade = (held != 0) & same_column
+    n_trades = int(starts.sum())
+    pnl = np.bincount(held_trade[in_trade], weights=np.log1p(strat.transpose(0, 2, 1).ravel()[in_trade]), minlength=n_trades)
+    trade_column = column[starts]
+    trades = np.bincount(trade_column, minlength=k*m).reshape(k, m)
+    wins = np.bincount(trade_column, weights=pnl > 0, minlength=k*m).reshape(k, m)
+    return trades, wins
+
+def _stats(close, signal, pos, cost_bps):
+    """ stats arrays (k x symbols) for positions pos (k x bars x symbols)
+    """
+    ret = _returns(close)
+    held = np.concatenate([np.zeros_like(pos[:, :1]), pos[:, :-1]], axis=1)
+    turnover = np.abs(np.diff(pos, axis=1, prepend=0.0))
+    strat = held * ret - turnover * cost_bps / 1e4
+    log_eq = np.cumsum(np.log1p(strat), axis=1)
+    dd = np.exp(log_eq - np.maximum.accumulate(np.maximum(log_eq, 0), axis=1)) - 1
+    # buy & hold over the bars the signal exists
+    listed = _listed(close)
+    live = listed & (np.arange(len(close))[:, None] >= _first_valid(signal))
+    bh = np.exp(np.sum(np.log1p(np.where(live, ret, 0.0)), axis=0)) - 1
+    trades, wins = _trade_stats(pos, strat)
+    n_live = np.maximum(live.sum(axis=0), 1)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        # not the zero returns before listing / after the last bar
+        listed_strat = np.where(listed, strat, np.nan)
+        std = np.nanstd(listed_strat, axis=1)
+        sharpe = np.where(std > 0, np.nanmean(listed_strat, axis=1) / std * np.sqrt(BARS_PER_YEAR), np.nan)
+        hit = np.where(trades > 0, 100 * wins / trades, np.nan)
+    return {
+        "Return(%)": 100 * (np.exp(log_eq[:, -1]) - 1),
+        "Buy&hold(%)": np.broadcast_to(100 * bh, log_eq.shape[::2]),
+        "Max DD(%)": 100 * dd.min(axis=1),
+        "Trades": trades,
+        "Hit rate(%)": hit,
+        "Exposure(%)": 100 * ((held != 0) & live).sum(axis=1) / n_live,
+        "Sharpe": sharpe,
+    }, log_eq
+
+def backtest(panel, ta, threshold=THRESHOLD, mode="long_flat", cost_bps=COST_BPS):
+    """ (stats dataframe per symbol, equity dataframe dates x symbols)
+    panel: QuotePanel, ta: panel_ta(panel)
+    """
+    pos = positions(ta["rsi_signal"], [threshold], mode)
+    stats, log_eq = _stats(panel["Close"], ta["rsi_signal"], pos, cost_bps)
+    df = pd.DataFrame({k: v[0] for k, v in stats.items()}, index=pd.Index(panel.symbols, name="Ticker"))
+    df["Trades"] = df["Trades"].astype(int)
+    return df[STATS_COLUMNS], pd.DataFrame(np.exp(log_eq[0]), index=panel.dates, columns=panel.symbols)
+
+def sector_stats(stats, sector):
+    """ mean stats per sector, sector: {symbol: sector}
+    """
+    df = stats.copy()
+    df["Symbols"] = 1
+    df = df.groupby(df.index.map(sector)).agg({**{c: "mean" for c in STATS_COLUMNS}, "Symbols": "sum"})
+    df.index.name = "Sector"
+    return df.sort_values("Return(%)", ascending=False)
+
+def sweep(panel, ta, thresholds=SWEEP_THRESHOLDS, modes=MODES, cost_bps=COST_BPS):
+    """ universe mean of the stats for every (mode, threshold)
+    """
+    rows = []
+    for mode in modes:
+        pos = positions(ta["rsi_signal"], thresholds, mode)
+        stats, _ = _stats(panel["Close"], ta["rsi_signal"], pos, cost_bps)
+        for i, th in enumerate(thresholds):
+            rows.append({"Mode": mode, "Threshold": th, **{k: np.nanmean(v[i]) for k, v in stats.items()}})
+    return pd.DataFrame(rows).set_index(["Mode", "Threshold"])
+
+##############################################
+## loop check / timing
+##############################################
+if __name__ == '__main__':
+    import time
+    from mplfin_core import _calculate_ta
+    from mplfin_panel import QuotePanel, panel_ta
+    from mplfin_quotes import synthetic_quotes
+
+    def loop_backtest(df, threshold, mode, cost_bps):
+        """ plain per-bar loop over one symbol, the reference
+        """
+        ta = _calculate_ta(df.copy())
+        close, signal = ta.Close.values, ta.rsi_signal.values
+        pos, equity, peak, max_dd, trades, wins, trade_eq = 0.0, 1.0, 1.0, 0.0, 0, 0, 1.0
+        for t in range(1, len(close)):
+            s = signal[t]
+            new = pos
+            if s > threshold:
+                new = 1.0
+            elif s < -threshold:
+                new = -1.0 if mode == "long_short" else 0.0
+            r = pos * (close[t] / close[t-1] - 1) - abs(new - pos) * cost_bps / 1e4
+            equity *= 1 + r
+            if pos:
+                trade_eq *= 1 + r
+            if new != pos:
+                wins += pos != 0 and trade_eq > 1
+                trades += new != 0
+                trade_eq = 1.0
+            pos = new
+            peak = max(peak, equity)
+            max_dd = min(max_dd, equity / peak - 1)
+        wins += pos != 0 and trade_eq > 1   # open trade
+        return 100 * (equity - 1), 100 * max_dd, trades, 100 * wins / trades
+
+    symbols = [f"ETF{i:02d}" for i in range(80)]
+    quotes = {s: synthetic_quotes(s, end_date="2024-06-28").tail(2500 - 10*i) for i, s in enumerate(symbols)}
+    # stale (last bar earlier) and missing bars: on its own dates each is the per-symbol loop
+    for i, s in enumerate(symbols[::9]):
+        quotes[s] = quotes[s].iloc[:-20*i] if i % 2 else quotes[s].drop(quotes[s].index[300:300+i])
+    panel = QuotePanel(quotes)
+    t0 = time.perf_counter()
+    ta = panel_ta(panel)
+    t1 = time.perf_counter()
+    for mode in MODES:
+        stats, equity = backtest(panel, ta, threshold=1.0, mode=mode, cost_bps=COST_BPS)
+        for s in symbols[::9]:
+            ret, dd, trades, hit = loop_backtest(quotes[s], 1.0, mode, COST_BPS)
+            assert np.isclose(stats.loc[s, "Return(%)"], ret, rtol=1e-6, atol=1e-6), (s, mode, stats.loc[s, "Return(%)"], ret)
+            assert np.isclose(stats.loc[s, "Max DD(%)"], dd, rtol=1e-6, atol=1e-6), (s, mode, stats.loc[s, "Max DD(%)"], dd)
+            assert stats.loc[s, "Trades"] == trades, (s, mode, stats.loc[s, "Trades"], trades)
+            assert np.isclose(stats.loc[s, "Hit rate(%)"], hit), (s, mode, stats.loc[s, "Hit rate(%)"], hit)
+        # equal-weight rows are the same day for every symbol
+        assert equity.index.equals(panel.dates) and (equity.loc[equity.index > quotes[symbols[9]].index[-1].tz_localize(None), symbols[9]].diff().dropna() == 0).all()
+    t2 = time.perf_counter()
+    grid = sweep(panel, ta)
+    t3 = time.perf_counter()
+    sector = {s: f"sector{i % 5}" for i, s in enumerate(symbols)}
+    print(sector_stats(stats, sector).round(2))
+    print(grid.round(2))
+    print(f"backtest ok: {len(symbols)} symbols x {len(ta['rsi_signal'])} bars, panel TA {1e3*(t1-t0):.0f} ms, "
+          f"sweep of {len(grid)} settings {1e3*(t3-t2):.0f} ms")
@@ -0,0 +1,108 @@
+"""
+Headless batch pre-render for demo_mplfin.py
+
+renders a watchlist (or sectors of the ETF universe) into CHART_ROOT in a
+process pool, same pipeline as the chart page: batched quotes from the
+quote store, _calculate_ta + _chart_ta in _chart_worker, and records
+every ticker in CHART_ROOT/manifest.json (ticker, last bar date, render
+time, error; see mplfin_manifest.py). The chart page serves those charts
+while their quotes have not expired and the settings match.
+
+    python mplfin_batch.py                                 # all sectors
+    python mplfin_batch.py --sectors "Equity Index" Sector
+    python mplfin_batch.py --tickers SPY,QQQ,GLD --workers 8
+
+quotes expire at the next 15 minute bar close in session (mplfin_calendar.py),
+so schedule it accordingly, e.g. cron:
+    */15 9-16 * * 1-5  cd demos && python mplfin_batch.py
+"""
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from pathlib import Path
+from traceback import format_exc
+import argparse
+import re
+import time
+
+from mplfin_core import (
+    CHART_ROOT, CHART_STYLE, FIGURE_HEIGHT, FIGURE_WIDTH, NUM_DAYS_PLOT, NUM_DAYS_QUOTE,
+    NUM_WORKERS, QUOTE_ROOT, TICKER_TIMEOUT, _chart_worker, _save_chart, _ta_params,
+)
+from mplfin_calendar import quote_expiry
+from mplfin_etf import ETF_DATA, ETF_SECTORS
+from mplfin_manifest import get_manifest, params_key
+from mplfin_store import get_quote_store
+
+def _parse_tickers(s):
+    return list(dict.fromkeys(t.upper() for t in re.sub('[^0-9a-zA-Z]+', ' ', s).split()))
+
+def _universe(sectors=None):
+    sectors = sectors or ETF_SECTORS
+    return [d["symbol"] for d in sorted(ETF_DATA, key=lambda d: d["order"]) if d["sector"] in sectors]
+
+def prerender(tickers, chart_root=CHART_ROOT, render_params=None,
+              num_workers=NUM_WORKERS, timeout=TICKER_TIMEOUT, log=print):
+    """ render tickers into chart_root and update its manifest, returns the new entries
+    """
+    render_params = render_params or dict(figsize=(FIGURE_WIDTH, FIGURE_HEIGHT),
+                                          num_days_plot=NUM_DAYS_PLOT, style=CHART_STYLE)
+    key = params_key(render_params, _ta_params())
+    chart_root = Path(chart_root)
+    manifest = get_manifest(chart_root)
+
+    t0 = time.perf_counter()
+    store = get_quote_store(QUOTE_ROOT)
+    try:
+        quotes = store.get_many(tickers, NUM_DAYS_QUOTE, ttl=quote_expiry)
+    except:
+        log(f"batched download failed, falling back to per ticker\n{format_exc()}")
+        quotes = {}
+    log(f"quotes: {len(quotes)}/{len(tickers)} in {time.perf_counter() - t0:.1f} sec")
+
+    entries = {}
+    with ProcessPoolExecutor(max_workers=num_workers) as pool:
+        futures = {}
+        for ticker in tickers:
+            # tickers missing from the batch are downloaded by the worker
+            f = pool.submit(_chart_worker, ticker, df=quotes.get(ticker), num_days=NUM_DAYS_QUOTE,
+                            chart_root=chart_root, render_params=render_params, timeout=timeout)
+            futures[f] = ticker
+        for f in as_completed(futures):
+            ticker = futures[f]
+            try:
+                ticker_dict = f.result()
+            except:
+                ticker_dict = {"ticker": ticker, "err_msg": format_exc()}
+            meta = store.read_meta(ticker) if ticker in quotes else None
+            expires_at = quote_expiry(meta[0] if meta else time.time())
+            if not ticker_dict.get("err_msg"):
+                _save_chart(ticker_dict)
+            entries[ticker] = manifest.entry(ticker_dict, ticker_dict.get("elapsed"), expires_at, key)
+            status = ticker_dict["err_msg"].strip().splitlines()[-1] if ticker_dict.get("err_msg") else f'{ticker_dict["date"]:%Y-%m-%d}'
+            log(f"{ticker:>6}: {status} ({ticker_dict.get('elapsed') or 0:.2f} sec)")
+    manifest.update(entries)
+    return entries
+
+def main():
+    parser = argparse.ArgumentParser(description="pre-render mplfinance charts into CHART_ROOT")
+    parser.add_argument("--tickers", help="comma separated watchlist (default: ETF universe)")
+    parser.add_argument("--sectors", nargs="*", choices=ETF_SECTORS, help="ETF sectors (default: all)")
+    parser.add_argument("--chart-root", default=str(CHART_ROOT))
+    parser.add_argument("--workers", type=int, default=NUM_WORKERS)
+    parser.add_argument("--timeout", type=int, default=TICKER_TIMEOUT, help="seconds per ticker")
+    parser.add_argument("--figure-width", type=float, default=FIGURE_WIDTH)
+    parser.add_argument("--figure-height", type=float, default=FIGURE_HEIGHT)
+    parser.add_argument("--days-plotted", type=int, default=NUM_DAYS_PLOT)
+    parser.add_argument("--style", default=CHART_STYLE)
+    args = parser.parse_args()
+
+    tickers = _parse_tickers(args.tickers) if args.tickers else _universe(args.sectors)
+    render_params = dict(figsize=(args.figure_width, args.figure_height),
+                         num_days_plot=args.days_plotted, style=args.style)
+    t0 = time.perf_counter()
+    entries = prerender(tickers, chart_root=args.chart_root, render_params=render_params,
+                        num_workers=args.workers, timeout=args.timeout)
+    n_err = sum(1 for e in entries.values() if e.get("err_msg"))
+    print(f"{len(entries) - n_err} charts, {n_err} errors in {time.perf_counter() - t0:.1f} sec")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,100 @@
+"""
+Two-level chart cache for demo_mplfin.py
+
+- TA cache    : indicator frames keyed by ta_key =
+                sha1(ticker, first/last quote timestamp, number of bars,
+                last bar OHLCV, indicator parameters)
+                (an in-session bar changes without a new timestamp)
+- render cache: PNG bytes + quote summary keyed by
+                sha1(ta_key, figure size, days plotted, style)
+
+a resize, style or NUM_DAYS_PLOT change misses the render cache only,
+so it costs one redraw and no download or TA; a render hit does not
+touch matplotlib at all
+"""
+from collections import OrderedDict
+from threading import Lock
+import hashlib
+
+import numpy as np
+
+MAX_RENDER_ENTRIES = 200
+MAX_TA_ENTRIES = 200
+
+def ta_key(ticker, df, params):
+    last_bar = np.asarray(df[["Open", "High", "Low", "Close", "Volume"]].values[-1], dtype=float)
+    key = repr((ticker, str(df.index[0]), str(df.index[-1]), len(df),
+                last_bar.tobytes().hex(), sorted(params.items())))
+    return hashlib.sha1(key.encode()).hexdigest()
+
+def render_key(ta_key, render_params):
+    params = {k: tuple(float(x) for x in v) if k == "figsize" else v for k, v in render_params.items()}
+    return hashlib.sha1(repr((ta_key, sorted(params.items()))).encode()).hexdigest()
+
+class LruCache:
+    """ thread-safe LRU shared by all sessions, with hit/miss counters
+    """
+    def __init__(self, max_entries, sizeof=None):
+        self.max_entries = max_entries
+        self.sizeof = sizeof
+        self._lock = Lock()
+        self._entries = OrderedDict()
+        self.hits = self.misses = 0
+
+    def get(self, key):
+        with self._lock:
+            value = self._entries.get(key)
+            if value is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key, value):
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def values(self):
+        """ snapshot of the cached values, does not count as hits
+        """
+        with self._lock:
+            return list(self._entries.values())
+
+    def stats(self):
+        with self._lock:
+            n_bytes = sum(self.sizeof(v) for v in self._entries.values()) if self.sizeof else 0
+            total = self.hits + self.misses
+            return {"hits": self.hits, "misses": self.misses,
+                    "hit_rate": self.hits / total if total else 0.0,
+                    "entries": len(self._entries), "bytes": n_bytes}
+
+class RenderCache(LruCache):
+    """ {render_key: ticker_dict with img_bytes}, a copy is handed out
+    """
+    def __init__(self, max_entries=MAX_RENDER_ENTRIES):
+        super().__init__(max_entries, sizeof=lambda d: len(d.get("img_bytes") or b""))
+
+    def get(self, key):
+        ticker_dict = super().get(key)
+        return dict(ticker_dict) if ticker_dict else None
+
+    def put(self, key, ticker_dict):
+        super().put(key, dict(ticker_dict))
+
+_render_cache = RenderCache()
+_ta_cache = LruCache(MAX_TA_ENTRIES, sizeof=lambda df: int(df.memory_usage(index=True).sum()))
+
+def get_render_cache():
+    return _render_cache
+
+def get_ta_cache():
+    # cached frames are shared, treat them as read-only
+    return _ta_cache
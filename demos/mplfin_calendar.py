@@ -0,0 +1,200 @@
+"""
+NYSE trading calendar and quote expiry for demo_mplfin.py
+
+quotes expire when new data can exist, i.e. at the close of the next bar:
+- intraday bars close every `interval` from the session open, the last
+  one at the (possibly early) session close
+- the daily bar is in progress during the session, it is refreshed every
+  QUOTE_REFRESH and once more at the close
+- nights, weekends and holidays roll over to the next session
+
+expiry is computed from the fetch time on every call, so it does not
+depend on when the server was started
+
+holidays follow the NYSE rules (pandas holiday machinery, no extra
+dependency); unscheduled closings are listed in SPECIAL_CLOSINGS
+"""
+from datetime import time as dtime, timedelta
+from functools import lru_cache
+import math
+import time
+
+import pandas as pd
+from pandas.tseries.holiday import (
+    AbstractHolidayCalendar, GoodFriday, Holiday, USLaborDay, USMartinLutherKingJr,
+    USMemorialDay, USPresidentsDay, USThanksgivingDay, nearest_workday, sunday_to_monday,
+)
+
+MARKET_TZ = "America/New_York"
+SESSION_OPEN, SESSION_CLOSE, EARLY_CLOSE = dtime(9, 30), dtime(16, 0), dtime(13, 0)
+QUOTE_REFRESH = "15min"   # refresh of the in-progress daily bar
+SETTLE_SECONDS = 60        # let the provider publish a bar after it closes
+SPECIAL_CLOSINGS = ["2012-10-29", "2012-10-30", "2018-12-05", "2025-01-09"]
+
+class NYSEHolidayCalendar(AbstractHolidayCalendar):
+    rules = [
+        # a Saturday new year is not observed on Friday Dec 31
+        Holiday("New Years Day", month=1, day=1, observance=sunday_to_monday),
+        USMartinLutherKingJr,
+        USPresidentsDay,
+        GoodFriday,
+        USMemorialDay,
+        Holiday("Juneteenth", month=6, day=19, start_date="2022-01-01", observance=nearest_workday),
+        Holiday("Independence Day", month=7, day=4, observance=nearest_workday),
+        USLaborDay,
+        USThanksgivingDay,
+        Holiday("Christmas", month=12, day=25, observance=nearest_workday),
+    ]
+
+def _is_early_close(day):
+    # Jul 3 and Dec 24 (unless they are the observed holiday), day after Thanksgiving
+    if (day.month, day.day) in [(7, 3), (12, 24)]:
+        return day.weekday() < 4
+    return day.month == 11 and day.weekday() == 4 and 22 < day.day <= 29
+
+class TradingCalendar:
+    def __init__(self, tz=MARKET_TZ):
+        self.tz = tz
+
+    @lru_cache(maxsize=None)
+    def _holidays(self, year):
+        days = NYSEHolidayCalendar().holidays(f"{year}-01-01", f"{year}-12-31")
+        return set(days.date) | {d.date() for d in pd.to_datetime(SPECIAL_CLOSINGS) if d.year == year}
+
+    def now(self):
+        return pd.Timestamp.now(tz=self.tz)
+
+    def _ts(self, t):
+        """ tz-aware timestamp in market time from epoch seconds / Timestamp
+        """
+        if isinstance(t, (int, float)):
+            return pd.Timestamp(t, unit="s", tz="UTC").tz_convert(self.tz)
+        t = pd.Timestamp(t)
+        return t.tz_localize(self.tz) if t.tz is None else t.tz_convert(self.tz)
+
+    def is_session(self, day):
+        day = pd.Timestamp(day).date()
+        return day.weekday() < 5 and day not in self._holidays(day.year)
+
+    def session(self, day):
+        """ (open, close) timestamps of the session on day, None if the market is closed
+        """
+        day = pd.Timestamp(day).date()
+        if not self.is_session(day):
+            return None
+        close = EARLY_CLOSE if _is_early_close(day) else SESSION_CLOSE
+        return (pd.Timestamp.combine(day, SESSION_OPEN).tz_localize(self.tz),
+                pd.Timestamp.combine(day, close).tz_localize(self.tz))
+
+    def in_session(self, t=None):
+        t = self.now() if t is None else self._ts(t)
+        sess = self.session(t)
+        return sess is not None and sess[0] <= t < sess[1]
+
+    def next_bar_close(self, t, interval=None):
+        """ first bar close strictly after t, interval=None for daily bars
+        """
+        t = self._ts(t)
+        day = t.date()
+        for _ in range(30):
+            sess = self.session(day)
+            if sess is not None and t < sess[1]:
+                open_, close = sess
+                if interval is None:
+                    return close
+                step = pd.Timedelta(interval)
+                k = max(1, math.floor((t - open_) / step) + 1)
+                return min(open_ + k*step, close)
+            day += timedelta(days=1)
+        raise ValueError(f"no session within 30 days after {t}")
+
+    def last_bar_close(self, t, interval=None):
+        """ latest bar close at or before t
+        """
+        t = self._ts(t)
+        sess = self.session(t)
+        if sess is not None:
+            open_, close = sess
+            if t >= close:
+                return close
+            if interval is not None and t >= open_:
+                step = pd.Timedelta(interval)
+                k = math.floor((t - open_) / step)
+                if k >= 1:
+                    return open_ + k*step
+        day = t.date()
+        for _ in range(30):
+            day -= timedelta(days=1)
+            sess = self.session(day)
+            if sess is not None:
+                return sess[1]
+        raise ValueError(f"no session within 30 days before {t}")
+
+_calendar = TradingCalendar()
+
+def get_calendar():
+    return _calendar
+
+def quote_expiry(fetched_at, interval=QUOTE_REFRESH):
+    """ epoch seconds when quotes fetched at fetched_at (epoch seconds) become stale
+    """
+    settle = pd.Timedelta(seconds=SETTLE_SECONDS)
+    expiry = _calendar.next_bar_close(_calendar._ts(fetched_at) - settle, interval) + settle
+    return expiry.timestamp()
+
+def quote_epoch(now=None, interval=QUOTE_REFRESH):
+    """ last bar close (epoch seconds) whose data should be visible at now,
+    changes exactly when quotes fetched before it expire (use it as a memo key)
+    """
+    now = time.time() if now is None else now
+    settle = pd.Timedelta(seconds=SETTLE_SECONDS)
+    return _calendar.last_bar_close(_calendar._ts(now) - settle, interval).timestamp()
+
+##############################################
+## check
+##############################################
+if __name__ == '__main__':
+    cal = get_calendar()
+    # known 2024 NYSE holidays and early closes
+    holidays = ["2024-01-01", "2024-01-15", "2024-02-19", "2024-03-29", "2024-05-27",
+                "2024-06-19", "2024-07-04", "2024-09-02", "2024-11-28", "2024-12-25"]
+    assert sorted(str(d) for d in cal._holidays(2024)) == holidays, sorted(cal._holidays(2024))
+    assert [str(d) for d in sorted(cal._holidays(2022)) if d.month == 12] == ["2022-12-26"]
+    assert "2021-12-31" not in {str(d) for d in cal._holidays(2021)}   # Saturday new year
+    for day in ["2024-07-03", "2024-11-29", "2024-12-24"]:
+        assert cal.session(day)[1].time() == EARLY_CLOSE, day
+    assert cal.session("2026-07-03") is None and cal.session("2026-07-02")[1].time() == SESSION_CLOSE
+
+    ny = lambda s: pd.Timestamp(s, tz=MARKET_TZ)
+    cases = [
+        # fetched at                 interval   expected next close
+        ("2024-06-28 08:00",         None,      "2024-06-28 16:00"),
+        ("2024-06-28 08:00",         "15min",   "2024-06-28 09:45"),
+        ("2024-06-28 10:07",         "15min",   "2024-06-28 10:15"),
+        ("2024-06-28 10:15",         "15min",   "2024-06-28 10:30"),
+        ("2024-06-28 15:59",         "15min",   "2024-06-28 16:00"),
+        ("2024-06-28 16:00",         "15min",   "2024-07-01 09:45"),   # weekend
+        ("2024-07-03 12:50",         "15min",   "2024-07-03 13:00"),   # early close
+        ("2024-07-03 13:05",         None,      "2024-07-05 16:00"),   # holiday
+        ("2024-06-28 10:07",         "5min",    "2024-06-28 10:10"),
+    ]
+    for t, interval, expected in cases:
+        got = cal.next_bar_close(ny(t), interval)
+        assert got == ny(expected), (t, interval, got)
+    for t, interval, expected in [
+            ("2024-06-28 10:07", "15min", "2024-06-28 10:00"),
+            ("2024-06-28 09:40", "15min", "2024-06-27 16:00"),
+            ("2024-07-01 08:00", None,    "2024-06-28 16:00"),
+            ("2024-06-28 16:30", "15min", "2024-06-28 16:00"),
+            ("2024-07-05 10:00", None,    "2024-07-03 13:00")]:
+        got = cal.last_bar_close(ny(t), interval)
+        assert got == ny(expected), (t, interval, got)
+
+    # a fetch stays valid until the memo key changes
+    for t in pd.date_range(ny("2024-06-27 08:00"), ny("2024-07-02 18:00"), freq="7min"):
+        fetched = t.timestamp()
+        expiry = quote_expiry(fetched)
+        assert quote_epoch(expiry - 1) == quote_epoch(fetched) != quote_epoch(expiry)
+    print("calendar ok, now:", cal.now().strftime("%Y-%m-%d %H:%M %Z"),
+          "in session" if cal.in_session() else "closed",
+          "| quotes fetched now expire", pd.Timestamp(quote_expiry(time.time()), unit="s", tz="UTC").tz_convert(MARKET_TZ))
@@ -0,0 +1,122 @@
+"""
+Compact in-memory quote/TA frames for demo_mplfin.py (COMPACT_CACHE in mplfin_core.py)
+
+what stays in memory per symbol:
+- TA engine buffer + TA cache frames: only the plotted columns
+  (PLOT_COLUMNS), float32, and only the last NUM_DAYS_QUOTE rows (the
+  most the chart page can plot); the EMA/RSI states stay float64, so
+  values only lose the float32 rounding (~1e-7 relative), see
+  TaEngine(compact=True) in mplfin_stream.py
+- memoized quote frames (_download_quote without the quote store):
+  OHLC float32, Volume int32 in lots of VOLUME_SCALE shares, dividends
+  and splits dropped; expand_quotes() restores float64 before TA
+
+memory_report() lists the cache bytes per symbol (review page).
+
+sizes and precision for a 500-symbol universe:
+    python mplfin_compact.py
+"""
+import numpy as np
+import pandas as pd
+
+from mplfin_core import NUM_DAYS_QUOTE
+
+OHLC = ["Open", "High", "Low", "Close"]
+PLOT_COLUMNS = OHLC + ["Volume", "ema_fast_u", "ema_fast_d", "ema_slow", "ema_long", "vol_avg",
+    "rsi", "rsi_avg", "rsi_u", "rsi_d", "rsi_signal"]   # read by _plot_ta and _chart_ta
+VOLUME_SCALE = 100   # shares per Volume unit in compact quotes
+COMPACT_DTYPE = np.float32
+
+def compact_quotes(df):
+    """ OHLC float32 + Volume int32 (lots of VOLUME_SCALE shares)
+    """
+    out = df[OHLC].astype(COMPACT_DTYPE)
+    out["Volume"] = np.round(df["Volume"].values / VOLUME_SCALE).astype(np.int32)
+    out.attrs["volume_scale"] = VOLUME_SCALE
+    return out
+
+def expand_quotes(df):
+    """ float64 OHLCV from compact_quotes, other frames are returned as is
+    """
+    scale = df.attrs.get("volume_scale")
+    if not scale:
+        return df
+    out = df[OHLC].astype(float)
+    out["Volume"] = df["Volume"].values.astype(float) * scale
+    return out
+
+def frame_bytes(df):
+    return int(df.memory_usage(index=True, deep=True).sum())
+
+def memory_report(ta_engine=None, ta_cache=None, render_cache=None):
+    """ dataframe of cache bytes per symbol, largest first
+    """
+    rows = {}
+    def add(symbol, col, n_bytes):
+        rows.setdefault(symbol, {})
+        rows[symbol][col] = rows[symbol].get(col, 0) + n_bytes
+    if ta_engine is not None:
+        for symbol, n_bytes in ta_engine.sizes().items():
+            add(symbol, "TA engine", n_bytes)
+    if ta_cache is not None:
+        for df in ta_cache.values():
+            add(df.attrs.get("ticker", "?"), "TA cache", frame_bytes(df))
+    if render_cache is not None:
+        for d in render_cache.values():
+            add(d.get("ticker", "?"), "Render cache", len(d.get("img_bytes") or b""))
+    df = pd.DataFrame.from_dict(rows, orient="index").reindex(columns=["TA engine", "TA cache", "Render cache"]).fillna(0).astype(int)
+    df["Total"] = df.sum(axis=1)
+    df.index.name = "Ticker"
+    return df.sort_values("Total", ascending=False)
+
+##############################################
+## sizes / precision
+##############################################
+if __name__ == '__main__':
+    import time
+    from mplfin_core import _calculate_ta
+    from mplfin_quotes import synthetic_quotes
+    from mplfin_stream import TaEngine
+    from mplfin_cache import LruCache
+
+    n_symbols = 500
+    quotes = {f"S{i:03d}": synthetic_quotes(f"S{i:03d}", end_date="2024-06-28").tail(1500) for i in range(n_symbols)}
+
+    report = {}
+    for label, compact in [("float64", False), ("compact", True)]:
+        engine = TaEngine(compact=compact)
+        cache = LruCache(n_symbols)
+        t0 = time.perf_counter()
+        for symbol, df in quotes.items():
+            ta = engine.update(symbol, df)
+            ta.attrs["ticker"] = symbol
+            cache.put(symbol, ta)
+        elapsed = time.perf_counter() - t0
+        mem = memory_report(ta_engine=engine, ta_cache=cache)
+        report[label] = mem
+        memo = sum(frame_bytes(compact_quotes(df) if compact else df) for df in quotes.values())
+        print(f"{label:>8}: TA engine {mem['TA engine'].sum()/2**20:6.1f} MB, TA cache {mem['TA cache'].sum()/2**20:6.1f} MB, "
+              f"quote memo {memo/2**20:5.1f} MB, per symbol {(mem['Total'].sum() + memo)/n_symbols/2**10:.0f} KB "
+              f"({elapsed:.1f} sec)")
+
+    # precision of the compact frames against float64 TA
+    df = quotes["S000"]
+    full = _calculate_ta(df.copy())
+    small = TaEngine(compact=True).update("S000", df)
+    ref = full[small.columns].iloc[-len(small):]
+    rel = np.nanmax(np.abs(small.values.astype(float) - ref.values) / np.maximum(np.abs(ref.values), 1))
+    assert rel < 1e-5, rel
+    # incremental updates past max_rows keep the last NUM_DAYS_QUOTE rows
+    engine = TaEngine(compact=True)
+    for k in range(600, 1500, 7):
+        small = engine.update("S000", df.iloc[:k])
+    small = engine.update("S000", df)
+    assert len(small) == NUM_DAYS_QUOTE and small.index[-1] == df.index[-1]
+    ref = full[small.columns].iloc[-len(small):]
+    assert np.nanmax(np.abs(small.values.astype(float) - ref.values) / np.maximum(np.abs(ref.values), 1)) < 1e-5
+    assert engine.sizes()["S000"] <= 2*NUM_DAYS_QUOTE*(len(PLOT_COLUMNS)*4 + 8)
+    roundtrip = expand_quotes(compact_quotes(df))
+    assert np.allclose(roundtrip[OHLC].values, df[OHLC].values, rtol=1e-6)
+    assert np.abs(roundtrip["Volume"].values - df["Volume"].values).max() <= VOLUME_SCALE / 2
+    total = {k: v["Total"].sum() for k, v in report.items()}
+    print(f"compact ok: {total['float64']/total['compact']:.1f}x smaller, max rel error {rel:.1e}")
@@ -0,0 +1,288 @@
+"""
+Streamlit-free helpers for demo_mplfin.py
+
+quote download, TA calculation and chart rendering live here so that
+they can be imported by worker processes (a function defined inside a
+streamlit script can not be pickled into a process pool)
+"""
+from pathlib import Path
+from traceback import format_exc
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+import os
+import signal
+import tempfile
+import threading
+import time
+
+import numpy as np
+import mplfinance as mpf
+
+from mplfin_index import get_chart_index
+from mplfin_quotes import get_provider
+from mplfin_ta import wilder_rsi
+
+# INITIALIZE settings
+MAX_NUM_TICKERS = 30
+NUM_DAYS_QUOTE, NUM_DAYS_PLOT = 390, 250
+EMA_FAST, EMA_SLOW, EMA_LONG = 15, 50, 150
+EMA_FAST_SCALE, EMA_SLOW_SCALE = 1.4, 2.0
+MA_VOL = 20
+RSI_PERIOD, RSI_AVG, RSI_BAND_WIDTH = 100, 25, 0.6
+MACD_FAST, MACD_SLOW, MACD_SIGNAL = 12, 26, 9
+
+PANID_PRICE, PANID_VOL, PANID_RSI, PANID_SIGNAL = 0, 3, 2, 1
+PANEL_RATIOS = (8, 1, 8, 1)
+FIGURE_WIDTH, FIGURE_HEIGHT =  17, 13
+CHART_STYLE = 'yahoo'
+CHART_STYLES = ['yahoo', 'charles', 'binance', 'classic', 'mike', 'nightclouds', 'sas', 'starsandstripes']
+YELLOW = '#F5D928'
+LIGHT_BLACK = '#8F8E83'
+
+# parallel rendering
+NUM_WORKERS = 4
+TICKER_TIMEOUT = 60   # seconds per ticker
+
+CHART_ROOT = Path.home() / "charts"
+if not Path.exists(CHART_ROOT):
+    Path.mkdir(CHART_ROOT)
+# disk budget of CHART_ROOT (charts, quote store, image cache), see mplfin_janitor.py
+# env MPLFIN_CHART_MAX_MB / MPLFIN_CHART_MAX_FILES, 0 for no limit
+CHART_MAX_BYTES = int(os.environ.get("MPLFIN_CHART_MAX_MB", 500)) * 2**20 or None
+CHART_MAX_FILES = int(os.environ.get("MPLFIN_CHART_MAX_FILES", 2000)) or None
+QUOTE_ROOT = Path.joinpath(CHART_ROOT, "quotes")   # per-symbol arrow files, see mplfin_store.py
+IMAGE_ROOT = Path.joinpath(CHART_ROOT, "finviz")   # cached finviz chart images, see mplfin_images.py
+USE_QUOTE_STORE = True
+USE_FIGURE_TEMPLATE = True   # reuse the figure layout across tickers, see mplfin_figure.py
+COMPACT_CACHE = True   # float32 plotted columns in memory, see mplfin_compact.py
+
+##############################################
+## helper functions
+##############################################
+def _title_xy(ticker):
+    # position title manually
+    return {"title": f"{ticker}",  "x": 0.55, "y": 0.945}
+
+def _color_signal(v):
+    if v > 0: return 'g'
+    elif v < 0: return 'r'
+    return YELLOW
+
+def _ta_params():
+    # everything besides quotes that changes the TA frame
+    return dict(EMA_FAST=EMA_FAST, EMA_SLOW=EMA_SLOW, EMA_LONG=EMA_LONG,
+        EMA_FAST_SCALE=EMA_FAST_SCALE, EMA_SLOW_SCALE=EMA_SLOW_SCALE, MA_VOL=MA_VOL,
+        RSI_PERIOD=RSI_PERIOD, RSI_AVG=RSI_AVG, RSI_BAND_WIDTH=RSI_BAND_WIDTH)
+
+def _fetch_quote(symbol, num_days=NUM_DAYS_QUOTE):
+    return get_provider().fetch(symbol, num_days)
+
+def _fetch_quotes(symbols, num_days=NUM_DAYS_QUOTE):
+    """ batched download, one provider round trip for all symbols
+    """
+    return get_provider().history(symbols, num_days)
+
+def _ta_MACD(df, fast_period=MACD_FAST, slow_period=MACD_SLOW, signal_period=MACD_SIGNAL):
+    ema_fast = df["Close"].ewm(span=fast_period).mean()
+    ema_slow = df["Close"].ewm(span=slow_period).mean()
+    df["macd"] = ema_fast - ema_slow
+    df["macd_signal"] = df["macd"].ewm(span=signal_period).mean()
+    df["macd_hist"] = df["macd"] - df["macd_signal"]
+    return df
+
+def _ta_RSI(df, n=RSI_PERIOD, avg_period=RSI_AVG, band_width=RSI_BAND_WIDTH):
+    # https://github.com/wgong/mplfinance/blob/master/examples/rsi.py
+    # Wilder smoothing is vectorized in mplfin_ta.wilder_rsi, centered at 0 here
+    df['rsi'] = wilder_rsi(df.w_p.values, n) - 50
+    df["rsi_avg"] = df.rsi.ewm(span=avg_period).mean()
+    df["rsi_u"] = df["rsi_avg"] + band_width
+    df["rsi_d"] = df['rsi_avg'] - band_width
+    df["rsi_signal"] = df["rsi"] - df["rsi_avg"]
+    return df
+
+def _calculate_ta(df):
+    df["w_p"] = 0.25*(2*df["Close"] + df["High"] + df["Low"])
+    df["ema_fast"] = df.w_p.ewm(span=EMA_FAST).mean()
+    df["ema_slow"] = df.w_p.ewm(span=EMA_SLOW).mean()
+    df["ema_long"] = df.w_p.ewm(span=EMA_LONG).mean()
+
+    # range
+    hl_mean_fast = (df.High - df.Low).ewm(span=EMA_FAST).mean()
+    df["ema_fast_u"] =  df.ema_fast + 0.5*hl_mean_fast * EMA_FAST_SCALE
+    df["ema_fast_d"] =  df.ema_fast - 0.5*hl_mean_fast * EMA_FAST_SCALE
+
+    hl_mean_slow = (df.High - df.Low).ewm(span=EMA_SLOW).mean()
+    df["ema_slow_u"] =  df.ema_slow + 0.5*hl_mean_slow * EMA_SLOW_SCALE
+    df["ema_slow_d"] =  df.ema_slow - 0.5*hl_mean_slow * EMA_SLOW_SCALE
+
+    # trim volume to avoid exponential form
+    df['Volume'] = df['Volume'] / 1000000
+    df["vol_avg"] = df.Volume.ewm(span=MA_VOL).mean()
+
+    return _ta_RSI(df)
+
+def _plot_ta(ticker, df, file_img, figsize=(FIGURE_WIDTH, FIGURE_HEIGHT), style=CHART_STYLE,
+             panid_price=PANID_PRICE, panid_vol=PANID_VOL, panid_rsi=PANID_RSI, panid_signal=PANID_SIGNAL):
+    """ render TA dataframe (already sliced to NUM_DAYS_PLOT) into file_img (path or file-like),
+    file_img=None returns (fig, axes) instead (see mplfin_figure.ChartTemplate)
+    """
+    # candle overlay
+    ema_fast_u_plot = mpf.make_addplot(df["ema_fast_u"], panel=panid_price, color=LIGHT_BLACK, linestyle="solid")
+    ema_fast_d_plot = mpf.make_addplot(df["ema_fast_d"], panel=panid_price, color=LIGHT_BLACK, linestyle="solid")
+    ema_slow_plot = mpf.make_addplot(df["ema_slow"], panel=panid_price, color='b', linestyle="solid")
+    ema_long_plot = mpf.make_addplot(df["ema_long"], panel=panid_price, width=2, color='k')  # magenta '#ED8CEB'
+
+    # RSI
+    # make sure ylim are the same
+    rsi_min, rsi_max = float(np.nanmin(df['rsi'])), float(np.nanmax(df['rsi']))   # float32 in compact frames
+    rsi_plot = mpf.make_addplot(df["rsi"], panel=panid_rsi, color='r', width=1,  ylim=(rsi_min,rsi_max))
+    rsi_avg_plot = mpf.make_addplot(df["rsi_avg"], panel=panid_rsi, color='b', linestyle="dashed", ylim=(rsi_min,rsi_max))
+    rsi_u_plot = mpf.make_addplot(df["rsi_u"], panel=panid_rsi, color='b', linestyle="solid", ylim=(rsi_min,rsi_max))
+    rsi_d_plot = mpf.make_addplot(df["rsi_d"], panel=panid_rsi, color='b', linestyle="solid", ylim=(rsi_min,rsi_max))  # , ylabel=ticker)
+    signal_plot = mpf.make_addplot(df["rsi_signal"], panel=panid_signal, type="bar",
+                            color=[_color_signal(v) for v in df["rsi_signal"]],ylim=(-1,1))
+
+    # volume
+    vol_avg_plot = mpf.make_addplot(df["vol_avg"], panel=panid_vol, color='k')
+
+    # plot
+    plots = [ema_fast_u_plot, ema_fast_d_plot, ema_slow_plot, ema_long_plot
+            , rsi_avg_plot, rsi_u_plot, rsi_d_plot, rsi_plot
+            , vol_avg_plot
+            , signal_plot
+        ]
+    # custom style
+    # https://stackoverflow.com/questions/68296296/customizing-mplfinance-plot-python
+
+    save = dict(returnfig=True) if file_img is None else dict(savefig=file_img)
+    res = mpf.plot(df, type='candle',
+            style=style,
+            fill_between=dict(y1=df["ema_fast_d"].values,y2=df["ema_fast_u"].values,alpha=0.15,color='b'),
+            panel_ratios=PANEL_RATIOS,
+            addplot=plots,
+            title=_title_xy(ticker),
+            volume=True, volume_panel=panid_vol,
+            ylabel="", ylabel_lower="",
+            xrotation=0,
+            datetime_format='%m-%d',
+            figsize=figsize,
+            tight_layout=True,
+            show_nontrading=True,
+            **save
+        )
+    del plots
+    return res
+
+def _chart_df(ticker, df, chart_root=CHART_ROOT, **render_params):
+    """ calculate TA on quote dataframe df, render chart, return ticker_dict
+    """
+    try:
+        df = _calculate_ta(df)
+    except:
+        err_msg = format_exc()
+        return {"ticker": ticker, "err_msg": f"_calculate_ta()\n{err_msg}"}
+
+    return _chart_ta(ticker, df, chart_root=chart_root, **render_params)
+
+_render_buffer = threading.local()
+
+def _render_png(ticker, df, **plot_params):
+    """ render into this thread's reusable BytesIO, return the PNG bytes
+    """
+    buf = getattr(_render_buffer, "buf", None)
+    if buf is None:
+        buf = _render_buffer.buf = BytesIO()
+    buf.seek(0)
+    buf.truncate()
+    if USE_FIGURE_TEMPLATE:
+        from mplfin_figure import render_template   # imports this module
+        render_template(ticker, df, buf, **plot_params)
+    else:
+        _plot_ta(ticker, df, buf, **plot_params)
+    return buf.getvalue()
+
+def _chart_ta(ticker, df, chart_root=CHART_ROOT, figsize=(FIGURE_WIDTH, FIGURE_HEIGHT),
+              num_days_plot=NUM_DAYS_PLOT, style=CHART_STYLE):
+    """ render chart from TA dataframe df in memory, return ticker_dict with img_bytes
+    file_img is where _persist_chart() would save it for the review page
+    """
+    # slice after done with calculating TA
+    df = df.iloc[-int(num_days_plot):, :]
+
+    img_bytes = _render_png(ticker, df, figsize=figsize, style=style)
+    file_img = Path.joinpath(chart_root, f"{ticker}.png")
+
+    # st.dataframe(df)   # ["Close", "Low", "High", "Volume"]
+    _date, _today_quote, _prev_day_quote = df.iloc[-1, :].name, df.iloc[-1, :].to_dict(), df.iloc[-2, :].to_dict()
+    del df
+    return {"ticker": ticker, "img_bytes": img_bytes, "file_img": file_img, "date": _date, "today_quote": _today_quote, "prev_day_quote": _prev_day_quote, "err_msg": None}
+
+def _write_atomic(file_img, img_bytes):
+    fd, tmp = tempfile.mkstemp(dir=Path(file_img).parent, prefix=".chart.", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(img_bytes)
+        os.replace(tmp, file_img)
+    except:
+        Path(tmp).unlink(missing_ok=True)
+        raise
+
+def _save_chart(ticker_dict):
+    """ write the rendered PNG to file_img and record it in the chart index (see mplfin_index.py)
+    """
+    file_img = ticker_dict["file_img"]
+    _write_atomic(file_img, ticker_dict["img_bytes"])
+    get_chart_index(Path(file_img).parent).record(ticker_dict["ticker"], file_img,
+        quote_date=ticker_dict.get("date"), img_bytes=ticker_dict["img_bytes"])
+
+_persist_pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix="persist_chart")
+
+def _persist_chart(ticker_dict):
+    """ save the rendered PNG in the background (for the review page)
+    """
+    if ticker_dict.get("err_msg") or not ticker_dict.get("img_bytes"):
+        return None
+    return _persist_pool.submit(_save_chart, ticker_dict)
+
+##############################################
+## process-pool rendering
+##############################################
+class TickerTimeout(Exception):
+    pass
+
+def _raise_timeout(signum, frame):
+    raise TickerTimeout()
+
+def _chart_worker(ticker, df=None, ta=None, num_days=NUM_DAYS_QUOTE, chart_root=CHART_ROOT,
+                  render_params=None, timeout=TICKER_TIMEOUT):
+    """ download (unless df is given) + TA (unless ta is given) + render one ticker inside a worker process
+
+    timeout is enforced with SIGALRM where available (not on Windows),
+    so that a hung download frees its worker for the next ticker
+    """
+    use_alarm = timeout and hasattr(signal, "SIGALRM")
+    if use_alarm:
+        signal.signal(signal.SIGALRM, _raise_timeout)
+        signal.alarm(int(timeout))
+    t0 = time.time()
+    try:
+        try:
+            if df is None and ta is None:
+                df = _fetch_quote(ticker, num_days=num_days)
+        except TickerTimeout:
+            raise
+        except:
+            err_msg = format_exc()
+            return {"ticker": ticker, "err_msg": f"_get_quotes()\n{err_msg}"}
+        render_params = render_params or {}
+        if ta is not None:
+            ticker_dict = _chart_ta(ticker, ta, chart_root=chart_root, **render_params)
+        else:
+            ticker_dict = _chart_df(ticker, df, chart_root=chart_root, **render_params)
+    except TickerTimeout:
+        return {"ticker": ticker, "err_msg": f"timed out after {timeout} sec"}
+    finally:
+        if use_alarm:
+            signal.alarm(0)
+    ticker_dict["elapsed"] = time.time() - t0
+    return ticker_dict
@@ -0,0 +1,230 @@
+"""
+Rolling correlation and relative strength for demo_mplfin.py (ETF correlation page)
+
+correlation of daily log returns over the last `window` bars for every
+pair of the universe, pairwise-complete like DataFrame.corr() (a newly
+listed ETF only pairs on the bars it has). RollingCorr keeps the window
+sums of every pair (m x m each):
+    N = sum v_i v_j,  S = sum r_i v_j,  SS = sum r_i^2 v_j,  P = sum r_i r_j
+(v = return present), so a new bar is a rank-1 add of its row and a
+rank-1 subtract of the row leaving the window, O(m^2) instead of
+O(window m^2); a revised last bar (in-session) swaps its row the same way.
+CorrEngine keeps one RollingCorr per (universe, window) and refits from
+scratch when the history does not continue (or after REFIT_BARS updates,
+to bound the float drift of the running sums).
+
+relative_strength(): return over RS_LOOKBACKS minus the benchmark's.
+cluster_order() orders symbols by average-linkage clustering on 1 - corr
+for the heatmap (corr_heatmap).
+
+check against DataFrame.corr + timing:
+    python mplfin_corr.py
+"""
+from threading import Lock
+
+import altair as alt
+import numpy as np
+import pandas as pd
+
+CORR_WINDOW = 60
+MIN_PERIODS = 20
+BENCHMARK = "SPY"
+RS_LOOKBACKS = {"1M": 21, "3M": 63, "6M": 126, "12M": 252}
+REFIT_BARS = 250
+
+def close_frame(quotes):
+    """ Close of every symbol on one date index (dates x symbols)
+    """
+    close = pd.DataFrame({s: df["Close"] for s, df in quotes.items() if df is not None and len(df)})
+    if close.index.tz is not None:
+        close.index = close.index.tz_localize(None)
+    return close.sort_index()
+
+def log_returns(close):
+    return np.log(close).diff()
+
+class RollingCorr:
+    def __init__(self, n_symbols, window=CORR_WINDOW, min_periods=MIN_PERIODS):
+        self.window, self.min_periods = window, min_periods
+        self.rows = np.full((window, n_symbols), np.nan)   # ring of the window's returns
+        self.n = 0   # rows pushed
+        m = n_symbols
+        self.N, self.S, self.SS, self.P = (np.zeros((m, m)) for _ in range(4))
+
+    def _add(self, r, sign=1.0):
+        v = ~np.isnan(r)
+        r0 = np.where(v, r, 0.0)
+        vf = v.astype(float)
+        self.N += sign * np.outer(vf, vf)
+        self.S += sign * np.outer(r0, vf)
+        self.SS += sign * np.outer(r0*r0, vf)
+        self.P += sign * np.outer(r0, r0)
+
+    def fit(self, returns):
+        """ sums of the last window rows of returns (bars x symbols)
+        """
+        rows = np.asarray(returns, dtype=float)[-self.window:]
+        v = ~np.isnan(rows)
+        r0, vf = np.where(v, rows, 0.0), v.astype(float)
+        self.N, self.S, self.SS, self.P = vf.T @ vf, r0.T @ vf, (r0*r0).T @ vf, r0.T @ r0
+        self.rows[:] = np.nan
+        self.rows[:len(rows)] = rows
+        self.n = len(rows)
+
+    def push(self, r):
+        """ a new bar: add its returns, drop the bar leaving the window
+        """
+        slot = self.n % self.window
+        if self.n >= self.window:
+            self._add(self.rows[slot], -1.0)
+        self._add(r)
+        self.rows[slot] = r
+        self.n += 1
+
+    def last(self):
+        return self.rows[(self.n - 1) % self.window] if self.n else None
+
+    def replace_last(self, r):
+        """ the last bar was revised
+        """
+        slot = (self.n - 1) % self.window
+        self._add(self.rows[slot], -1.0)
+        self._add(r)
+        self.rows[slot] = r
+
+    def corr(self):
+        N, S, SS, P = self.N, self.S, self.SS, self.P
+        with np.errstate(invalid='ignore', divide='ignore'):
+            c = (N*P - S*S.T) / np.sqrt((N*SS - S*S) * (N*SS.T - S.T*S.T))
+        c[N < self.min_periods] = np.nan
+        return np.clip(c, -1, 1)
+
+class CorrEngine:
+    def __init__(self):
+        self._lock = Lock()
+        self._cache = {}   # (symbols, window): (RollingCorr, last date, updates since fit)
+        self.stats = {"full": 0, "incremental": 0, "bars_pushed": 0}
+
+    def update(self, close, window=CORR_WINDOW):
+        """ rolling correlation (DataFrame symbols x symbols) at the last row of close (dates x symbols)
+        """
+        key = (tuple(close.columns), window)
+        with self._lock:
+            rc, last_date, n_updates = self._cache.get(key, (None, None, 0))
+            if rc is None or last_date not in close.index or n_updates >= REFIT_BARS:
+                rc = RollingCorr(len(close.columns), window)
+                rc.fit(log_returns(close.iloc[-window-1:]).values)
+                n_updates = 0
+                self.stats["full"] += 1
+            else:
+                # returns of the last stored bar (maybe revised) and the new bars only
+                pos = close.index.get_loc(last_date)
+                values = log_returns(close.iloc[max(pos-1, 0):]).values[-(len(close) - pos):]
+                if not np.array_equal(values[0], rc.last(), equal_nan=True):
+                    rc.replace_last(values[0])
+                for r in values[1:]:
+                    rc.push(r)
+                n_updates += len(values)
+                self.stats["incremental"] += 1
+                self.stats["bars_pushed"] += len(values) - 1
+            self._cache[key] = (rc, close.index[-1], n_updates)
+            return pd.DataFrame(rc.corr(), index=close.columns, columns=close.columns)
+
+_engine = CorrEngine()
+
+def get_corr_engine():
+    # one engine per process, shared by all sessions
+    return _engine
+
+def relative_strength(close, benchmark=BENCHMARK, lookbacks=RS_LOOKBACKS):
+    """ return(%) over each lookback minus the benchmark's, ranked by their mean
+    """
+    last = close.ffill().iloc[-1]
+    df = pd.DataFrame(index=close.columns)
+    for label, n in lookbacks.items():
+        if len(close) <= n:
+            continue
+        perf = 100 * (last / close.ffill().iloc[-1-n] - 1)
+        df[f"Return {label}(%)"] = perf
+        df[f"RS {label}"] = perf - perf.get(benchmark, np.nan)
+    rs = [c for c in df.columns if c.startswith("RS ")]
+    df["RS rank"] = df[rs].mean(axis=1).rank(ascending=False, method="min")
+    df.index.name = "Ticker"
+    return df.sort_values("RS rank")
+
+def cluster_order(corr):
+    """ symbol order from average-linkage clustering on distance 1 - corr
+    """
+    m = len(corr)
+    d = 1 - np.nan_to_num(np.asarray(corr, dtype=float), nan=0.0)
+    np.fill_diagonal(d, np.inf)
+    members = {i: [i] for i in range(m)}
+    while len(members) > 1:
+        a, b = np.unravel_index(np.argmin(d), d.shape)
+        a, b = min(a, b), max(a, b)
+        na, nb = len(members[a]), len(members[b])
+        merged = (na*d[a] + nb*d[b]) / (na + nb)
+        d[a], d[:, a] = merged, merged
+        d[a, a] = np.inf
+        d[b], d[:, b] = np.inf, np.inf
+        members[a] = members[a] + members.pop(b)
+    return next(iter(members.values())) if members else []
+
+def corr_heatmap(corr, order=None, height=700):
+    """ correlation matrix as an Altair heatmap, symbols in order (default cluster_order)
+    """
+    order = cluster_order(corr.values) if order is None else order
+    symbols = list(corr.index[order])
+    df = corr.loc[symbols, symbols].rename_axis("A").reset_index().melt(id_vars="A", var_name="B", value_name="Corr")
+    return alt.Chart(df).mark_rect().encode(
+        alt.X("A:N", sort=symbols, title=None), alt.Y("B:N", sort=symbols, title=None),
+        alt.Color("Corr:Q", scale=alt.Scale(scheme="redblue", domain=[-1, 1], reverse=True)),
+        tooltip=["A", "B", alt.Tooltip("Corr:Q", format=".2f")],
+    ).properties(height=height)
+
+##############################################
+## check / timing
+##############################################
+if __name__ == '__main__':
+    import time
+    from mplfin_quotes import synthetic_quotes
+
+    symbols = [f"ETF{i:02d}" for i in range(80)]
+    # staggered listings, correlated through a common factor
+    quotes = {s: synthetic_quotes(s, end_date="2024-06-28").tail(600 - 5*i) for i, s in enumerate(symbols)}
+    close = close_frame(quotes)
+    market = np.log(close).diff().mean(axis=1).cumsum()
+    close = close * np.exp(market.values[:, None] * np.linspace(0, 2, len(symbols)))
+
+    engine = CorrEngine()
+    n0 = 300
+    engine.update(close.iloc[:n0])
+    t_inc, t_full, max_err = 0.0, 0.0, 0.0
+    rng = np.random.default_rng(0)
+    for k in range(n0 + 1, len(close) + 1):
+        df = close.iloc[:k]
+        if rng.random() < 0.2:
+            # in-session bar: provisional close first
+            engine.update(df * np.r_[np.ones(k-1), 1.01][:, None])
+        t0 = time.perf_counter()
+        corr = engine.update(df)
+        t1 = time.perf_counter()
+        ref = log_returns(df).iloc[-CORR_WINDOW:].corr(min_periods=MIN_PERIODS)
+        t2 = time.perf_counter()
+        t_inc, t_full = t_inc + t1 - t0, t_full + t2 - t1
+        np.testing.assert_allclose(corr.values, ref.values, atol=1e-8, equal_nan=True)
+        max_err = max(max_err, np.nanmax(np.abs(corr.values - ref.values)))
+    assert 1 < engine.stats["full"] <= 1 + 2*(len(close) - n0) // REFIT_BARS, engine.stats   # periodic refit
+
+    # clustering puts the factor-loaded symbols next to each other
+    order = cluster_order(corr.values)
+    assert sorted(order) == list(range(len(symbols)))
+    two_blocks = np.kron(np.eye(2), np.ones((3, 3)))
+    assert sorted(cluster_order(two_blocks[[0, 3, 1, 4, 2, 5]][:, [0, 3, 1, 4, 2, 5]])[:3]) in ([0, 2, 4], [1, 3, 5])
+    rs = relative_strength(close, benchmark="ETF00")
+    assert rs.loc["ETF00", "RS 1M"] == 0
+    alt.data_transformers.disable_max_rows()   # streamlit passes the data as arrow, without the limit
+    corr_heatmap(corr).to_dict()
+    n = len(close) - n0
+    print(f"corr ok: {len(symbols)} symbols, window {CORR_WINDOW}, max abs diff {max_err:.1e}, stats {engine.stats}")
+    print(f"per bar: running sums {1e3*t_inc/n:.2f} ms, DataFrame.corr {1e3*t_full/n:.2f} ms")
@@ -0,0 +1,377 @@
+"""
+Asyncio quote fetcher for the yahoo_async provider (mplfin_quotes.py)
+
+one request per symbol to the Yahoo chart API (daily bars, json), all of
+them on one event loop in a background thread:
+- token bucket: at most RATE requests/sec with bursts of BURST, so a
+  watchlist does not trip the upstream rate limit
+- per-host cap: at most PER_HOST requests in flight to one host
+- retries: 429/5xx/connection errors back off exponentially with
+  jitter (Retry-After is honored), bounded per request (MAX_RETRIES)
+  and globally by a retry budget: every request earns RETRY_RATIO of a
+  retry, so an outage does not multiply the load
+- a failing symbol only fails itself, the others complete
+- cancellation: cancelling the future of a fetch cancels its tasks,
+  symbols still waiting for the limiter are never requested
+
+the blocking HTTP call runs in a worker thread (asyncio.to_thread),
+requests is already installed with yfinance.
+set MPLFIN_QUOTE_URL to point at a local stand-in, see the check below:
+    python mplfin_fetch.py
+"""
+from concurrent.futures import TimeoutError
+from threading import Lock, Thread, local
+from urllib.parse import urlparse
+import asyncio
+import os
+import random
+import time
+
+import numpy as np
+import pandas as pd
+import requests
+from requests.adapters import HTTPAdapter
+
+QUOTE_URL = "https://query1.finance.yahoo.com/v8/finance/chart"
+RATE = 5            # requests per second
+BURST = 10
+PER_HOST = 4        # requests in flight per host
+MAX_RETRIES = 3     # per request
+BACKOFF = 0.5       # seconds, doubled per retry
+MAX_BACKOFF = 8
+RETRY_RATIO = 0.2   # retries earned per request
+RETRY_RESERVE = 10  # retries available before any request
+FETCH_TIMEOUT = 10  # seconds per request
+USER_AGENT = "Mozilla/5.0 (X11; Linux x86_64)"
+RETRY_STATUS = {429, 500, 502, 503, 504}
+
+def quote_url():
+    return os.environ.get("MPLFIN_QUOTE_URL", QUOTE_URL)
+
+class QuoteFetchError(Exception):
+    def __init__(self, msg, retry=False, retry_after=None):
+        super().__init__(msg)
+        self.retry, self.retry_after = retry, retry_after
+
+class TokenBucket:
+    def __init__(self, rate=RATE, burst=BURST):
+        self.rate, self.burst = rate, burst
+        self.tokens, self.updated = burst, time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self):
+        async with self._lock:   # first come first served
+            while True:
+                now = time.monotonic()
+                self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+class RetryBudget:
+    def __init__(self, ratio=RETRY_RATIO, reserve=RETRY_RESERVE):
+        self.ratio, self.reserve = ratio, reserve
+        self.balance = reserve
+
+    def deposit(self):
+        # capped, so a long quiet period does not allow a retry storm
+        self.balance = min(self.reserve, self.balance + self.ratio)
+
+    def withdraw(self):
+        if self.balance < 1:
+            return False
+        self.balance -= 1
+        return True
+
+def parse_chart(data, symbol):
+    """ Yahoo chart json -> daily OHLCV frame shaped like yf.download(auto_adjust=True)
+    """
+    chart = data.get("chart") or {}
+    if chart.get("error") or not chart.get("result"):
+        raise QuoteFetchError(f"{symbol}: {(chart.get('error') or {}).get('description', 'no data')}")
+    result = chart["result"][0]
+    if not result.get("timestamp"):
+        raise QuoteFetchError(f"{symbol}: no data")
+    tz = result.get("meta", {}).get("exchangeTimezoneName", "America/New_York")
+    index = pd.to_datetime(result["timestamp"], unit="s", utc=True).tz_convert(tz).normalize()
+    quote = result["indicators"]["quote"][0]
+    df = pd.DataFrame({"Open": quote["open"], "High": quote["high"], "Low": quote["low"],
+                       "Close": quote["close"], "Volume": quote["volume"]}, index=index, dtype=float)
+    adjclose = (result["indicators"].get("adjclose") or [{}])[0].get("adjclose")
+    if adjclose is not None:
+        ratio = np.asarray(adjclose, dtype=float) / df["Close"].values
+        for col in ["Open", "High", "Low", "Close"]:
+            df[col] *= ratio
+    events = result.get("events") or {}
+    df["Dividends"], df["Stock Splits"] = 0.0, 0.0
+    for e in (events.get("dividends") or {}).values():
+        df.loc[df.index == pd.Timestamp(e["date"], unit="s", tz="UTC").tz_convert(tz).normalize(), "Dividends"] = e["amount"]
+    for e in (events.get("splits") or {}).values():
+        df.loc[df.index == pd.Timestamp(e["date"], unit="s", tz="UTC").tz_convert(tz).normalize(), "Stock Splits"] = e["numerator"] / e["denominator"]
+    df = df[~df.index.duplicated(keep="last")].dropna(how="all", subset=["Open", "High", "Low", "Close"])
+    df.index.name = "Date"
+    return df
+
+class AsyncQuoteFetcher:
+    def __init__(self, base_url=None, rate=RATE, burst=BURST, per_host=PER_HOST,
+                 max_retries=MAX_RETRIES, backoff=BACKOFF, timeout=FETCH_TIMEOUT):
+        self.base_url = base_url or quote_url()
+        self.rate, self.burst, self.per_host = rate, burst, per_host
+        self.max_retries, self.backoff, self.timeout = max_retries, backoff, timeout
+        self.session = requests.Session()
+        self.session.headers["User-Agent"] = USER_AGENT
+        self.session.mount("https://", HTTPAdapter(pool_maxsize=per_host))
+        self.session.mount("http://", HTTPAdapter(pool_maxsize=per_host))
+        self._stats = {"requests": 0, "retries": 0, "budget_exhausted": 0, "errors": 0, "cancelled": 0}
+        self._stats_lock = Lock()   # counted from the loop and from the callers' threads
+        self._loop = None
+        self._lock = Lock()
+
+    def _count(self, key, n=1):
+        with self._stats_lock:
+            self._stats[key] += n
+
+    def stats(self):
+        with self._stats_lock:
+            return dict(self._stats)
+
+    @property
+    def loop(self):
+        # started on first use, limiter and semaphores belong to this loop
+        with self._lock:
+            if self._loop is None:
+                loop = asyncio.new_event_loop()
+                Thread(target=loop.run_forever, name="quote-fetcher", daemon=True).start()
+                self.bucket = TokenBucket(self.rate, self.burst)
+                self.budget = RetryBudget()
+                self._hosts = {}
+                self._loop = loop
+            return self._loop
+
+    def url(self, symbol, num_days):
+        now = int(time.time())
+        return (f"{self.base_url}/{symbol}?period1={now - num_days*86400}&period2={now}"
+                f"&interval=1d&events=div,splits&includeAdjustedClose=true")
+
+    def _host_limit(self, url):
+        host = urlparse(url).netloc
+        if host not in self._hosts:
+            self._hosts[host] = asyncio.Semaphore(self.per_host)
+        return self._hosts[host]
+
+    def _get(self, url, symbol):
+        try:
+            resp = self.session.get(url, timeout=self.timeout)
+        except requests.RequestException as e:
+            raise QuoteFetchError(f"{symbol}: {e}", retry=True)
+        if resp.status_code in RETRY_STATUS:
+            retry_after = resp.headers.get("Retry-After")
+            raise QuoteFetchError(f"{symbol}: HTTP {resp.status_code}", retry=True,
+                                  retry_after=float(retry_after) if retry_after and retry_after.isdigit() else None)
+        if resp.status_code != 200:
+            raise QuoteFetchError(f"{symbol}: HTTP {resp.status_code}")
+        return parse_chart(resp.json(), symbol)
+
+    async def fetch_one(self, symbol, num_days):
+        url = self.url(symbol, num_days)
+        for attempt in range(self.max_retries + 1):
+            await self.bucket.acquire()
+            async with self._host_limit(url):
+                self._count("requests")
+                if attempt == 0:
+                    self.budget.deposit()
+                try:
+                    return await asyncio.to_thread(self._get, url, symbol)
+                except QuoteFetchError as e:
+                    err = e
+            if not err.retry or attempt == self.max_retries:
+                break
+            if not self.budget.withdraw():
+                self._count("budget_exhausted")
+                break
+            self._count("retries")
+            delay = min(MAX_BACKOFF, self.backoff * 2**attempt) * (0.5 + random.random())
+            await asyncio.sleep(max(delay, err.retry_after or 0))
+        self._count("errors")
+        raise err
+
+    async def fetch_many(self, symbols, num_days):
+        """ ({symbol: df}, {symbol: error})
+        """
+        tasks = {s: asyncio.ensure_future(self.fetch_one(s, num_days)) for s in dict.fromkeys(symbols)}
+        try:
+            await asyncio.wait(tasks.values())
+        except asyncio.CancelledError:
+            for t in tasks.values():
+                t.cancel()
+            self._count("cancelled", sum(1 for t in tasks.values() if not t.done()))
+            raise
+        quotes, errors = {}, {}
+        for s, t in tasks.items():
+            if t.exception() is None:
+                quotes[s] = t.result()
+            else:
+                errors[s] = t.exception()
+        return quotes, errors
+
+    def submit(self, symbols, num_days):
+        """ concurrent.futures.Future of fetch_many, cancel() stops the fetch
+        """
+        return asyncio.run_coroutine_threadsafe(self.fetch_many(symbols, num_days), self.loop)
+
+    def fetch(self, symbols, num_days, timeout=None):
+        """ blocking fetch_many, waiting in slices so that checkpoint() can interrupt
+        (see fetch_checkpoint), the fetch is cancelled when the caller is
+        """
+        future = self.submit(symbols, num_days)
+        deadline = time.monotonic() + (timeout or self.timeout * (self.max_retries + 1) * max(1, len(symbols)))
+        try:
+            while True:
+                try:
+                    return future.result(timeout=0.2)
+                except TimeoutError:
+                    _checkpoint()
+                    if time.monotonic() > deadline:
+                        raise
+        except BaseException:
+            future.cancel()
+            raise
+
+_local = local()
+
+class fetch_checkpoint:
+    """ with fetch_checkpoint(fn): fn() is called while a fetch in this thread waits,
+    an exception from fn (e.g. streamlit stopping the script on a rerun) cancels the fetch
+    """
+    def __init__(self, fn):
+        self.fn = fn
+
+    def __enter__(self):
+        self.prev = getattr(_local, "checkpoint", None)
+        _local.checkpoint = self.fn
+        return self
+
+    def __exit__(self, *args):
+        _local.checkpoint = self.prev
+
+def _checkpoint():
+    fn = getattr(_local, "checkpoint", None)
+    if fn:
+        fn()
+
+_fetcher = None
+_fetcher_lock = Lock()
+
+def get_fetcher():
+    # one event loop, limiter and retry budget per process
+    global _fetcher
+    with _fetcher_lock:
+        if _fetcher is None:
+            _fetcher = AsyncQuoteFetcher()
+        return _fetcher
+
+##############################################
+## check against a local fake quote server
+##############################################
+if __name__ == '__main__':
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+    import json
+    from mplfin_quotes import synthetic_quotes
+
+    log = {"times": [], "paths": [], "in_flight": 0, "max_in_flight": 0}
+    log_lock = Lock()
+
+    def chart_json(symbol, num_days):
+        df = synthetic_quotes(symbol, end_date="2024-06-28").tail(num_days)
+        ts = (df.index.tz_localize("America/New_York") + pd.Timedelta(hours=9.5)).asi8 // 10**9
+        return {"chart": {"error": None, "result": [{
+            "meta": {"symbol": symbol, "exchangeTimezoneName": "America/New_York"},
+            "timestamp": ts.tolist(),
+            "indicators": {"quote": [{c.lower(): df[c].tolist() for c in ["Open", "High", "Low", "Close", "Volume"]}],
+                           "adjclose": [{"adjclose": df["Close"].tolist()}]}}]}}
+
+    class FakeQuoteServer(BaseHTTPRequestHandler):
+        def do_GET(self):
+            symbol = urlparse(self.path).path.rsplit("/", 1)[-1]
+            with log_lock:
+                log["times"].append(time.monotonic())
+                log["paths"].append(symbol)
+                log["in_flight"] += 1
+                log["max_in_flight"] = max(log["max_in_flight"], log["in_flight"])
+                n_seen = log["paths"].count(symbol)
+            try:
+                time.sleep(0.05)
+                if symbol.startswith("DOWN"):
+                    status, body = 503, b""
+                elif symbol == "FLAKY" and n_seen <= 2:
+                    status, body = 429, b""
+                elif symbol == "NONE":
+                    status, body = 404, b""
+                else:
+                    status, body = 200, json.dumps(chart_json(symbol, 100)).encode()
+                self.send_response(status)
+                if status == 429:
+                    self.send_header("Retry-After", "0")
+                self.send_header("Content-Type", "application/json")
+                self.end_headers()
+                self.wfile.write(body)
+            finally:
+                with log_lock:
+                    log["in_flight"] -= 1
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), FakeQuoteServer)
+    Thread(target=server.serve_forever, daemon=True).start()
+    base_url = f"http://127.0.0.1:{server.server_port}/v8/finance/chart"
+
+    # rate limit, per-host cap, failures isolated, retries
+    fetcher = AsyncQuoteFetcher(base_url, rate=20, burst=5, per_host=3, backoff=0.05)
+    symbols = [f"ETF{i:02d}" for i in range(30)] + ["FLAKY", "NONE"]
+    t0 = time.perf_counter()
+    quotes, errors = fetcher.fetch(symbols, 100)
+    elapsed = time.perf_counter() - t0
+    assert sorted(errors) == ["NONE"] and len(quotes) == 31, errors
+    assert log["paths"].count("FLAKY") == 3 and log["paths"].count("NONE") == 1
+    ref = synthetic_quotes("ETF00", end_date="2024-06-28").tail(100)
+    np.testing.assert_allclose(quotes["ETF00"]["Close"].values, ref["Close"].values)
+    assert (quotes["ETF00"].index.date == ref.index.date).all()
+    assert log["max_in_flight"] <= 3, log["max_in_flight"]
+    assert fetcher.stats()["requests"] == len(log["paths"]) and fetcher.stats()["retries"] == 2, fetcher.stats()
+    # token bucket: no 1 second window holds more than rate + burst requests
+    times = np.array(log["times"])
+    assert max(np.sum((times >= t) & (times < t + 1)) for t in times) <= 20 + 5
+    assert elapsed >= (len(log["paths"]) - 5) / 20 * 0.9, elapsed
+    print(f"fetch ok: {len(quotes)} symbols in {elapsed:.2f} sec, {len(log['paths'])} requests, "
+          f"max {log['max_in_flight']} in flight, stats {fetcher.stats()}")
+
+    # retry budget: an outage costs at most reserve + ratio*requests retries
+    log["paths"].clear()
+    fetcher = AsyncQuoteFetcher(base_url, rate=1000, burst=1000, per_host=8, backoff=0.01)
+    quotes, errors = fetcher.fetch([f"DOWN{i:02d}" for i in range(40)], 100)
+    n_retries = len(log["paths"]) - 40
+    assert len(errors) == 40 and n_retries <= RETRY_RESERVE + RETRY_RATIO*40, n_retries
+    print(f"retry budget ok: 40 failing symbols, {n_retries} retries (no budget: {40*MAX_RETRIES}), stats {fetcher.stats()}")
+
+    # cancellation: symbols waiting for the limiter are never requested
+    log["paths"].clear()
+    fetcher = AsyncQuoteFetcher(base_url, rate=10, burst=1, per_host=2)
+    calls = {"n": 0}
+    def stop_after_3():
+        calls["n"] += 1
+        if calls["n"] == 3:
+            raise KeyboardInterrupt("ticker input changed")
+    try:
+        with fetch_checkpoint(stop_after_3):
+            fetcher.fetch([f"ETF{i:02d}" for i in range(30)], 100)
+    except KeyboardInterrupt:
+        pass
+    time.sleep(0.5)
+    n_requested = len(log["paths"])
+    time.sleep(0.5)
+    assert n_requested < 30 and len(log["paths"]) == n_requested, n_requested
+    print(f"cancel ok: {n_requested}/30 symbols requested before the cancel, stats {fetcher.stats()}")
+    server.shutdown()
@@ -0,0 +1,230 @@
+"""
+Reusable figure templates for demo_mplfin.py
+
+mpf.plot builds a new 4-panel figure, ~10 addplots and all their artists
+for every ticker, although the layout (PANEL_RATIOS, panels, style) is
+always the same. ChartTemplate runs _plot_ta once per (figure size,
+style, number of bars) and keeps the figure; the next ticker only swaps
+the artists' data (candles, EMA lines, RSI bands, volume/signal bars),
+sets the axis limits the way mpf.plot does, and redraws.
+
+- candle/bar widths and up/down colors are taken from the figure
+  mpf.plot built, so the template draws what mpf.plot would
+- matplotlib figures are not thread-safe, templates are kept per thread
+
+parity check + benchmark (per-chart time, peak RSS) against mpf.plot:
+    python mplfin_figure.py
+"""
+from collections import OrderedDict
+import threading
+
+import numpy as np
+import matplotlib.dates as mdates
+import matplotlib.pyplot as plt
+import mplfinance as mpf
+
+from mplfin_core import (
+    PANID_PRICE, PANID_VOL, PANID_RSI, PANID_SIGNAL, _color_signal, _plot_ta, _title_xy,
+)
+
+MAX_TEMPLATES = 8   # per thread
+LINE_COLUMNS = ["ema_fast_u", "ema_fast_d", "ema_slow", "ema_long",
+    "rsi", "rsi_avg", "rsi_u", "rsi_d", "vol_avg"]
+
+def _xdates(df):
+    # same x values as mpf.plot(show_nontrading=True)
+    index = df.index.tz_localize(None) if df.index.tz is not None else df.index
+    return mdates.date2num(index.to_pydatetime())
+
+def _avg_dist(x):
+    return (x[-1] - x[0]) / len(x)
+
+def _updown(colors, up):
+    """ (up, down) RGBA picked from per-bar colors drawn for the up mask
+    """
+    colors = np.broadcast_to(np.asarray(colors), (len(up), 4))
+    up_color = colors[up][0] if up.any() else colors[0]
+    down_color = colors[~up][0] if (~up).any() else colors[-1]
+    return np.array([down_color, up_color])
+
+def _volume_up(o, c, use_prev_close):
+    if not use_prev_close:
+        return o < c
+    return np.r_[o[0] < c[0], c[:-1] < c[1:]]
+
+class ChartTemplate:
+    def __init__(self, ticker, df, figsize, style):
+        self.fig, axes = _plot_ta(ticker, df, None, figsize=figsize, style=style)
+        plt.close(self.fig)   # keep it out of pyplot, savefig still works
+        self.rc = dict(plt.rcParams)   # mpf.plot applied the style globally
+        self.ax_price, self.ax_vol = axes[2*PANID_PRICE], axes[2*PANID_VOL]
+        self.ax_rsi = axes[2*PANID_RSI:2*PANID_RSI+2]
+        self.ax_signal = axes[2*PANID_SIGNAL]
+        self.title = self.fig._suptitle
+
+        # map every line to the column it was drawn from
+        self.lines = []
+        for ax in axes:
+            for line in ax.lines:
+                y = np.asarray(line.get_ydata(), dtype=float)
+                used = [col for _, col in self.lines]
+                col = next(c for c in LINE_COLUMNS if c not in used and np.allclose(y, df[c].values, equal_nan=True))
+                self.lines.append((line, col))
+
+        self.wicks, self.bodies, self.fill = self.ax_price.collections[:3]
+        self.fill_kwargs = dict(alpha=self.fill.get_alpha(), color=self.fill.get_facecolor()[0][:3])
+        self.vol_bars = list(self.ax_vol.patches)
+        self.signal_bars = list(self.ax_signal.patches)
+
+        x = _xdates(df)
+        o, c = df.Open.values, df.Close.values
+        verts = self.bodies.get_paths()[0].vertices
+        self.candle_width = (verts[:, 0].max() - verts[:, 0].min()) / _avg_dist(x)
+        self.vol_width = self.vol_bars[0].get_width() / _avg_dist(x)
+        self.signal_width = self.signal_bars[0].get_width() / _avg_dist(x)
+
+        up = o < c
+        self.body_colors = _updown(self.bodies.get_facecolor(), up)
+        self.edge_colors = _updown(self.bodies.get_edgecolor(), up)
+        self.wick_colors = _updown(self.wicks.get_color()[:len(up)], up)
+        self.vol_prev_close = mpf.make_mpf_style(base_mpf_style=style)["marketcolors"]["vcdopcod"]
+        vol_up = _volume_up(o, c, self.vol_prev_close)
+        self.vol_colors = _updown([r.get_facecolor() for r in self.vol_bars], vol_up)
+        self.vol_edge_colors = _updown([r.get_edgecolor() for r in self.vol_bars], vol_up)
+
+    def render(self, ticker, df, file_img):
+        with plt.rc_context(self.rc):
+            self._update(ticker, df)
+            self.fig.savefig(file_img, bbox_inches="tight", facecolor=self.fig.get_facecolor())
+
+    def _update(self, ticker, df):
+        x = _xdates(df)
+        avg = _avg_dist(x)
+        o, h, l, c = (df[k].values.astype(float) for k in ["Open", "High", "Low", "Close"])
+        up = (o < c).astype(int)
+
+        # candles
+        d = 0.5 * self.candle_width * avg
+        self.bodies.set_verts(np.stack([np.column_stack([x-d, o]), np.column_stack([x-d, c]),
+                                        np.column_stack([x+d, c]), np.column_stack([x+d, o])], axis=1))
+        self.bodies.set_facecolor(self.body_colors[up])
+        self.bodies.set_edgecolor(self.edge_colors[up])
+        low_segs = np.stack([np.column_stack([x, l]), np.column_stack([x, np.minimum(o, c)])], axis=1)
+        high_segs = np.stack([np.column_stack([x, h]), np.column_stack([x, np.maximum(o, c)])], axis=1)
+        self.wicks.set_segments(np.concatenate([low_segs, high_segs]))
+        self.wicks.set_color(np.tile(self.wick_colors[up], (2, 1)))
+
+        self.fill.remove()
+        self.fill = self.ax_price.fill_between(x, df.ema_fast_d.values, df.ema_fast_u.values, **self.fill_kwargs)
+        for line, col in self.lines:
+            line.set_data(x, df[col].values)
+
+        # bars
+        vol = df.Volume.values
+        w = self.vol_width * avg
+        vol_up = _volume_up(o, c, self.vol_prev_close).astype(int)
+        for rect, xi, v, fc, ec in zip(self.vol_bars, x, vol, self.vol_colors[vol_up], self.vol_edge_colors[vol_up]):
+            rect.set_bounds(xi - 0.5*w, 0, w, v)
+            rect.set_facecolor(fc)
+            rect.set_edgecolor(ec)
+        w = self.signal_width * avg
+        for rect, xi, v in zip(self.signal_bars, x, df.rsi_signal.values):
+            rect.set_bounds(xi - 0.5*w, 0, w, v)
+            rect.set_facecolor(_color_signal(v))
+
+        # limits as set by mpf.plot(tight_layout=True) and _plot_ta
+        self.ax_price.set_xlim(x[0] - 0.45*avg, x[-1] + 0.45*avg)
+        miny, maxy = np.nanmin(l), np.nanmax(h)
+        ydelta = 0.01 * (maxy - miny)
+        self.ax_price.set_ylim(max(0.9*miny, miny - ydelta) if miny > 0 else miny - ydelta, maxy + ydelta)
+        self.ax_vol.set_ylim(0.3*np.nanmin(vol), 1.1*np.nanmax(vol))
+        rsi_min, rsi_max = np.nanmin(df.rsi.values), np.nanmax(df.rsi.values)
+        for ax in self.ax_rsi:
+            ax.set_ylim(rsi_min, rsi_max)
+        self.title.set_text(_title_xy(ticker)["title"])
+
+_local = threading.local()
+
+def render_template(ticker, df, file_img, figsize, style):
+    """ _plot_ta through a cached ChartTemplate
+    """
+    templates = _local.__dict__.setdefault("templates", OrderedDict())
+    key = (tuple(float(v) for v in figsize), style, len(df))
+    template = templates.get(key)
+    if template is None:
+        template = templates[key] = ChartTemplate(ticker, df, figsize, style)
+        while len(templates) > MAX_TEMPLATES:
+            templates.popitem(last=False)
+        with plt.rc_context(template.rc):
+            template.fig.savefig(file_img, bbox_inches="tight", facecolor=template.fig.get_facecolor())
+        return
+    templates.move_to_end(key)
+    template.render(ticker, df, file_img)
+
+##############################################
+## parity check / benchmark
+##############################################
+def _bench_worker(mode, symbols, figsize, style, num_days_plot):
+    from io import BytesIO
+    import resource
+    import time
+    from mplfin_core import NUM_DAYS_QUOTE, _calculate_ta
+    from mplfin_quotes import synthetic_quotes
+
+    frames = [(s, _calculate_ta(synthetic_quotes(s, end_date="2024-06-28").tail(NUM_DAYS_QUOTE)).iloc[-num_days_plot:])
+              for s in symbols]
+    rss0 = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    times = []
+    for ticker, df in frames:
+        buf = BytesIO()
+        t0 = time.perf_counter()
+        if mode == "template":
+            render_template(ticker, df, buf, figsize, style)
+        else:
+            _plot_ta(ticker, df, buf, figsize=figsize, style=style)
+        times.append(time.perf_counter() - t0)
+    rss1 = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return times, rss0 / 1024, rss1 / 1024   # MB on linux
+
+def _pixel_diff(png_a, png_b):
+    from io import BytesIO
+    from PIL import Image
+    a = np.asarray(Image.open(BytesIO(png_a)).convert("RGB"), dtype=int)
+    b = np.asarray(Image.open(BytesIO(png_b)).convert("RGB"), dtype=int)
+    if a.shape != b.shape:
+        return 1.0
+    return np.mean(np.any(a != b, axis=2))
+
+if __name__ == '__main__':
+    from concurrent.futures import ProcessPoolExecutor
+    from io import BytesIO
+    import matplotlib
+    matplotlib.use("Agg")
+    from mplfin_core import CHART_STYLE, FIGURE_HEIGHT, FIGURE_WIDTH, NUM_DAYS_PLOT, NUM_DAYS_QUOTE, _calculate_ta
+    from mplfin_quotes import synthetic_quotes
+
+    figsize = (FIGURE_WIDTH, FIGURE_HEIGHT)
+    symbols = [f"ETF{i:02d}" for i in range(80)]
+
+    # parity: template output vs a fresh mpf.plot, share of differing pixels
+    # (identical so far, the margin is for antialiasing across matplotlib versions)
+    MAX_PIXEL_DIFF = 0.001
+    worst = 0.0
+    for s in symbols[:10]:
+        df = _calculate_ta(synthetic_quotes(s, end_date="2024-06-28").tail(NUM_DAYS_QUOTE)).iloc[-NUM_DAYS_PLOT:]
+        a, b = BytesIO(), BytesIO()
+        _plot_ta(s, df, a, figsize=figsize, style=CHART_STYLE)
+        render_template(s, df, b, figsize, CHART_STYLE)
+        # the pixel share is too coarse for the title text
+        assert next(reversed(_local.templates.values())).title.get_text() == s
+        worst = max(worst, _pixel_diff(a.getvalue(), b.getvalue()))
+    assert worst <= MAX_PIXEL_DIFF, f"{100*worst:.3f} % of pixels differ from mpf.plot"
+    print(f"parity: at most {100*worst:.3f} % of pixels differ from mpf.plot")
+
+    # each mode in a fresh process, so peak RSS is its own
+    for mode in ["mpf.plot", "template"]:
+        with ProcessPoolExecutor(max_workers=1) as pool:
+            times, rss0, rss1 = pool.submit(_bench_worker, mode, symbols, figsize, CHART_STYLE, NUM_DAYS_PLOT).result()
+        times = np.array(times)
+        print(f"{mode:>9}: {len(times)} charts, first {1e3*times[0]:6.1f} ms, median {1e3*np.median(times):6.1f} ms,"
+              f" total {times.sum():5.2f} s | peak RSS {rss1:6.1f} MB (+{rss1-rss0:5.1f} MB while rendering)")
@@ -0,0 +1,199 @@
+"""
+Process-wide single-flight for quote fetches (demo_mplfin.py)
+
+ten sessions asking for SPY at the open used to run ten identical
+downloads before any cache was filled. Requests are keyed by
+(symbol, num_days): the first caller of a key fetches it, callers
+arriving while it is in flight wait for that fetch and share its result
+(a copy, frames are not shared between sessions). A batch only fetches
+its keys that are not already in flight, in one provider request.
+when the fetching caller is interrupted (e.g. streamlit stops its script
+run), the waiting callers fetch the keys themselves.
+
+stats(): keys requested, fetched, coalesced (waited on another fetch),
+seconds spent waiting
+
+concurrency check with a slow fake provider:
+    python mplfin_flight.py
+"""
+from concurrent.futures import CancelledError, Future
+from threading import Lock
+import time
+
+_MISSING = object()
+
+class SingleFlight:
+    def __init__(self):
+        self._lock = Lock()
+        self._calls = {}   # key: future
+        self._stats = {"requested": 0, "fetched": 0, "coalesced": 0, "wait_time": 0.0, "errors": 0}
+
+    def do_many(self, keys, fetch, copy=None):
+        """ {key: value} for keys, fetch(keys) -> {key: value} runs only for keys
+        not in flight; keys missing from its result are left out.
+        copy(value) is applied to results shared with waiting callers
+        """
+        keys = list(dict.fromkeys(keys))
+        own, waits = {}, {}
+        with self._lock:
+            self._stats["requested"] += len(keys)
+            for key in keys:
+                if key in self._calls:
+                    waits[key] = self._calls[key]
+                else:
+                    own[key] = self._calls[key] = Future()
+            self._stats["fetched"] += len(own)
+            self._stats["coalesced"] += len(waits)
+
+        results = {}
+        if own:
+            try:
+                fetched = fetch(list(own))
+            except BaseException as e:
+                with self._lock:
+                    self._stats["errors"] += 1
+                    for key, f in own.items():
+                        del self._calls[key]
+                        if isinstance(e, Exception):
+                            f.set_exception(e)
+                        else:
+                            f.cancel()   # not an error of the fetch, waiters retry
+                raise
+            # waiters copy from a private copy, the caller may change its own frame in place (_calculate_ta)
+            shared = {k: copy(v) if copy else v for k, v in fetched.items() if k in own}
+            with self._lock:
+                for key, f in own.items():
+                    del self._calls[key]
+                    f.set_result(shared.get(key, _MISSING))
+            results.update((k, v) for k, v in fetched.items() if k in own)
+
+        if waits:
+            t0 = time.perf_counter()
+            retry = []
+            for key, f in waits.items():
+                try:
+                    value = f.result()   # re-raises the fetch error
+                except CancelledError:
+                    retry.append(key)
+                    continue
+                if value is not _MISSING:
+                    results[key] = copy(value) if copy else value
+            with self._lock:
+                self._stats["wait_time"] += time.perf_counter() - t0
+            if retry:
+                results.update(self.do_many(retry, fetch, copy=copy))
+        return {k: results[k] for k in keys if k in results}
+
+    def do(self, key, fn, copy=None):
+        """ fn() for key, shared with concurrent callers of the same key
+        """
+        results = self.do_many([key], lambda keys: {key: fn()}, copy=copy)
+        return results[key]
+
+    def in_flight(self):
+        with self._lock:
+            return len(self._calls)
+
+    def stats(self):
+        with self._lock:
+            return dict(self._stats)
+
+##############################################
+## concurrency check
+##############################################
+if __name__ == '__main__':
+    from concurrent.futures import ThreadPoolExecutor
+    from threading import Barrier
+    from mplfin_quotes import CoalescingProvider, QuoteProvider, synthetic_quotes
+
+    class SlowProvider(QuoteProvider):
+        name = "slow"
+
+        def __init__(self, delay=0.5):
+            self.delay, self.calls = delay, []
+
+        def history(self, symbols, num_days):
+            self.calls.append(sorted(symbols))
+            time.sleep(self.delay)
+            return {s: synthetic_quotes(s, end_date="2024-06-28").tail(num_days) for s in symbols if s != "BAD"}
+
+    n_sessions = 10
+    slow = SlowProvider()
+    provider = CoalescingProvider(slow)
+    barrier = Barrier(n_sessions)
+
+    def session(i):
+        barrier.wait()   # all sessions ask at the same moment
+        return provider.fetch("SPY", 250)
+
+    t0 = time.perf_counter()
+    with ThreadPoolExecutor(n_sessions) as pool:
+        frames = list(pool.map(session, range(n_sessions)))
+    elapsed = time.perf_counter() - t0
+    assert slow.calls == [["SPY"]], slow.calls
+    assert all(df.equals(frames[0]) for df in frames)
+    assert len({id(df) for df in frames}) == n_sessions   # every session has its own frame
+    assert elapsed < 2*slow.delay, elapsed
+    stats = provider.flight.stats()
+    assert stats["fetched"] == 1 and stats["coalesced"] == n_sessions - 1, stats
+
+    # overlapping batches: the second only fetches what is not in flight
+    slow.calls.clear()
+    with ThreadPoolExecutor(2) as pool:
+        f1 = pool.submit(provider.history, ["SPY", "QQQ", "BAD"], 250)
+        time.sleep(0.1)
+        f2 = pool.submit(provider.history, ["QQQ", "IWM", "BAD"], 250)
+        q1, q2 = f1.result(), f2.result()
+    assert slow.calls == [["BAD", "QQQ", "SPY"], ["IWM"]], slow.calls
+    assert sorted(q1) == ["QQQ", "SPY"] and sorted(q2) == ["IWM", "QQQ"]   # failed symbols left out
+    assert provider.flight.in_flight() == 0
+
+    # the leader changing its frame in place (as _calculate_ta does) does not reach the waiters
+    flight = SingleFlight()
+    def fetch_spy(keys):
+        time.sleep(0.3)
+        return {"SPY": synthetic_quotes("SPY", end_date="2024-06-28").tail(250)}
+    def slow_copy(df):
+        time.sleep(0.2)
+        return df.copy()
+    def leader():
+        df = flight.do_many(["SPY"], fetch_spy, copy=slow_copy)["SPY"]
+        df["Volume"] /= 1000000
+        return df
+    with ThreadPoolExecutor(2) as pool:
+        f1 = pool.submit(leader)
+        time.sleep(0.1)
+        f2 = pool.submit(flight.do_many, ["SPY"], fetch_spy, slow_copy)
+        own, shared = f1.result(), f2.result()["SPY"]
+    assert (shared.Volume > 1000000 * own.Volume - 1).all() and shared is not own
+
+    # errors reach every waiter and are not cached
+    class FailingProvider(SlowProvider):
+        def history(self, symbols, num_days):
+            self.calls.append(sorted(symbols))
+            time.sleep(self.delay)
+            raise ConnectionError("provider down")
+    failing = CoalescingProvider(FailingProvider(delay=0.3))
+    with ThreadPoolExecutor(3) as pool:
+        futures = [pool.submit(failing.history, ["SPY"], 250) for _ in range(3)]
+    assert all(isinstance(f.exception(), ConnectionError) for f in futures)
+    assert failing.flight.in_flight() == 0
+
+    # an interrupted fetch (streamlit stopping the leader's script run) is retried by the waiters
+    class InterruptedProvider(SlowProvider):
+        def history(self, symbols, num_days):
+            self.calls.append(sorted(symbols))
+            time.sleep(self.delay)
+            if len(self.calls) == 1:
+                raise KeyboardInterrupt("script run stopped")
+            return {s: synthetic_quotes(s, end_date="2024-06-28").tail(num_days) for s in symbols}
+    interrupted = CoalescingProvider(InterruptedProvider(delay=0.3))
+    with ThreadPoolExecutor(3) as pool:
+        leader = pool.submit(interrupted.history, ["SPY"], 250)
+        time.sleep(0.1)
+        waiters = [pool.submit(interrupted.history, ["SPY"], 250) for _ in range(2)]
+    assert isinstance(leader.exception(), KeyboardInterrupt)
+    assert all(list(f.result()) == ["SPY"] for f in waiters) and len(interrupted.provider.calls) == 2
+
+    print(f"single-flight ok: {n_sessions} concurrent sessions -> {stats['fetched']} download "
+          f"in {elapsed:.2f} sec (provider {slow.delay} sec), stats {provider.flight.stats()}")
@@ -0,0 +1,258 @@
+"""
+Server-side cache of finviz chart images for the ETF chart page (demo_mplfin.py)
+
+the page used to hand every browser ~80 finviz urls per view; now the
+server fetches them once and st.image serves the local bytes:
+- missing images are fetched concurrently, one requests.Session with a
+  bounded connection pool (max_connections) shared by all sessions,
+  concurrent requests for the same image are coalesced
+- IMAGE_ROOT/{period}/{ticker}.png + {ticker}.json (url, fetched_at,
+  expires_at, etag, last_modified), written atomically
+- images expire per Cache-Control max-age when the server sends one,
+  else at the next bar close (mplfin_calendar.py): 15 minute bars in
+  session for daily charts, the session close for weekly/monthly
+- expired images are served as is and revalidated in the background
+  (conditional GET, a 304 only extends the expiry)
+- IMAGE_ROOT counts in the disk budget of CHART_ROOT, evicted images
+  are fetched again (mplfin_janitor.py)
+
+set MPLFIN_FINVIZ_URL to point at a local stand-in, see the check below:
+    python mplfin_images.py
+"""
+from concurrent.futures import ThreadPoolExecutor, wait
+from pathlib import Path
+from threading import Lock
+import json
+import os
+import re
+import tempfile
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from mplfin_calendar import quote_expiry
+
+FINVIZ_URL = "https://finviz.com/chart.ashx"
+MAX_CONNECTIONS = 8
+FETCH_TIMEOUT = 10   # seconds per image
+USER_AGENT = "Mozilla/5.0 (X11; Linux x86_64)"   # finviz rejects the python-requests agent
+
+def finviz_url():
+    return os.environ.get("MPLFIN_FINVIZ_URL", FINVIZ_URL)
+
+def _max_age(headers):
+    m = re.search(r"max-age=(\d+)", headers.get("Cache-Control", ""))
+    return int(m.group(1)) if m else None
+
+def _expiry(fetched_at, period, headers):
+    max_age = _max_age(headers)
+    if max_age:
+        return fetched_at + max_age
+    return quote_expiry(fetched_at) if period == "d" else quote_expiry(fetched_at, None)
+
+def _write_atomic(path, data):
+    fd, tmp = tempfile.mkstemp(dir=path.parent, prefix=f".{path.name}.", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        os.replace(tmp, path)
+    except:
+        Path(tmp).unlink(missing_ok=True)
+        raise
+
+class ImageCache:
+    def __init__(self, root, base_url=None, max_connections=MAX_CONNECTIONS, timeout=FETCH_TIMEOUT):
+        self.root = Path(root)
+        self.base_url = base_url or finviz_url()
+        self.timeout = timeout
+        self.session = requests.Session()
+        self.session.headers["User-Agent"] = USER_AGENT
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=max_connections, pool_block=True)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self._pool = ThreadPoolExecutor(max_workers=max_connections, thread_name_prefix="image-fetch")
+        self._lock = Lock()
+        self._inflight = {}   # (ticker, period): future
+        self._stats = {"hits": 0, "stale": 0, "fetched": 0, "not_modified": 0, "errors": 0}
+        self._stats_lock = Lock()   # counted from the sessions and the fetch pool
+
+    def _count(self, key):
+        with self._stats_lock:
+            self._stats[key] += 1
+
+    def stats(self):
+        with self._stats_lock:
+            return dict(self._stats)
+
+    def url(self, ticker, period="d"):
+        return f"{self.base_url}?t={ticker}&p={period}"
+
+    def _paths(self, ticker, period):
+        d = self.root / period
+        return d / f"{ticker}.png", d / f"{ticker}.json"
+
+    def _read(self, ticker, period):
+        """ (img_bytes, meta), (None, None) if not cached
+        """
+        file_img, file_meta = self._paths(ticker, period)
+        try:
+            return file_img.read_bytes(), json.loads(file_meta.read_text())
+        except (OSError, ValueError):
+            return None, None
+
+    def _fetch(self, ticker, period, meta=None):
+        """ GET (conditional if meta), store and return the image bytes
+        """
+        headers = {}
+        if meta and meta.get("etag"):
+            headers["If-None-Match"] = meta["etag"]
+        if meta and meta.get("last_modified"):
+            headers["If-Modified-Since"] = meta["last_modified"]
+        url = self.url(ticker, period)
+        try:
+            resp = self.session.get(url, headers=headers, timeout=self.timeout)
+            fetched_at = time.time()
+            file_img, file_meta = self._paths(ticker, period)
+            if resp.status_code == 304 and meta:
+                self._count("not_modified")
+                meta = dict(meta, fetched_at=fetched_at, expires_at=_expiry(fetched_at, period, resp.headers))
+                _write_atomic(file_meta, json.dumps(meta).encode())
+                return file_img.read_bytes()
+            resp.raise_for_status()
+            if not resp.headers.get("Content-Type", "image").startswith("image"):
+                raise ValueError(f"{url}: not an image ({resp.headers.get('Content-Type')})")
+            self._count("fetched")
+            file_img.parent.mkdir(parents=True, exist_ok=True)
+            _write_atomic(file_img, resp.content)
+            meta = {"url": url, "fetched_at": fetched_at, "expires_at": _expiry(fetched_at, period, resp.headers),
+                    "etag": resp.headers.get("ETag"), "last_modified": resp.headers.get("Last-Modified")}
+            _write_atomic(file_meta, json.dumps(meta).encode())
+            return resp.content
+        except:
+            self._count("errors")
+            raise
+        finally:
+            with self._lock:
+                self._inflight.pop((ticker, period), None)
+
+    def _submit(self, ticker, period, meta=None):
+        # one request per image at a time, later callers share the future
+        with self._lock:
+            key = (ticker, period)
+            if key not in self._inflight:
+                self._inflight[key] = self._pool.submit(self._fetch, ticker, period, meta)
+            return self._inflight[key]
+
+    def get_many(self, tickers, period="d", timeout=None):
+        """ {ticker: img_bytes}, missing images are fetched (concurrently) before
+        returning, expired ones are returned now and revalidated in the background.
+        Tickers that fail are left out.
+        """
+        images, futures = {}, {}
+        now = time.time()
+        for ticker in tickers:
+            img_bytes, meta = self._read(ticker, period)
+            if img_bytes is None:
+                futures[ticker] = self._submit(ticker, period)
+                continue
+            images[ticker] = img_bytes
+            if meta.get("expires_at", 0) <= now:
+                self._count("stale")
+                self._submit(ticker, period, meta)
+            else:
+                self._count("hits")
+        if futures:
+            wait(futures.values(), timeout=timeout or self.timeout)
+        for ticker, f in futures.items():
+            if f.done() and f.exception() is None:
+                images[ticker] = f.result()
+        return {t: images[t] for t in tickers if t in images}
+
+    def get(self, ticker, period="d"):
+        return self.get_many([ticker], period).get(ticker)
+
+    def clear(self):
+        for f in self.root.glob("*/*"):
+            f.unlink(missing_ok=True)
+
+_image_cache = {}
+
+def get_image_cache(root):
+    # one cache (and connection pool) per root per process
+    if root not in _image_cache:
+        _image_cache[root] = ImageCache(root)
+    return _image_cache[root]
+
+##############################################
+## check against a local stand-in for finviz
+##############################################
+if __name__ == '__main__':
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+    from threading import Thread
+    import hashlib
+    import shutil
+
+    requests_seen, max_age = [], {"value": 3600}
+
+    class FinvizStandIn(BaseHTTPRequestHandler):
+        def do_GET(self):
+            time.sleep(0.2)   # network latency
+            requests_seen.append(self.path)
+            body = b"\x89PNG\r\n\x1a\n" + hashlib.sha1(self.path.encode()).digest()
+            etag = '"%s"' % hashlib.md5(body).hexdigest()
+            if self.headers.get("If-None-Match") == etag:
+                self.send_response(304)
+                self.send_header("Cache-Control", f"max-age={max_age['value']}")
+                self.end_headers()
+                return
+            self.send_response(200)
+            self.send_header("Content-Type", "image/png")
+            self.send_header("ETag", etag)
+            self.send_header("Cache-Control", f"max-age={max_age['value']}")
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), FinvizStandIn)
+    Thread(target=server.serve_forever, daemon=True).start()
+    root = Path(tempfile.mkdtemp())
+    cache = ImageCache(root, base_url=f"http://127.0.0.1:{server.server_port}/chart.ashx")
+    tickers = [f"ETF{i:02d}" for i in range(40)]
+
+    t0 = time.perf_counter()
+    images = cache.get_many(tickers)
+    t_cold = time.perf_counter() - t0
+    assert len(images) == len(tickers) and len(requests_seen) == len(tickers)
+    # 40 x 0.2 sec sequential, ~1 sec with 8 connections
+    assert t_cold < 0.5*len(tickers)*0.2, t_cold
+
+    t0 = time.perf_counter()
+    assert cache.get_many(tickers) == images and len(requests_seen) == len(tickers)
+    t_warm = time.perf_counter() - t0
+
+    # hits counted from concurrent sessions, none lost
+    sessions = [Thread(target=lambda: [cache.get_many(tickers) for _ in range(20)]) for _ in range(8)]
+    for t in sessions:
+        t.start()
+    for t in sessions:
+        t.join()
+    assert cache.stats()["hits"] == (1 + 8*20) * len(tickers) and cache.stats()["fetched"] == len(tickers), cache.stats()
+
+    # expired: served from disk at once, revalidated in the background (304)
+    for f in (root / "d").glob("*.json"):
+        meta = json.loads(f.read_text())
+        f.write_text(json.dumps(dict(meta, expires_at=0)))
+    t0 = time.perf_counter()
+    assert cache.get_many(tickers) == images
+    t_stale = time.perf_counter() - t0
+    cache._pool.shutdown(wait=True)
+    assert len(requests_seen) == 2*len(tickers) and cache.stats()["not_modified"] == len(tickers)
+    assert all(json.loads(f.read_text())["expires_at"] > time.time() for f in (root / "d").glob("*.json"))
+
+    server.shutdown()
+    shutil.rmtree(root)
+    print(f"image cache ok: {len(tickers)} images cold {t_cold:.2f} sec, warm {1e3*t_warm:.1f} ms, "
+          f"stale {1e3*t_stale:.1f} ms (+ background revalidation), stats {cache.stats()}")
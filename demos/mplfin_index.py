@@ -0,0 +1,160 @@
+"""
+SQLite index of rendered charts for the review pages (demo_mplfin.py, demo_chart.py)
+
+CHART_ROOT/charts.db, one row per chart image:
+    ticker, file_img, size, mtime, quote_date, width, height, sector, indexed_at, viewed_at
+
+a row is written together with its image (mplfin_core._save_chart,
+demo_chart._chart) and deleted with it, so the review pages list and
+filter charts (sector, quote date) without scanning CHART_ROOT.
+sync() reconciles the index with the directory once, for charts written
+before the index existed or files removed by hand.
+viewed_at orders the least-recently-viewed eviction in mplfin_janitor.py
+"""
+from pathlib import Path
+from threading import Lock
+import sqlite3 as sql
+import struct
+import time
+
+import pandas as pd
+
+from mplfin_etf import ETF_DATA
+
+INDEX_FILE = "charts.db"
+TABLE_NAME = "charts"
+OTHER_SECTOR = "Other"
+PNG_SIGNATURE = b"\x89PNG\r\n\x1a\n"
+
+SECTOR = {d["symbol"]: d["sector"] for d in ETF_DATA}
+
+def png_size(head):
+    """ (width, height) from the first 24 bytes of a PNG, (None, None) otherwise
+    """
+    if len(head) < 24 or head[:8] != PNG_SIGNATURE:
+        return None, None
+    return struct.unpack(">II", head[16:24])
+
+class ChartIndex:
+    def __init__(self, chart_root):
+        self.root = Path(chart_root)
+        self.path = self.root / INDEX_FILE
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")   # readers don't block the writer
+            conn.execute(f"""create table if not exists {TABLE_NAME} (
+                ticker text primary key, file_img text not null, size integer, mtime real,
+                quote_date text, width integer, height integer, sector text, indexed_at real,
+                viewed_at real)""")
+            columns = [row[1] for row in conn.execute(f"PRAGMA table_info({TABLE_NAME})")]
+            if "viewed_at" not in columns:
+                conn.execute(f"alter table {TABLE_NAME} add column viewed_at real")
+
+    def _connect(self):
+        # one short-lived connection per call, charts are written from background threads
+        return sql.connect(self.path, timeout=10)
+
+    def record(self, ticker, file_img, quote_date=None, img_bytes=None):
+        """ add/replace the row of a chart image that was just written
+        """
+        stat = Path(file_img).stat()
+        if img_bytes is None:
+            with open(file_img, "rb") as f:
+                img_bytes = f.read(24)
+        width, height = png_size(img_bytes[:24])
+        quote_date = str(pd.Timestamp(quote_date).date()) if quote_date is not None else None
+        now = time.time()
+        with self._connect() as conn:
+            conn.execute(f"insert or replace into {TABLE_NAME} values (?,?,?,?,?,?,?,?,?,?)",
+                (ticker, str(file_img), stat.st_size, stat.st_mtime, quote_date, width, height,
+                 SECTOR.get(ticker, OTHER_SECTOR), now, now))
+
+    def touch(self, tickers):
+        """ mark charts as viewed now
+        """
+        now = time.time()
+        with self._connect() as conn:
+            conn.executemany(f"update {TABLE_NAME} set viewed_at = ? where ticker = ?", [(now, t) for t in tickers])
+
+    def usage(self):
+        """ (number of charts, total bytes)
+        """
+        with self._connect() as conn:
+            return conn.execute(f"select count(*), coalesce(sum(size), 0) from {TABLE_NAME}").fetchone()
+
+    def least_recently_viewed(self):
+        """ [(ticker, file_img, size, mtime)], least recently viewed first
+        """
+        with self._connect() as conn:
+            return conn.execute(f"""select ticker, file_img, size, mtime from {TABLE_NAME}
+                order by coalesce(viewed_at, indexed_at)""").fetchall()
+
+    def remove(self, ticker, mtime):
+        """ delete a chart file and its row, unless it was re-rendered since mtime
+        """
+        # select + delete in one transaction (delete ... returning needs SQLite 3.35)
+        with self._connect() as conn:
+            conn.execute("begin immediate")
+            row = conn.execute(f"select file_img from {TABLE_NAME} where ticker = ? and mtime = ?", (ticker, mtime)).fetchone()
+            if row is not None:
+                conn.execute(f"delete from {TABLE_NAME} where ticker = ? and mtime = ?", (ticker, mtime))
+        if row is None:
+            return False
+        Path(row[0]).unlink(missing_ok=True)
+        return True
+
+    def delete(self, tickers=None):
+        """ drop rows of tickers (all rows if None), the caller removes the files
+        """
+        with self._connect() as conn:
+            if tickers is None:
+                conn.execute(f"delete from {TABLE_NAME}")
+            else:
+                conn.executemany(f"delete from {TABLE_NAME} where ticker = ?", [(t,) for t in tickers])
+
+    def query(self, sectors=None, date_from=None, date_to=None):
+        """ dataframe of indexed charts, optionally filtered by sector and quote date
+        """
+        where, params = [], []
+        if sectors:
+            where.append(f"sector in ({','.join('?' * len(sectors))})")
+            params += list(sectors)
+        if date_from is not None:
+            where.append("quote_date >= ?")
+            params.append(str(date_from))
+        if date_to is not None:
+            where.append("quote_date <= ?")
+            params.append(str(date_to))
+        sql_stmt = f"select * from {TABLE_NAME}"
+        if where:
+            sql_stmt += " where " + " and ".join(where)
+        with self._connect() as conn:
+            return pd.read_sql(sql_stmt + " order by ticker", conn, params=params)
+
+    def sync(self):
+        """ reconcile with the PNG files in chart_root, returns (added, removed)
+        """
+        indexed = self.query().set_index("ticker")
+        files = {f.stem: f for f in self.root.glob("*.png")}
+        removed = [t for t in indexed.index if t not in files]
+        self.delete(removed)
+        added = 0
+        for ticker, f in files.items():
+            if ticker in indexed.index and indexed.at[ticker, "mtime"] == f.stat().st_mtime:
+                continue
+            quote_date = indexed.at[ticker, "quote_date"] if ticker in indexed.index else None
+            self.record(ticker, f, quote_date=quote_date)
+            added += 1
+        return added, len(removed)
+
+_index_lock = Lock()
+_index_cache = {}
+
+def get_chart_index(chart_root):
+    # one index per chart root per process, synced with the directory when first opened
+    chart_root = Path(chart_root)
+    with _index_lock:
+        if chart_root not in _index_cache:
+            index = ChartIndex(chart_root)
+            index.sync()
+            _index_cache[chart_root] = index
+        return _index_cache[chart_root]
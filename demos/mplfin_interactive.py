@@ -0,0 +1,207 @@
+"""
+Interactive (Vega-Lite) candlestick charts for demo_mplfin.py
+
+instead of a PNG per view, the chart page can send the bars to the
+browser and let Vega-Lite zoom/pan them. The last num_days_plot bars
+(the initial view) are sent as they are, only the older history is
+downsampled, so the payload is bounded however long the history is:
+- candles: at most MAX_CANDLES daily candles for the initial view, older
+  bars merged into at most MAX_CANDLES buckets (open first, high max,
+  low min, close last, volume sum)
+- indicator lines: points picked by Largest-Triangle-Three-Buckets, at
+  most MAX_POINTS per line (half of them in the initial view), keeps the
+  visual shape (peaks and troughs) of the line
+- values rounded to SIG_DIGITS significant digits, the JSON spec is
+  mostly digits; the RSI bands (rsi_avg +- RSI_BAND_WIDTH) are drawn
+  from rsi_avg in the browser
+
+payloads are cached per (daily bars, timeframe, TA parameters, num_days_plot),
+see get_payload().
+
+payload size and LTTB check:
+    python mplfin_interactive.py
+"""
+import altair as alt
+import numpy as np
+import pandas as pd
+
+from mplfin_cache import LruCache
+from mplfin_core import NUM_DAYS_PLOT, RSI_BAND_WIDTH
+
+MAX_CANDLES = 400
+MAX_POINTS = 400
+SIG_DIGITS = 5
+MAX_SPEC_BYTES = 280_000   # payload ceiling checked below
+PRICE_LINES = {"ema_fast_u": "#8F8E83", "ema_fast_d": "#8F8E83", "ema_slow": "blue", "ema_long": "black"}
+RSI_LINES = {"rsi": "red", "rsi_avg": "blue", "rsi_u": "lightsteelblue", "rsi_d": "lightsteelblue"}
+RSI_BANDS = ("rsi_u", "rsi_d")
+UP_COLOR, DOWN_COLOR = "#06982d", "#ae1325"
+MAX_PAYLOAD_ENTRIES = 100
+
+def lttb(x, y, n_out):
+    """ indices of the n_out points of (x, y) picked by Largest-Triangle-Three-Buckets
+    (NaN points are skipped, first and last points are always kept)
+    """
+    valid = np.flatnonzero(~np.isnan(y))
+    if len(valid) <= n_out or n_out < 3:
+        return valid
+    xv, yv = x[valid].astype(float), y[valid].astype(float)
+    # bucket edges for the points between the first and the last
+    edges = np.linspace(1, len(valid) - 1, n_out - 1).astype(int)
+    picked = np.empty(n_out, dtype=int)
+    picked[0], picked[-1] = 0, len(valid) - 1
+    a = 0
+    for i in range(n_out - 2):
+        lo, hi = edges[i], edges[i + 1]
+        # average of the next bucket (the last point for the last bucket)
+        nlo, nhi = hi, edges[i + 2] if i + 2 < len(edges) else len(valid)
+        cx, cy = xv[nlo:nhi].mean(), yv[nlo:nhi].mean()
+        area = np.abs((xv[a] - cx) * (yv[lo:hi] - yv[a]) - (xv[a] - xv[lo:hi]) * (cy - yv[a]))
+        a = picked[i + 1] = lo + int(np.argmax(area))
+    return valid[picked]
+
+def _rounded(values, digits=SIG_DIGITS):
+    """ values rounded to digits significant digits of their largest magnitude
+    """
+    values = np.asarray(values, dtype=float)
+    top = np.nanmax(np.abs(values)) if np.isfinite(values).any() else 0
+    if not top:
+        return values
+    return values.round(max(0, digits - 1 - int(np.floor(np.log10(top)))))
+
+def bucket_ohlc(df, n_buckets):
+    """ consecutive bars merged into at most n_buckets candles, dated by their first bar
+    """
+    if len(df) <= n_buckets:
+        starts = np.arange(len(df))
+    else:
+        starts = np.linspace(0, len(df), n_buckets, endpoint=False).astype(int)
+    o, h, l, c = (df[k].values for k in ["Open", "High", "Low", "Close"])
+    ends = np.append(starts[1:], len(df)) - 1
+    return pd.DataFrame({
+        "Date": df.index[starts].tz_localize(None) if df.index.tz is not None else df.index[starts],
+        "Open": _rounded(o[starts]), "High": _rounded(np.fmax.reduceat(h, starts)),
+        "Low": _rounded(np.fmin.reduceat(l, starts)), "Close": _rounded(c[ends]),
+        "Volume": _rounded(np.add.reduceat(np.nan_to_num(df["Volume"].values), starts)),
+    })
+
+def _lines(ta, columns, n_points, n_recent):
+    x = ta.index.asi8
+    split = max(0, len(ta) - n_recent)
+    dates = ta.index.tz_localize(None) if ta.index.tz is not None else ta.index
+    frames = []
+    for col in columns:
+        if col not in ta.columns:
+            continue
+        y = ta[col].values.astype(float)
+        recent = split + lttb(x[split:], y[split:], n_points // 2)
+        idx = np.concatenate([lttb(x[:split], y[:split], n_points - len(recent)), recent])
+        frames.append(pd.DataFrame({"Date": dates[idx], "value": _rounded(y[idx]), "line": col}))
+    return pd.concat(frames, ignore_index=True) if frames else pd.DataFrame(columns=["Date", "value", "line"])
+
+def interactive_payload(ta, num_days_plot=NUM_DAYS_PLOT, max_candles=MAX_CANDLES, max_points=MAX_POINTS):
+    """ {candles, price_lines, rsi_lines}: long-form frames from a TA frame (_calculate_ta),
+    one candle per bar for the last num_days_plot bars (at most max_candles), older bars downsampled
+    """
+    n_recent = min(num_days_plot, max_candles)
+    split = max(0, len(ta) - n_recent)
+    candles = bucket_ohlc(ta.iloc[split:], n_recent)
+    if split:
+        candles = pd.concat([bucket_ohlc(ta.iloc[:split], max_candles), candles], ignore_index=True)
+    return {"candles": candles,
+            "price_lines": _lines(ta, PRICE_LINES, max_points, n_recent),
+            "rsi_lines": _lines(ta, [c for c in RSI_LINES if c not in RSI_BANDS], max_points, n_recent)}
+
+def payload_rows(payload):
+    return sum(len(v) for v in payload.values())
+
+def _payload_bytes(payload):
+    return sum(int(v.memory_usage(index=True, deep=True).sum()) for v in payload.values())
+
+_payload_cache = LruCache(MAX_PAYLOAD_ENTRIES, sizeof=_payload_bytes)
+
+def get_payload(key, calculate_ta, num_days_plot=NUM_DAYS_PLOT):
+    """ interactive_payload(calculate_ta(), num_days_plot), cached by key (ta_key of the
+    bars, including num_days_plot), returns (payload, cache_hit)
+    """
+    payload = _payload_cache.get(key)
+    if payload is not None:
+        return payload, True
+    payload = interactive_payload(calculate_ta(), num_days_plot)
+    _payload_cache.put(key, payload)
+    return payload, False
+
+def get_payload_cache():
+    return _payload_cache
+
+def candlestick_chart(payload, title="", num_days_plot=NUM_DAYS_PLOT, height=420):
+    """ price (candles + EMA bands), RSI and volume panels sharing one zoomable time axis,
+    initially showing the last num_days_plot bars (one candle each, see interactive_payload)
+    """
+    candles = payload["candles"]
+    end = candles["Date"].iloc[-1]
+    start = candles["Date"].iloc[-min(num_days_plot, len(candles))]
+    zoom = alt.selection_interval(bind="scales", encodings=["x"])
+    x = alt.X("Date:T", title=None, scale=alt.Scale(domain=[start.isoformat(), end.isoformat()]))
+    x_linked = alt.X("Date:T", title=None, scale=alt.Scale(domain={"selection": zoom.name, "encoding": "x"}))
+    open_close_color = alt.condition("datum.Open <= datum.Close", alt.value(UP_COLOR), alt.value(DOWN_COLOR))
+
+    base = alt.Chart(candles).encode(x, color=open_close_color,
+        tooltip=["Date:T", "Open:Q", "High:Q", "Low:Q", "Close:Q", "Volume:Q"])
+    rule = base.mark_rule().encode(alt.Y("Low:Q", title="Price", scale=alt.Scale(zero=False)), alt.Y2("High:Q"))
+    bar = base.mark_bar().encode(alt.Y("Open:Q"), alt.Y2("Close:Q"))
+    lines = alt.Chart(payload["price_lines"]).mark_line(strokeWidth=1).encode(x, alt.Y("value:Q"),
+        color=alt.Color("line:N", scale=alt.Scale(domain=list(PRICE_LINES), range=list(PRICE_LINES.values())), legend=None))
+    price = (rule + bar + lines).add_selection(zoom).properties(height=height, title=title)
+
+    rsi_lines = alt.Chart(payload["rsi_lines"]).mark_line(strokeWidth=1).encode(x_linked, alt.Y("value:Q", title="RSI"),
+        color=alt.Color("line:N", scale=alt.Scale(domain=list(RSI_LINES), range=list(RSI_LINES.values())), legend=None),
+        strokeDash=alt.condition("datum.line == 'rsi_avg'", alt.value([4, 2]), alt.value([1, 0])))
+    bands = rsi_lines.transform_filter("datum.line == 'rsi_avg'").transform_calculate(
+        rsi_u=f"datum.value + {RSI_BAND_WIDTH}", rsi_d=f"datum.value - {RSI_BAND_WIDTH}").transform_fold(list(RSI_BANDS), as_=["line", "value"])
+    rsi = (rsi_lines + bands).properties(height=height // 3)
+    volume = alt.Chart(candles).mark_bar().encode(x_linked, alt.Y("Volume:Q"), color=open_close_color).properties(height=height // 6)
+    return alt.vconcat(price, rsi, volume).resolve_scale(color="independent")
+
+##############################################
+## payload size / LTTB check
+##############################################
+if __name__ == '__main__':
+    import json
+    import time
+    from mplfin_core import _calculate_ta
+    from mplfin_quotes import synthetic_quotes
+
+    # LTTB keeps the ends and the extremes of a spiky line
+    x = np.arange(10000)
+    y = np.sin(x / 300) + np.where(x % 997 == 0, 5.0, 0.0)
+    idx = lttb(x, y, 100)
+    assert idx[0] == 0 and idx[-1] == len(x) - 1 and len(idx) == 100 and (np.diff(idx) > 0).all()
+    assert set(np.flatnonzero(y > 4)) <= set(idx), "spikes dropped"
+    y[:50] = np.nan
+    assert lttb(x, y, 100)[0] == 50
+
+    df = _calculate_ta(synthetic_quotes("SPY", end_date="2026-10-16"))
+    t0 = time.perf_counter()
+    payload = interactive_payload(df)
+    elapsed = time.perf_counter() - t0
+    candles = payload["candles"]
+    recent = df.iloc[-NUM_DAYS_PLOT:]
+    assert len(candles) <= MAX_CANDLES + NUM_DAYS_PLOT
+    assert np.isclose(candles["High"].max(), df["High"].max(), rtol=1e-4) and np.isclose(candles["Low"].min(), df["Low"].min(), rtol=1e-4)
+    assert np.isclose(candles["Volume"].sum(), df["Volume"].sum(), rtol=1e-4)
+    # the initial view is daily bars, only the older history is bucketed
+    assert (candles["Date"].iloc[-NUM_DAYS_PLOT:].values == recent.index.tz_localize(None).values).all()
+    np.testing.assert_allclose(candles[["Open", "Close"]].iloc[-NUM_DAYS_PLOT:].values, recent[["Open", "Close"]].values, rtol=1e-4)
+    for name, lines in [("price_lines", PRICE_LINES), ("rsi_lines", {"rsi", "rsi_avg"})]:
+        counts = payload[name]["line"].value_counts()
+        assert set(counts.index) == set(lines) and counts.max() <= MAX_POINTS, counts
+    in_view = payload["rsi_lines"].query("line == 'rsi' and Date >= @recent.index[0].tz_localize(None)")
+    assert len(in_view) == MAX_POINTS // 2 and in_view["Date"].iloc[-1] == recent.index[-1].tz_localize(None)
+    assert get_payload("SPY", lambda: df)[0] is get_payload("SPY", lambda: 1/0)[0]
+    spec = candlestick_chart(payload, title="SPY").to_dict()
+    n_bytes = len(json.dumps(spec, default=str))
+    full_bytes = len(df[["Open", "High", "Low", "Close", "Volume"] + list(PRICE_LINES) + list(RSI_LINES)].to_json(orient="records"))
+    assert n_bytes <= MAX_SPEC_BYTES, n_bytes
+    print(f"interactive ok: {len(df)} bars -> {payload_rows(payload)} rows ({len(candles)} candles) in {1e3*elapsed:.0f} ms, "
+          f"spec {n_bytes/1e3:.0f} KB vs {full_bytes/1e3:.0f} KB for every bar")
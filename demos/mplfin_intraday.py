@@ -0,0 +1,358 @@
+"""
+Intraday bars for demo_mplfin.py (1 and 5 minute timeframes)
+
+during the session a background poller (IntradayPoller) folds new trades
+or finished 1 minute bars into per-symbol ring buffers (IntradayRing),
+one per interval in INTRADAY_INTERVALS:
+- fixed capacity (RING_BARS bars), allocated once: memory per symbol is
+  flat however long the server runs, the oldest bars are overwritten
+- every row is written twice (slot and slot + capacity), so the newest
+  bars are always one contiguous slice; frame() copies that slice under
+  the book lock (a few hundred KB at most), the poller keeps writing
+  into the ring while sessions read their frames
+- a full ring starts one bar later each bar, the TA engine resumes such
+  a window by the time of its last bar (sliding=True, mplfin_stream.py)
+- the poller watches at most MAX_WATCH symbols (least recently viewed
+  are dropped with their rings)
+
+sources:
+- yahoo     : yf.download(interval="1m") during the session, finished bars only
+- synthetic : deterministic random-walk trades seeded by symbol, used with
+              MPLFIN_QUOTE_PROVIDER=fixture (offline, any time of day)
+
+ring / poller check with the synthetic tick generator:
+    python mplfin_intraday.py
+"""
+from collections import OrderedDict
+from threading import Lock
+import os
+import time
+import zlib
+
+import numpy as np
+import pandas as pd
+import yfinance as yf
+
+from mplfin_calendar import MARKET_TZ, get_calendar
+from mplfin_quotes import _split_batch
+from mplfin_worker import PeriodicThread
+
+INTRADAY_INTERVALS = {"1 min": "1min", "5 min": "5min"}   # Timeframe label: bar interval
+OHLCV = ["Open", "High", "Low", "Close", "Volume"]
+RING_BARS = 2048        # bars per symbol and interval, ~5 sessions of 1 min bars
+MAX_WATCH = 100         # symbols polled at once
+POLL_SECONDS = 15
+TICK_SECONDS = 5        # synthetic trade every 5 sec
+BACKFILL = "2D"         # history of a newly watched symbol (synthetic / yahoo "5d")
+
+def is_intraday(timeframe):
+    return timeframe in INTRADAY_INTERVALS.values()
+
+class IntradayRing:
+    """ newest `capacity` bars of one interval, OHLCV float64 + bar start (ns since epoch)
+    """
+    def __init__(self, interval, capacity=RING_BARS):
+        self.interval = interval
+        self.step = pd.Timedelta(interval).value
+        self.capacity = capacity
+        self.index = np.zeros(2*capacity, dtype="int64")
+        self.values = np.zeros((2*capacity, len(OHLCV)))
+        self.n = 0   # bars written since creation
+
+    def __len__(self):
+        return min(self.n, self.capacity)
+
+    def _window(self):
+        end = (self.n - 1) % self.capacity + 1 + (self.capacity if self.n > self.capacity else 0)
+        return end - len(self), end
+
+    def _write(self, slots, index, values):
+        for offset in (0, self.capacity):
+            self.index[slots + offset] = index
+            self.values[slots + offset] = values
+
+    def fold(self, t, o, h, l, c, v):
+        """ merge trades (o=h=l=c=price) or shorter bars into the bars,
+        arrays sorted by t (ns since epoch); data older than the last bar is dropped
+        """
+        start = t - t % self.step
+        if self.n:
+            last_slot = (self.n - 1) % self.capacity
+            last = self.index[last_slot]
+            keep = start >= last
+            t, o, h, l, c, v, start = (x[keep] for x in (t, o, h, l, c, v, start))
+        if not len(t):
+            return 0
+        firsts = np.r_[0, np.flatnonzero(np.diff(start)) + 1]
+        lasts = np.r_[firsts[1:], len(start)] - 1
+        bars = np.column_stack([o[firsts], np.maximum.reduceat(h, firsts), np.minimum.reduceat(l, firsts),
+                                c[lasts], np.add.reduceat(v, firsts)])
+        index = start[firsts]
+        if self.n and index[0] == last:
+            # the in-progress bar
+            row = self.values[last_slot].copy()
+            row[1], row[2] = max(row[1], bars[0, 1]), min(row[2], bars[0, 2])
+            row[3], row[4] = bars[0, 3], row[4] + bars[0, 4]
+            self._write(np.array([last_slot]), index[:1], row[None, :])
+            bars, index = bars[1:], index[1:]
+        if len(index) > self.capacity:
+            # only the newest capacity bars fit
+            self.n += len(index) - self.capacity
+            bars, index = bars[-self.capacity:], index[-self.capacity:]
+        slots = (self.n + np.arange(len(index))) % self.capacity
+        self._write(slots, index, bars)
+        self.n += len(index)
+        return len(index)
+
+    def frame(self, tz=MARKET_TZ):
+        """ DataFrame of the bars, a copy of the ring memory (the caller holds the book lock)
+        """
+        s, e = self._window()
+        index = pd.DatetimeIndex(self.index[s:e].view("M8[ns]"), name="Date").tz_localize("UTC").tz_convert(tz)
+        return pd.DataFrame(self.values[s:e].copy(), index=index, columns=OHLCV, copy=False)
+
+    def nbytes(self):
+        return self.index.nbytes + self.values.nbytes
+
+class IntradayBook:
+    """ rings per (symbol, interval), shared by the poller and all sessions
+    """
+    def __init__(self, intervals=tuple(INTRADAY_INTERVALS.values()), capacity=RING_BARS):
+        self.intervals, self.capacity = intervals, capacity
+        self._lock = Lock()
+        self._rings = {}   # symbol: {interval: IntradayRing}
+
+    def fold(self, symbol, t, o, h, l, c, v):
+        with self._lock:
+            rings = self._rings.get(symbol)
+            if rings is None:
+                rings = self._rings[symbol] = {i: IntradayRing(i, self.capacity) for i in self.intervals}
+            return {i: ring.fold(t, o, h, l, c, v) for i, ring in rings.items()}
+
+    def frame(self, symbol, interval):
+        """ bars of symbol, empty frame before the first poll
+        """
+        with self._lock:
+            rings = self._rings.get(symbol)
+            if rings is None:
+                return pd.DataFrame(columns=OHLCV, index=pd.DatetimeIndex([], name="Date", tz=MARKET_TZ), dtype=float)
+            return rings[interval].frame()
+
+    def drop(self, symbol):
+        with self._lock:
+            self._rings.pop(symbol, None)
+
+    def symbols(self):
+        with self._lock:
+            return list(self._rings)
+
+    def nbytes(self):
+        with self._lock:
+            return sum(r.nbytes() for rings in self._rings.values() for r in rings.values())
+
+##############################################
+## sources: poll(symbols) -> {symbol: (t, o, h, l, c, v)}
+##############################################
+class SyntheticTicks:
+    """ random-walk trades every tick_seconds up to clock(), seeded by symbol and time,
+    a new symbol starts backfill before clock()
+    """
+    name = "synthetic"
+    session_only = False
+
+    def __init__(self, tick_seconds=TICK_SECONDS, backfill=BACKFILL, clock=time.time):
+        self.step = int(tick_seconds * 1e9)
+        self.backfill = pd.Timedelta(backfill).value
+        self.clock = clock
+        self._last = {}   # symbol: (t, price)
+
+    def poll(self, symbols):
+        now = int(self.clock() * 1e9) // self.step * self.step
+        out = {}
+        for symbol in symbols:
+            seed = zlib.crc32(symbol.encode())
+            t0, p0 = self._last.get(symbol) or (now - self.backfill, 20 + seed % 300)
+            t = np.arange(t0 + self.step, now + 1, self.step, dtype="int64")
+            if not len(t):
+                continue
+            rng = np.random.default_rng([seed, t0 // self.step])
+            price = p0 * np.exp(np.cumsum(0.0004 * rng.standard_normal(len(t))))
+            size = 100.0 * rng.integers(1, 50, len(t))
+            out[symbol] = (t, price, price, price, price, size)
+            self._last[symbol] = (t[-1], price[-1])
+        return out
+
+    def forget(self, symbol):
+        self._last.pop(symbol, None)
+
+class YahooMinuteBars:
+    """ finished 1 minute bars from yf.download, BACKFILL for a new symbol
+    """
+    name = "yahoo"
+    session_only = True
+
+    def __init__(self):
+        self._last = {}   # symbol: start of the last bar returned
+
+    def poll(self, symbols):
+        out = {}
+        now = time.time_ns()
+        new = [s for s in symbols if s not in self._last]
+        for batch, period in [(new, "5d"), ([s for s in symbols if s in self._last], "1d")]:
+            if not batch:
+                continue
+            data = yf.download(batch, period=period, interval="1m", group_by="ticker",
+                        auto_adjust=True, prepost=False, threads=True, progress=False)
+            for symbol, df in _split_batch(data, batch).items():
+                t = df.index.as_unit("ns").asi8
+                sel = (t + 60*10**9 <= now) & (t > self._last.get(symbol, -1))
+                if not sel.any():
+                    continue
+                out[symbol] = (t[sel],) + tuple(df[k].values[sel].astype(float) for k in OHLCV)
+                self._last[symbol] = t[sel][-1]
+        return out
+
+    def forget(self, symbol):
+        self._last.pop(symbol, None)
+
+def get_intraday_source(name=None):
+    name = name or os.environ.get("MPLFIN_QUOTE_PROVIDER", "yahoo")
+    return SyntheticTicks() if name == "fixture" else YahooMinuteBars()
+
+##############################################
+## poller
+##############################################
+class IntradayPoller(PeriodicThread):
+    def __init__(self, book=None, source=None, interval=POLL_SECONDS, max_watch=MAX_WATCH):
+        super().__init__("intraday-poller", interval)
+        self.book = book or IntradayBook()
+        self.source = source or get_intraday_source()
+        self.max_watch = max_watch
+        self._watch = OrderedDict()   # symbol: None, least recently watched first
+        self._lock = Lock()
+        self.stats = {"polls": 0, "bars": 0, "errors": 0, "last_poll": None}
+
+    def watch(self, symbols, timeout=None):
+        """ poll symbols from now on; with timeout, wait up to timeout seconds
+        for the first bars of newly watched symbols
+        """
+        with self._lock:
+            for s in symbols:
+                self._watch[s] = None
+                self._watch.move_to_end(s)
+            dropped = []
+            while len(self._watch) > self.max_watch:
+                dropped.append(self._watch.popitem(last=False)[0])
+        for s in dropped:
+            self.book.drop(s)
+            self.source.forget(s)   # backfilled again if watched later
+        missing = set(symbols) - set(self.book.symbols())
+        if missing:
+            self.wake()
+            if timeout:
+                deadline = time.monotonic() + timeout
+                while missing - set(self.book.symbols()) and time.monotonic() < deadline:
+                    time.sleep(0.05)
+
+    def watched(self):
+        with self._lock:
+            return list(self._watch)
+
+    def poll_once(self):
+        symbols = self.watched()
+        if self.source.session_only and not get_calendar().in_session():
+            # market closed: backfill new symbols only
+            have = set(self.book.symbols())
+            symbols = [s for s in symbols if s not in have]
+        if not symbols:
+            return 0
+        n_bars = 0
+        for symbol, arrays in self.source.poll(symbols).items():
+            if symbol in self._watch:
+                n_bars += self.book.fold(symbol, *arrays)[self.book.intervals[0]]
+        self.stats["polls"] += 1
+        self.stats["bars"] += n_bars
+        self.stats["last_poll"] = time.time()
+        return n_bars
+
+    def step(self):
+        self.poll_once()
+
+    def on_error(self, e):
+        self.stats["errors"] += 1
+
+##############################################
+## check with the synthetic tick generator
+##############################################
+if __name__ == '__main__':
+    from mplfin_core import _calculate_ta
+    from mplfin_stream import TaEngine
+
+    # ring against a DataFrame.resample of every trade
+    clock = [pd.Timestamp("2024-06-28 15:00", tz="UTC").timestamp()]
+    source = SyntheticTicks(clock=lambda: clock[0])
+    book = IntradayBook(capacity=512)
+    ticks = []
+    for _ in range(400):
+        for symbol, arrays in source.poll(["SPY"]).items():
+            book.fold(symbol, *arrays)
+            ticks.append(arrays)
+        clock[0] += 37   # polls do not line up with bars
+    t, o, h, l, c, v = (np.concatenate(x) for x in zip(*ticks))
+    trades = pd.DataFrame({"p": c, "v": v}, index=pd.DatetimeIndex(t.view("M8[ns]")).tz_localize("UTC"))
+    for interval in INTRADAY_INTERVALS.values():
+        ref = trades.resample(interval).agg({"p": ["first", "max", "min", "last"], "v": "sum"}).dropna().tail(512)
+        df = book.frame("SPY", interval)
+        assert len(df) == min(512, len(ref)), (interval, len(df), len(ref))
+        np.testing.assert_allclose(df.values, ref.values)
+        assert (df.index == ref.index.tz_convert(MARKET_TZ)).all()
+        assert not np.shares_memory(df.values, book._rings["SPY"][interval].values)
+    assert book._rings["SPY"]["1min"].n > 512   # wrapped
+
+    # a frame taken before a poll keeps its bars
+    small = IntradayBook(intervals=("1min",), capacity=4)
+    minutes = np.arange(5, dtype="int64") * 60 * 10**9
+    small.fold("SPY", minutes[:4], *[np.arange(4.0)] * 5)
+    before = small.frame("SPY", "1min")
+    small.fold("SPY", minutes[4:], *[np.array([4.0])] * 5)
+    assert before["Close"].tolist() == [0.0, 1.0, 2.0, 3.0] and before.index.is_monotonic_increasing
+    assert small.frame("SPY", "1min")["Close"].tolist() == [1.0, 2.0, 3.0, 4.0]
+
+    # memory is flat however many bars arrive
+    n_bytes = book.nbytes()
+    for _ in range(200):
+        book.fold("SPY", *source.poll(["SPY"])["SPY"])
+        clock[0] += 600
+    assert book.nbytes() == n_bytes
+
+    # TA on the ring bars: a full ring starts one bar later each bar, the engine
+    # steps the new bars, same values as _calculate_ta on every bar it has seen
+    engine = TaEngine()
+    t_ta = []
+    history = None
+    for _ in range(100):
+        clock[0] += 60
+        book.fold("SPY", *source.poll(["SPY"])["SPY"])
+        df = book.frame("SPY", "5min")
+        history = df if history is None else pd.concat([history[history.index < df.index[0]], df])
+        t0 = time.perf_counter()
+        ta = engine.update("SPY@5min", df, sliding=True)
+        t_ta.append(time.perf_counter() - t0)
+        assert (ta.index == df.index).all()
+        np.testing.assert_allclose(ta.rsi.values, _calculate_ta(history.copy()).rsi.values[-len(df):], rtol=1e-9, equal_nan=True)
+    assert engine.stats["full"] == 1 and history.index[0] < df.index[0], engine.stats
+
+    # background poller, MAX_WATCH evicts the least recently watched
+    poller = IntradayPoller(source=SyntheticTicks(), interval=0.05, max_watch=3)
+    poller.start()
+    poller.watch(["SPY", "QQQ"], timeout=5)
+    assert set(poller.book.symbols()) == {"SPY", "QQQ"}
+    poller.watch(["IWM", "DIA"], timeout=5)
+    time.sleep(0.2)
+    poller.stop()
+    poller.join(timeout=5)
+    assert not poller.is_alive()
+    assert poller.watched() == ["QQQ", "IWM", "DIA"] and "SPY" not in poller.book.symbols()
+    assert poller.stats["errors"] == 0 and poller.stats["polls"] > 2, poller.stats
+    print(f"intraday ok: {len(book.frame('SPY', '1min'))} 1 min / {len(book.frame('SPY', '5min'))} 5 min bars, "
+          f"{n_bytes/2**10:.0f} KB per symbol, TA per poll {1e3*np.median(t_ta):.2f} ms, poller {poller.stats}")
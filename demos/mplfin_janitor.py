@@ -0,0 +1,188 @@
+"""
+Disk budget for CHART_ROOT (demo_mplfin.py)
+
+a background thread keeps CHART_ROOT within a budget of bytes and/or chart
+files: when either is exceeded, charts are removed least recently viewed
+first until usage is back under LOW_WATERMARK of the budget, so it does
+not run on every new chart.
+- bytes: the indexed chart images (mplfin_index.py) plus the files under
+  cache_roots (quote store, finviz image cache), which are evicted oldest
+  first (by mtime) once no chart can go; files with the same name stem
+  (image + metadata) go together, a removed file is downloaded again
+- files: the chart images only
+
+charts shown by an open session are pinned: every rerun pins the
+session's tickers, and pins expire PIN_TTL seconds after the session's
+last rerun (closed browser tabs are not reported to the app). Pinned
+charts are never evicted, even if that keeps usage over budget.
+
+    python mplfin_janitor.py      # eviction check on generated charts in a temporary directory
+"""
+from pathlib import Path
+from threading import Lock
+import os
+import time
+
+from mplfin_index import get_chart_index
+from mplfin_worker import PeriodicThread
+
+LOW_WATERMARK = 0.9    # evict down to 90% of the budget
+PIN_TTL = 30*60        # seconds
+EVICT_INTERVAL = 60    # seconds
+
+class ChartJanitor(PeriodicThread):
+    def __init__(self, chart_root, max_bytes=None, max_files=None, cache_roots=(), interval=EVICT_INTERVAL, pin_ttl=PIN_TTL):
+        """ max_bytes / max_files: budget, None for no limit
+        cache_roots: directories of downloaded files counted in max_bytes
+        """
+        super().__init__("chart-janitor", interval)
+        self.index = get_chart_index(chart_root)
+        self.max_bytes, self.max_files = max_bytes, max_files
+        self.cache_roots = [Path(r) for r in cache_roots]
+        self.pin_ttl = pin_ttl
+        self._pins = {}    # session_id: (tickers, pinned_at)
+        self._lock = Lock()
+        self.evicted_files = self.evicted_bytes = 0
+        self.last_run = None
+
+    def pin(self, session_id, tickers):
+        """ replace the charts pinned by a session
+        """
+        with self._lock:
+            self._pins[session_id] = (frozenset(tickers), time.time())
+
+    def unpin(self, session_id):
+        with self._lock:
+            self._pins.pop(session_id, None)
+
+    def pinned(self):
+        """ tickers pinned by sessions seen within pin_ttl
+        """
+        now = time.time()
+        with self._lock:
+            for session_id in [s for s, (_, t) in self._pins.items() if now - t > self.pin_ttl]:
+                del self._pins[session_id]
+            return set().union(*(tickers for tickers, _ in self._pins.values()))
+
+    def cache_entries(self):
+        """ [(mtime, bytes, paths)] of the files under cache_roots, oldest first
+        (temp files of atomic writes are left alone)
+        """
+        entries = {}
+        for root in self.cache_roots:
+            for dirpath, _, filenames in os.walk(root):
+                for name in filenames:
+                    if name.startswith("."):
+                        continue
+                    path = Path(dirpath) / name
+                    try:
+                        stat = path.stat()
+                    except FileNotFoundError:
+                        continue
+                    mtime, size, paths = entries.get(path.with_suffix(""), (0, 0, []))
+                    entries[path.with_suffix("")] = (max(mtime, stat.st_mtime), size + stat.st_size, paths + [path])
+        return sorted(entries.values(), key=lambda e: e[0])
+
+    def _over(self, n_files, n_bytes, factor=1.0):
+        return ((self.max_files is not None and n_files > factor*self.max_files) or
+                (self.max_bytes is not None and n_bytes > factor*self.max_bytes))
+
+    def evict(self):
+        """ one pass, returns (files, bytes) evicted
+        """
+        self.last_run = time.time()
+        n_files, n_bytes = self.index.usage()
+        cache = self.cache_entries()
+        n_bytes += sum(size for _, size, _ in cache)
+        if not self._over(n_files, n_bytes):
+            return 0, 0
+        pinned = self.pinned()
+        evicted_files = evicted_bytes = 0
+        for ticker, _, size, mtime in self.index.least_recently_viewed():
+            if not self._over(n_files, n_bytes, LOW_WATERMARK):
+                break
+            if ticker in pinned or not self.index.remove(ticker, mtime):
+                continue
+            n_files, n_bytes = n_files - 1, n_bytes - (size or 0)
+            evicted_files, evicted_bytes = evicted_files + 1, evicted_bytes + (size or 0)
+        for _, size, paths in cache:
+            # they only count in bytes
+            if not self._over(0, n_bytes, LOW_WATERMARK):
+                break
+            for path in paths:
+                path.unlink(missing_ok=True)
+            n_bytes -= size
+            evicted_files, evicted_bytes = evicted_files + len(paths), evicted_bytes + size
+        self.evicted_files += evicted_files
+        self.evicted_bytes += evicted_bytes
+        return evicted_files, evicted_bytes
+
+    def usage(self):
+        """ current usage against the budget
+        """
+        n_files, n_bytes = self.index.usage()
+        cache_bytes = sum(size for _, size, _ in self.cache_entries())
+        return {"files": n_files, "bytes": n_bytes + cache_bytes, "cache_bytes": cache_bytes,
+                "max_files": self.max_files, "max_bytes": self.max_bytes,
+                "pinned": len(self.pinned()), "evicted_files": self.evicted_files,
+                "evicted_bytes": self.evicted_bytes, "last_run": self.last_run}
+
+    def step(self):
+        # wake() runs a pass now, e.g. after a batch of new charts
+        self.evict()
+
+##############################################
+## eviction check on generated charts
+##############################################
+if __name__ == '__main__':
+    import struct
+    import tempfile
+
+    with tempfile.TemporaryDirectory() as chart_root:
+        index = get_chart_index(chart_root)
+        tickers = [f"ETF{i:02d}" for i in range(50)]
+        for i, ticker in enumerate(tickers):
+            f = Path(chart_root) / f"{ticker}.png"
+            f.write_bytes(b"\x89PNG\r\n\x1a\n" + b"\0" * 8 + struct.pack(">II", 800, 600) + b"\0" * (10_000 - 24))
+            index.record(ticker, f)
+            index.touch([ticker])   # viewed in ticker order
+            time.sleep(0.001)
+
+        janitor = ChartJanitor(chart_root, max_files=30, max_bytes=None, interval=3600)
+        janitor.pin("session", tickers[:3])   # least recently viewed, but shown
+        n_files, n_bytes = janitor.evict()
+        u = janitor.usage()
+        left = {f.stem for f in Path(chart_root).glob("*.png")}
+        assert u["files"] == len(left) == int(LOW_WATERMARK * 30), u
+        assert set(tickers[:3]) <= left and not set(tickers[3:3+n_files]) & left, sorted(left)
+        assert janitor.evict() == (0, 0)   # under budget
+
+        # quote store and image cache count in bytes, oldest first once the charts are pinned
+        quote_root, image_root = Path(chart_root) / "quotes", Path(chart_root) / "finviz"
+        (image_root / "d").mkdir(parents=True)
+        quote_root.mkdir()
+        now = time.time()
+        for i in range(10):
+            f = quote_root / f"ETF{i:02d}.arrow"
+            f.write_bytes(b"\0" * 10_000)
+            os.utime(f, (now - 100 + i, now - 100 + i))
+        for i in range(5):
+            for suffix, size in [(".png", 10_000), (".json", 100)]:
+                (image_root / "d" / f"ETF{i:02d}{suffix}").write_bytes(b"\0" * size)
+        (quote_root / ".ETF00.tmp").write_bytes(b"\0" * 10_000)   # being written
+        cached = ChartJanitor(chart_root, max_bytes=400_000, cache_roots=[quote_root, image_root], interval=3600)
+        cached.pin("session", left)
+        assert cached.usage()["bytes"] == 27 * 10_000 + 10 * 10_000 + 5 * 10_100
+        cached.evict()
+        u_cached = cached.usage()
+        assert u_cached["bytes"] <= LOW_WATERMARK * 400_000 and u_cached["files"] == 27, u_cached
+        assert sorted(f.name for f in quote_root.glob("*.arrow")) == ["ETF07.arrow", "ETF08.arrow", "ETF09.arrow"]
+        assert len(list(image_root.glob("d/*"))) == 10 and (quote_root / ".ETF00.tmp").exists()
+
+        janitor.start()
+        janitor.stop()
+        janitor.join(timeout=5)
+        assert not janitor.is_alive()
+        print(f"janitor ok: evicted {n_files} charts ({n_bytes/1e3:.0f} KB), "
+              f"usage: {u['files']} charts, {u['bytes']/1e3:.0f} KB, {u['pinned']} pinned; "
+              f"with caches: {u_cached['bytes']/1e3:.0f} KB ({u_cached['cache_bytes']/1e3:.0f} KB cached)")
@@ -0,0 +1,104 @@
+"""
+Manifest of pre-rendered charts for demo_mplfin.py
+
+CHART_ROOT/manifest.json, one entry per ticker written by mplfin_batch.py:
+    ticker, file_img, date (last bar), today_quote, prev_day_quote,
+    rendered_at, render_time, expires_at (quote expiry), params_key, mtime, err_msg
+
+an entry is fresh while its quotes have not expired and it was rendered
+with the current render/TA settings (params_key), and the image was not
+overwritten since (mtime); the chart page serves fresh entries from disk
+instead of downloading and rendering
+"""
+from pathlib import Path
+from threading import Lock
+import hashlib
+import json
+import os
+import tempfile
+import time
+
+from mplfin_cache import render_key
+
+MANIFEST_FILE = "manifest.json"
+QUOTE_KEYS = ["Open", "High", "Low", "Close", "Volume"]
+
+def params_key(render_params, ta_params):
+    ta_hash = hashlib.sha1(repr(sorted(ta_params.items())).encode()).hexdigest()
+    return render_key(ta_hash, render_params)
+
+def _quote(row):
+    return {k: float(row[k]) for k in QUOTE_KEYS if k in row}
+
+class ChartManifest:
+    def __init__(self, chart_root):
+        self.path = Path(chart_root) / MANIFEST_FILE
+        self._lock = Lock()
+        self._mtime, self._entries = None, {}
+
+    def load(self):
+        """ {ticker: entry}, re-read only when the file changed
+        """
+        with self._lock:
+            try:
+                mtime = self.path.stat().st_mtime_ns
+            except FileNotFoundError:
+                return {}
+            if mtime != self._mtime:
+                self._entries = json.loads(self.path.read_text())
+                self._mtime = mtime
+            return self._entries
+
+    def update(self, entries):
+        """ merge {ticker: entry} into the manifest, written atomically
+        """
+        merged = dict(self.load())
+        merged.update(entries)
+        fd, tmp = tempfile.mkstemp(dir=self.path.parent, prefix=".manifest.", suffix=".tmp")
+        try:
+            with os.fdopen(fd, "w") as f:
+                json.dump(merged, f, indent=1, default=str)
+            os.replace(tmp, self.path)
+        except:
+            Path(tmp).unlink(missing_ok=True)
+            raise
+        return merged
+
+    def entry(self, ticker_dict, render_time, expires_at, key):
+        """ manifest entry for a ticker_dict whose image is already saved to file_img
+        """
+        if ticker_dict.get("err_msg"):
+            return {"ticker": ticker_dict["ticker"], "err_msg": ticker_dict["err_msg"],
+                    "rendered_at": time.time(), "render_time": render_time}
+        return {"ticker": ticker_dict["ticker"], "file_img": str(ticker_dict["file_img"]),
+                "date": str(ticker_dict["date"]),
+                "today_quote": _quote(ticker_dict["today_quote"]),
+                "prev_day_quote": _quote(ticker_dict["prev_day_quote"]),
+                "rendered_at": time.time(), "render_time": render_time,
+                "expires_at": expires_at, "params_key": key,
+                "mtime": Path(ticker_dict["file_img"]).stat().st_mtime_ns, "err_msg": None}
+
+    def fresh(self, tickers, key, now=None):
+        """ {ticker: entry} for tickers whose chart can be served as is
+        """
+        now = time.time() if now is None else now
+        entries = self.load()
+        fresh = {}
+        for ticker in tickers:
+            e = entries.get(ticker)
+            if not e or e.get("err_msg") or e.get("params_key") != key or e.get("expires_at", 0) <= now:
+                continue
+            try:
+                if Path(e["file_img"]).stat().st_mtime_ns == e["mtime"]:
+                    fresh[ticker] = e
+            except FileNotFoundError:
+                pass
+        return fresh
+
+_manifest_cache = {}
+
+def get_manifest(chart_root):
+    # one manifest per chart root per process
+    if chart_root not in _manifest_cache:
+        _manifest_cache[chart_root] = ChartManifest(chart_root)
+    return _manifest_cache[chart_root]
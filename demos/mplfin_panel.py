@@ -0,0 +1,170 @@
+"""
+Cross-sectional TA panel for demo_mplfin.py
+
+every symbol's bars go into 2-D arrays (dates x symbols) on the union of
+their dates: a symbol listed later, stale / delisted or missing a bar is
+NaN on those dates, so rows of different symbols are the same day.
+The indicators run on each symbol's own bars (panel.bars(), aligned on
+the last bar, no gaps) and are put back on the dates (panel.expand()):
+all _calculate_ta indicators for the whole universe in one vectorized
+pass with the mplfin_ta kernels, same values as _calculate_ta per symbol.
+
+parity check + timing:
+    python mplfin_panel.py
+"""
+import numpy as np
+import pandas as pd
+
+from mplfin_core import (
+    EMA_FAST, EMA_SLOW, EMA_LONG, EMA_FAST_SCALE, EMA_SLOW_SCALE, MA_VOL,
+    RSI_PERIOD, RSI_AVG, RSI_BAND_WIDTH,
+)
+from mplfin_ta import ewm_mean, wilder_rsi
+
+OHLCV = ["Open", "High", "Low", "Close", "Volume"]
+SCREENER_COLUMNS = ["Ticker", "Date", "Close", "Chg(%)", "RSI", "RSI signal",
+    "EMA fast(%)", "EMA slow(%)", "EMA long(%)", "Trend"]
+
+class QuotePanel:
+    def __init__(self, quotes):
+        """ quotes: {symbol: OHLCV dataframe}, empty frames are dropped
+        """
+        self.symbols = [s for s, df in quotes.items() if df is not None and len(df)]
+        self.n_bars = np.array([len(quotes[s]) for s in self.symbols], dtype=int)
+        self.last_dates = [quotes[s].index[-1] for s in self.symbols]
+        index = [_naive(quotes[s].index) for s in self.symbols]
+        self.dates = pd.DatetimeIndex(np.unique(np.concatenate([i.values for i in index])) if index else [], name="Date")
+
+        # flat (date row, bar row, column) of every bar, bar rows aligned on the last bar
+        n = self.n_bars.max() if len(self.n_bars) else 0
+        self._date_row = np.concatenate([self.dates.get_indexer(i) for i in index]) if index else np.empty(0, dtype=int)
+        self._bar_row = np.concatenate([np.arange(n - k, n) for k in self.n_bars]) if index else np.empty(0, dtype=int)
+        self._col = np.repeat(np.arange(len(self.symbols)), self.n_bars)
+        self._shape = (len(self.dates), len(self.symbols)), (n, len(self.symbols))
+
+        self.data = {}
+        for col in OHLCV:
+            values = np.concatenate([quotes[s][col].values for s in self.symbols]) if index else np.empty(0)
+            a = np.full(self._shape[0], np.nan)
+            a[self._date_row, self._col] = values
+            self.data[col] = a
+
+    def __getitem__(self, col):
+        return self.data[col]
+
+    def __len__(self):
+        return len(self.symbols)
+
+    def bars(self, a):
+        """ dates x symbols -> bars x symbols, each symbol's bars without gaps, last bar in the last row
+        """
+        b = np.full(self._shape[1], np.nan)
+        b[self._bar_row, self._col] = a[self._date_row, self._col]
+        return b
+
+    def expand(self, b):
+        """ bars x symbols (see bars) -> dates x symbols
+        """
+        a = np.full(self._shape[0], np.nan)
+        a[self._date_row, self._col] = b[self._bar_row, self._col]
+        return a
+
+def _naive(index):
+    # one date index for all symbols, as close_frame in mplfin_corr.py
+    return index.tz_localize(None) if index.tz is not None else index
+
+def panel_ta(panel):
+    """ {column: 2-D array, dates x symbols} with the _calculate_ta columns for every symbol
+    """
+    ta = {}
+    high, low, close, volume = (panel.bars(panel[c]) for c in ["High", "Low", "Close", "Volume"])
+    w_p = ta["w_p"] = 0.25*(2*close + high + low)
+    ta["ema_fast"] = ewm_mean(w_p, EMA_FAST)
+    ta["ema_slow"] = ewm_mean(w_p, EMA_SLOW)
+    ta["ema_long"] = ewm_mean(w_p, EMA_LONG)
+
+    # range
+    hl_mean_fast = ewm_mean(high - low, EMA_FAST)
+    ta["ema_fast_u"] = ta["ema_fast"] + 0.5*hl_mean_fast * EMA_FAST_SCALE
+    ta["ema_fast_d"] = ta["ema_fast"] - 0.5*hl_mean_fast * EMA_FAST_SCALE
+    hl_mean_slow = ewm_mean(high - low, EMA_SLOW)
+    ta["ema_slow_u"] = ta["ema_slow"] + 0.5*hl_mean_slow * EMA_SLOW_SCALE
+    ta["ema_slow_d"] = ta["ema_slow"] - 0.5*hl_mean_slow * EMA_SLOW_SCALE
+
+    ta["Volume"] = volume / 1000000
+    ta["vol_avg"] = ewm_mean(ta["Volume"], MA_VOL)
+
+    # RSI centered at 0, see _ta_RSI
+    rsi = ta["rsi"] = wilder_rsi(w_p, RSI_PERIOD) - 50
+    ta["rsi_avg"] = ewm_mean(rsi, RSI_AVG)
+    ta["rsi_u"] = ta["rsi_avg"] + RSI_BAND_WIDTH
+    ta["rsi_d"] = ta["rsi_avg"] - RSI_BAND_WIDTH
+    ta["rsi_signal"] = rsi - ta["rsi_avg"]
+    return {col: panel.expand(a) for col, a in ta.items()}
+
+def _trend(fast, slow, long):
+    if fast > slow > long:
+        return "up"
+    if fast < slow < long:
+        return "down"
+    return "mixed"
+
+def screener(panel, ta=None):
+    """ one row per symbol from its last bar, sortable in st.dataframe
+    """
+    ta = {col: panel.bars(a) for col, a in (ta or panel_ta(panel)).items() if col in ["rsi", "rsi_signal", "ema_fast", "ema_slow", "ema_long"]}
+    close = panel.bars(panel["Close"])
+    last, prev = close[-1], close[-2] if len(close) > 1 else np.full(len(panel), np.nan)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        df = pd.DataFrame({
+            "Ticker": panel.symbols,
+            "Date": [pd.to_datetime(d).date() for d in panel.last_dates],
+            "Close": last,
+            "Chg(%)": 100*(1 - prev / last),   # same as _reformat_quote
+            "RSI": ta["rsi"][-1] + 50,
+            "RSI signal": ta["rsi_signal"][-1],
+            "EMA fast(%)": 100*(last / ta["ema_fast"][-1] - 1),
+            "EMA slow(%)": 100*(last / ta["ema_slow"][-1] - 1),
+            "EMA long(%)": 100*(last / ta["ema_long"][-1] - 1),
+            "Trend": [_trend(*v) for v in zip(ta["ema_fast"][-1], ta["ema_slow"][-1], ta["ema_long"][-1])],
+        }, columns=SCREENER_COLUMNS)
+    return df
+
+##############################################
+## parity check / timing
+##############################################
+if __name__ == '__main__':
+    import time
+    from mplfin_core import NUM_DAYS_QUOTE, _calculate_ta
+    from mplfin_quotes import synthetic_quotes
+
+    # staggered history lengths like newly listed ETFs, some stale (last bar earlier) or missing bars
+    symbols = [f"ETF{i:02d}" for i in range(80)]
+    quotes = {s: synthetic_quotes(s, end_date="2024-06-28").tail(NUM_DAYS_QUOTE - 3*i) for i, s in enumerate(symbols)}
+    for i, s in enumerate(symbols[::7]):
+        quotes[s] = quotes[s].iloc[:-(i+1)] if i % 2 else quotes[s].drop(quotes[s].index[[50, 51, 120]])
+
+    t0 = time.perf_counter()
+    panel = QuotePanel(quotes)
+    t1 = time.perf_counter()
+    ta = panel_ta(panel)
+    df = screener(panel, ta)
+    t2 = time.perf_counter()
+    for s in quotes:
+        quotes[s] = _calculate_ta(quotes[s].copy())
+    t3 = time.perf_counter()
+
+    max_err = 0.0
+    for j, s in enumerate(panel.symbols):
+        rows = panel.dates.get_indexer(_naive(quotes[s].index))
+        for col, a in ta.items():
+            ref = quotes[s][col].values
+            np.testing.assert_allclose(a[rows, j], ref, rtol=1e-9, atol=1e-9, equal_nan=True, err_msg=f"{s} {col}")
+            max_err = max(max_err, np.nanmax(np.abs(a[rows, j] - ref)))
+        assert np.isnan(np.delete(ta["w_p"][:, j], rows)).all()   # no values on the dates without a bar
+        row = df.set_index("Ticker").loc[s]
+        assert row["Date"] == quotes[s].index[-1].date() and row["Close"] == quotes[s]["Close"].values[-1]
+    print(f"parity ok: {len(panel)} symbols, max abs diff {max_err:.2e}")
+    print(f"panel load {1e3*(t1-t0):.1f} ms, panel TA + screener {1e3*(t2-t1):.1f} ms, "
+          f"_calculate_ta per symbol {1e3*(t3-t2):.1f} ms")
+    print(df.sort_values("RSI signal", ascending=False).head())
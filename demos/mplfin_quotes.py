@@ -0,0 +1,177 @@
+"""
+Quote providers for demo_mplfin.py
+
+A provider fetches daily OHLCV for many symbols in one call and returns
+{symbol: df}, each df shaped like yf.Ticker(symbol).history()
+
+- yahoo   : one batched yf.download() request for all symbols
+- yahoo_async : one rate limited request per symbol on an asyncio loop,
+            with retries and cancellation (see mplfin_fetch.py)
+- fixture : deterministic offline replay of stored OHLCV csv files
+            (synthetic bars seeded by symbol when no file exists),
+            for load-testing the app without network access
+
+select the provider with env var MPLFIN_QUOTE_PROVIDER=yahoo|yahoo_async|fixture
+(default yahoo_async: a slow or failing symbol does not hold up the others),
+get_provider() wraps it in CoalescingProvider: concurrent requests for the
+same (symbol, num_days) share one fetch (see mplfin_flight.py)
+"""
+from pathlib import Path
+from datetime import datetime
+import os
+import zlib
+
+import numpy as np
+import pandas as pd
+import yfinance as yf
+
+from mplfin_fetch import get_fetcher
+from mplfin_flight import SingleFlight
+
+OHLCV_COLUMNS = ["Open", "High", "Low", "Close", "Volume", "Dividends", "Stock Splits"]
+FIXTURE_ROOT = Path(__file__).parent / "data" / "quotes"
+FIXTURE_START_DATE = "2015-01-02"   # synthetic series start here so that old bars never change
+DEFAULT_PROVIDER = "yahoo_async"
+
+class QuoteProvider:
+    name = ""
+
+    def history(self, symbols, num_days):
+        """ return {symbol: df} for the last num_days calendar days,
+        symbols that fail are left out
+        """
+        raise NotImplementedError
+
+    def fetch(self, symbol, num_days):
+        quotes = self.history([symbol], num_days)
+        if symbol not in quotes:
+            raise ValueError(f"no quote data for {symbol}")
+        return quotes[symbol]
+
+class YahooProvider(QuoteProvider):
+    name = "yahoo"
+
+    def history(self, symbols, num_days):
+        symbols = list(symbols)
+        if not symbols:
+            return {}
+        data = yf.download(symbols, period=f"{num_days}d", group_by="ticker",
+                    auto_adjust=True, actions=True, ignore_tz=False,
+                    threads=True, progress=False)
+        return _split_batch(data, symbols)
+
+class AsyncYahooProvider(QuoteProvider):
+    name = "yahoo_async"
+
+    def history(self, symbols, num_days):
+        # symbols that fail after their retries are left out
+        quotes, errors = get_fetcher().fetch(list(symbols), num_days)
+        return quotes
+
+def _split_batch(data, symbols):
+    """ split a yf.download(group_by="ticker") frame into per-symbol frames
+    """
+    quotes = {}
+    if data is None or data.empty:
+        return quotes
+    if not isinstance(data.columns, pd.MultiIndex):
+        # older yfinance returns flat columns for a single symbol
+        data = pd.concat({symbols[0]: data}, axis=1)
+    for symbol in symbols:
+        if symbol not in data.columns.get_level_values(0):
+            continue
+        df = data[symbol].dropna(how="all", subset=["Open", "High", "Low", "Close"])
+        if df.empty:
+            continue
+        df = df[[c for c in OHLCV_COLUMNS if c in df.columns]].copy()
+        df.index.name = "Date"
+        quotes[symbol] = df
+    return quotes
+
+class FixtureProvider(QuoteProvider):
+    name = "fixture"
+
+    def __init__(self, fixture_root=FIXTURE_ROOT, end_date=None, synthesize=True):
+        self.fixture_root = Path(fixture_root)
+        self.end_date = end_date
+        self.synthesize = synthesize
+
+    def history(self, symbols, num_days):
+        quotes = {}
+        for symbol in symbols:
+            df = self._load(symbol)
+            if df is None or df.empty:
+                continue
+            start = df.index[-1] - pd.Timedelta(days=num_days)
+            quotes[symbol] = df[df.index > start].copy()
+        return quotes
+
+    def _load(self, symbol):
+        file_csv = self.fixture_root / f"{symbol}.csv"
+        if file_csv.exists():
+            df = pd.read_csv(file_csv, index_col="Date", parse_dates=["Date"])
+        elif self.synthesize:
+            df = synthetic_quotes(symbol, end_date=self.end_date)
+        else:
+            return None
+        if self.end_date is not None:
+            df = df[df.index <= pd.Timestamp(self.end_date)]
+        return df
+
+class CoalescingProvider(QuoteProvider):
+    """ single-flight in front of a provider, process-wide
+    """
+    def __init__(self, provider):
+        self.provider = provider
+        self.name = provider.name
+        self.flight = SingleFlight()
+
+    def history(self, symbols, num_days):
+        quotes = self.flight.do_many([(s, num_days) for s in symbols],
+            lambda keys: {(s, num_days): df for s, df in self.provider.history([s for s, _ in keys], num_days).items()},
+            copy=pd.DataFrame.copy)
+        return {s: df for (s, _), df in quotes.items()}
+
+def synthetic_quotes(symbol, end_date=None, start_date=FIXTURE_START_DATE):
+    """ deterministic random-walk OHLCV bars (business days),
+    seeded by symbol so that every run/process sees the same series
+    """
+    end_date = pd.Timestamp(end_date or datetime.now().date())
+    idx = pd.bdate_range(start=start_date, end=end_date, name="Date")
+    n = len(idx)
+    rng = np.random.default_rng(zlib.crc32(symbol.encode()))
+    base = 20 + rng.random() * 300
+    # draw row by row (shape n x 4) so that a later end_date only appends bars
+    z = rng.standard_normal((n, 4))
+    close = base * np.exp(np.cumsum(0.0002 + 0.012 * z[:, 0]))
+    open_ = close * (1 + 0.004 * z[:, 1])
+    high = np.maximum(open_, close) * (1 + np.abs(0.006 * z[:, 2]))
+    low = np.minimum(open_, close) * (1 - np.abs(0.006 * z[:, 3]))
+    volume = np.round(4_000_000 * np.exp(0.5 * z[:, 1] * z[:, 2])).astype("int64")
+    return pd.DataFrame({"Open": open_, "High": high, "Low": low, "Close": close,
+            "Volume": volume, "Dividends": 0.0, "Stock Splits": 0.0}, index=idx)
+
+def record_fixtures(symbols, num_days, provider=None, fixture_root=FIXTURE_ROOT):
+    """ store quotes from provider (default yahoo) as fixture csv files
+    """
+    provider = provider or YahooProvider()
+    Path(fixture_root).mkdir(parents=True, exist_ok=True)
+    quotes = provider.history(symbols, num_days)
+    for symbol, df in quotes.items():
+        if df.index.tz is not None:
+            df = df.tz_localize(None)
+        df.to_csv(Path(fixture_root) / f"{symbol}.csv", index_label="Date")
+    return list(quotes.keys())
+
+PROVIDERS = {
+    YahooProvider.name: YahooProvider,
+    AsyncYahooProvider.name: AsyncYahooProvider,
+    FixtureProvider.name: FixtureProvider,
+}
+_provider_cache = {}
+
+def get_provider(name=None):
+    name = name or os.environ.get("MPLFIN_QUOTE_PROVIDER", DEFAULT_PROVIDER)
+    if name not in _provider_cache:
+        _provider_cache[name] = CoalescingProvider(PROVIDERS[name]())
+    return _provider_cache[name]
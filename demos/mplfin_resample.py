@@ -0,0 +1,88 @@
+"""
+Weekly/monthly bars from the cached daily bars (demo_mplfin.py)
+
+open = first open, high = max, low = min, close = last close,
+volume/dividends = sum, per calendar week (Mon-Fri) or month. A bar is
+labeled with its last trading day, so the current week/month is an
+in-progress bar dated today (never a future date) that the TA engine
+revises like an in-session daily bar.
+
+resampled bars are cached per (daily bars, timeframe), the daily bars
+come from the quote store / memo. Weekly/monthly TA needs more than
+RSI_PERIOD bars, so those timeframes ask for HISTORY_DAYS of daily bars:
+the first weekly or monthly view downloads the longer history once, the
+store then serves every timeframe (daily included) from it, and
+switching timeframe does not download anything.
+
+check against DataFrame.resample:
+    python mplfin_resample.py
+"""
+import numpy as np
+
+from mplfin_cache import LruCache, ta_key
+from mplfin_core import NUM_DAYS_QUOTE
+
+RESAMPLE_FREQ = {"d": None, "w": "W-FRI", "m": "M"}   # PERIOD_DICT values in demo_mplfin.py
+AGG = {"Open": "first", "High": "max", "Low": "min", "Close": "last", "Volume": "sum",
+       "Dividends": "sum", "Stock Splits": "max"}
+MAX_BAR_ENTRIES = 200
+HISTORY_DAYS = 12*365   # daily history behind weekly/monthly bars
+
+def quote_days(timeframe, num_days=NUM_DAYS_QUOTE):
+    """ calendar days of daily quotes needed for timeframe
+    """
+    return num_days if RESAMPLE_FREQ[timeframe] is None else max(num_days, HISTORY_DAYS)
+
+def resample_bars(df, timeframe):
+    """ OHLCV bars of timeframe ("d", "w", "m") from daily bars, labeled by their last day
+    """
+    freq = RESAMPLE_FREQ[timeframe]
+    if freq is None or df.empty:
+        return df
+    index = df.index.tz_localize(None) if df.index.tz is not None else df.index
+    periods = index.to_period(freq).asi8
+    out = df.groupby(periods, sort=False).agg({c: f for c, f in AGG.items() if c in df.columns})
+    last = np.append(np.flatnonzero(np.diff(periods)), len(periods) - 1)
+    out.index = df.index[last]
+    return out
+
+_bar_cache = LruCache(MAX_BAR_ENTRIES, sizeof=lambda df: int(df.memory_usage(index=True).sum()))
+
+def get_bars(ticker, df, timeframe):
+    """ resample_bars, cached by the daily bars (same key as the TA cache) and timeframe
+    """
+    if RESAMPLE_FREQ[timeframe] is None:
+        return df
+    key = ta_key(ticker, df, {"timeframe": timeframe})
+    bars = _bar_cache.get(key)
+    if bars is None:
+        bars = resample_bars(df, timeframe)
+        _bar_cache.put(key, bars)
+    return bars
+
+def get_bar_cache():
+    return _bar_cache
+
+##############################################
+## check
+##############################################
+if __name__ == '__main__':
+    import time
+    from mplfin_quotes import synthetic_quotes
+
+    df = synthetic_quotes("SPY", end_date="2024-07-03").tail(800)
+    df.loc["2024-06-19"] = np.nan   # a holiday-like gap must not create a bar
+    df = df.dropna().tz_localize("America/New_York")
+    for timeframe, rule, period in [("w", "W-FRI", "W-FRI"), ("m", "MS", "M")]:
+        t0 = time.perf_counter()
+        bars = resample_bars(df, timeframe)
+        elapsed = time.perf_counter() - t0
+        ref = df.tz_localize(None).resample(rule).agg(AGG).dropna(subset=["Open"])
+        np.testing.assert_allclose(bars[list(AGG)].values, ref[list(AGG)].values)
+        # labeled by the last trading day, the last bar is in progress
+        assert (bars.index.tz_localize(None).to_period(period) == ref.index.to_period(period)).all()
+        assert bars.index[-1] == df.index[-1] and bars.index.isin(df.index).all()
+        print(f"{timeframe}: {len(df)} daily -> {len(bars)} bars in {1e3*elapsed:.1f} ms, last {bars.index[-1].date()}")
+    assert resample_bars(df, "d") is df
+    assert get_bars("SPY", df, "w") is get_bars("SPY", df, "w")
+    print("resample ok")
@@ -0,0 +1,172 @@
+"""
+Per-symbol columnar quote store for demo_mplfin.py
+
+one Arrow IPC (feather v2) file per ticker under root (QUOTE_ROOT):
+- written atomically (temp file + os.replace), so a concurrent session
+  never reads a half-written file
+- memory-mapped on read, only the requested symbol is touched
+- refreshed incrementally: only bars after the last stored date are
+  downloaded and appended (the last stored bar is re-fetched because it
+  may have been an in-progress session bar)
+- at most max_days (HISTORY_DAYS) are kept, older bars are dropped on write
+- reads return exactly the last num_days, whatever the store holds, so
+  TA over them is the same on every machine
+
+replaces the single df_quotes_cache.pickle that held every symbol
+"""
+from pathlib import Path
+import os
+import tempfile
+import time
+
+import pandas as pd
+import pyarrow as pa
+
+from mplfin_quotes import get_provider
+from mplfin_resample import HISTORY_DAYS
+
+META_FETCHED_AT = b"mplfin.fetched_at"
+META_NUM_DAYS = b"mplfin.num_days"
+
+class QuoteStore:
+    def __init__(self, root, provider=None, max_days=HISTORY_DAYS):
+        self.root = Path(root)
+        self.root.mkdir(parents=True, exist_ok=True)
+        self._provider = provider
+        self.max_days = max_days
+
+    @property
+    def provider(self):
+        return self._provider or get_provider()
+
+    def _path(self, symbol):
+        return self.root / f"{symbol}.arrow"
+
+    def symbols(self):
+        return sorted(f.stem for f in self.root.glob("*.arrow"))
+
+    def read_meta(self, symbol):
+        """ (fetched_at, num_days) from the schema metadata, without reading the columns
+        """
+        file_arrow = self._path(symbol)
+        if not file_arrow.exists():
+            return None
+        with pa.memory_map(str(file_arrow), "r") as source:
+            meta = pa.ipc.open_file(source).schema.metadata or {}
+        return float(meta.get(META_FETCHED_AT, 0)), int(meta.get(META_NUM_DAYS, 0))
+
+    def read(self, symbol):
+        file_arrow = self._path(symbol)
+        if not file_arrow.exists():
+            return None
+        with pa.memory_map(str(file_arrow), "r") as source:
+            table = pa.ipc.open_file(source).read_all()
+        return table.to_pandas()
+
+    def write(self, symbol, df, num_days, fetched_at=None):
+        table = pa.Table.from_pandas(_last_days(df, self.max_days), preserve_index=True)
+        meta = dict(table.schema.metadata or {})
+        meta[META_FETCHED_AT] = str(fetched_at or time.time()).encode()
+        meta[META_NUM_DAYS] = str(min(num_days, self.max_days)).encode()
+        table = table.replace_schema_metadata(meta)
+
+        fd, tmp = tempfile.mkstemp(dir=self.root, prefix=f".{symbol}.", suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as sink:
+                with pa.ipc.new_file(sink, table.schema) as writer:
+                    writer.write_table(table)
+            os.replace(tmp, self._path(symbol))
+        except:
+            Path(tmp).unlink(missing_ok=True)
+            raise
+
+    def delete(self, symbol):
+        self._path(symbol).unlink(missing_ok=True)
+
+    def is_fresh(self, symbol, num_days, ttl):
+        meta = self.read_meta(symbol)
+        if meta is None:
+            return False
+        fetched_at, stored_days = meta
+        return stored_days >= num_days and not _expired(fetched_at, ttl)
+
+    def get(self, symbol, num_days, ttl):
+        quotes = self.get_many([symbol], num_days, ttl)
+        if symbol not in quotes:
+            raise ValueError(f"no quote data for {symbol}")
+        return quotes[symbol]
+
+    def get_many(self, symbols, num_days, ttl):
+        """ {symbol: df} covering the last num_days (at most max_days), refreshing stale symbols
+        with at most two batched provider requests (incremental + full)
+        ttl: seconds, or expiry(fetched_at) -> epoch seconds (see mplfin_calendar.quote_expiry)
+        """
+        num_days = min(num_days, self.max_days)
+        quotes, incremental, full = {}, {}, []
+        for symbol in symbols:
+            meta = self.read_meta(symbol)
+            if meta is not None and meta[1] >= num_days:
+                df = self.read(symbol)
+                if not _expired(meta[0], ttl):
+                    quotes[symbol] = df
+                elif len(df):
+                    incremental[symbol] = df, meta[1]
+                else:
+                    full.append(symbol)
+            else:
+                full.append(symbol)
+
+        if incremental:
+            last_dates = [df.index[-1] for df, _ in incremental.values()]
+            gap_days = (pd.Timestamp.now() - min(d.tz_localize(None) for d in last_dates)).days + 2
+            fetched = self.provider.history(list(incremental), gap_days)
+            for symbol, (df, stored_days) in incremental.items():
+                new = fetched.get(symbol)
+                if new is None:
+                    quotes[symbol] = df  # keep stale bars, retry next time
+                    continue
+                merged = _append_bars(df, new)
+                if merged is None:
+                    full.append(symbol)  # index mismatch, re-download
+                    continue
+                # still covers the longer history stored before (e.g. weekly bars)
+                self.write(symbol, merged, max(num_days, stored_days))
+                quotes[symbol] = merged
+
+        if full:
+            fetched = self.provider.history(full, num_days)
+            for symbol, df in fetched.items():
+                self.write(symbol, df, num_days)
+                quotes[symbol] = df
+
+        return {s: _last_days(quotes[s], num_days) for s in symbols if s in quotes}
+
+def _expired(fetched_at, ttl):
+    if callable(ttl):
+        return time.time() >= ttl(fetched_at)
+    return time.time() - fetched_at >= ttl
+
+def _append_bars(df, new):
+    """ replace bars from the first new date on, None if the frames can not be merged
+    """
+    if new.empty:
+        return df
+    if df.index.tz != new.index.tz:
+        return None
+    new = new[new.index >= df.index[-1]]
+    if new.empty:
+        return df
+    return pd.concat([df[df.index < new.index[0]], new[df.columns.intersection(new.columns)]])
+
+def _last_days(df, num_days):
+    if df.empty:
+        return df
+    return df[df.index > df.index[-1] - pd.Timedelta(days=num_days)]
+
+_store_cache = {}
+
+def get_quote_store(root):
+    # one store per root per process
+    if root not in _store_cache:
+        _store_cache[root] = QuoteStore(root)
+    return _store_cache[root]
@@ -0,0 +1,390 @@
+"""
+Incremental TA engine for demo_mplfin.py
+
+_calculate_ta recomputes every EMA and the RSI chain over the whole
+history. TaEngine keeps, per symbol, the last EMA states (pandas
+ewm(span, adjust=True) keeps a weighted mean plus a total weight) and
+the Wilder gain/loss averages, and advances them by the new bars only.
+
+- the first call (or a moved history start) runs _calculate_ta itself
+  and extracts the state from its output, so both paths agree: daily
+  TA is _calculate_ta of the quote window (the last num_days, which
+  moves once a day)
+- the last stored bar may be revised (in-session bar re-fetched by the
+  quote store, in-progress intraday bar), one step of rollback covers that
+- sliding=True (intraday ring, the window moves every bar): a window
+  that starts later resumes at the last stepped bar, found by its time,
+  the rows before the window are dropped and the states keep them
+- anything else (history start moved, bars removed) falls back to a
+  full recompute
+- compact=True keeps only the plotted columns as float32 and the last
+  NUM_DAYS_QUOTE rows (see mplfin_compact.py), the states stay float64
+
+replay check against full recompute:
+    python mplfin_stream.py
+"""
+from threading import Lock
+import copy
+
+import numpy as np
+import pandas as pd
+
+from mplfin_core import (
+    EMA_FAST, EMA_SLOW, EMA_LONG, EMA_FAST_SCALE, EMA_SLOW_SCALE, MA_VOL,
+    RSI_PERIOD, RSI_AVG, RSI_BAND_WIDTH, COMPACT_CACHE, NUM_DAYS_QUOTE, _calculate_ta,
+)
+from mplfin_compact import COMPACT_DTYPE, PLOT_COLUMNS
+from mplfin_ta import LOSS_FLOOR, wilder_smooth, _first_valid
+
+OHLCV_KEY = ["Open", "High", "Low", "Close", "Volume"]
+TA_COLUMNS = ["w_p", "ema_fast", "ema_slow", "ema_long", "ema_fast_u", "ema_fast_d",
+    "ema_slow_u", "ema_slow_d", "vol_avg", "rsi", "rsi_avg", "rsi_u", "rsi_d", "rsi_signal"]
+
+class EwmState:
+    """ running ewm(span=span, adjust=True).mean(), same update as pandas
+    """
+    def __init__(self, span, weighted=np.nan, old_wt=1.0):
+        self.decay = 1 - 2 / (span + 1)
+        self.weighted = weighted
+        self.old_wt = old_wt
+
+    @classmethod
+    def from_series(cls, span, x, y):
+        """ state after input x (no interior NaN) whose ewm output is y
+        """
+        st = cls(span)
+        nobs = int(np.count_nonzero(~np.isnan(x)))
+        if nobs:
+            st.weighted = y[-1]
+            st.old_wt = (1 - st.decay**nobs) / (1 - st.decay)
+        return st
+
+    def update(self, x):
+        if np.isnan(self.weighted):
+            self.weighted = x
+        elif not np.isnan(x):
+            self.old_wt *= self.decay
+            self.weighted = (self.old_wt * self.weighted + x) / (self.old_wt + 1)
+            self.old_wt += 1
+        return self.weighted
+
+class TaState:
+    def __init__(self):
+        self.first_index = None
+        self.last_index = None
+        self.last_bar = None
+        self.n_bars = 0
+        self.last_w_p = np.nan
+        self.gain = self.loss = np.nan
+        self.ema = {}
+        self.prev = None   # state before the last bar, for a revised last bar
+
+    def copy(self):
+        # the EwmStates are the only mutable parts, much faster than deepcopy
+        st = copy.copy(self)
+        st.ema = {k: copy.copy(v) for k, v in self.ema.items()}
+        return st
+
+def _bar_at(df, i):
+    return np.array([df[k].values[i] for k in OHLCV_KEY], dtype=float)
+
+def _state_from_full(df, ta):
+    n = RSI_PERIOD
+    st = TaState()
+    st.first_index, st.last_index = df.index[0], df.index[-1]
+    st.last_bar = _bar_at(df, -1)
+    st.n_bars = len(df)
+    st.last_w_p = ta.w_p.values[-1]
+    hl = (ta.High - ta.Low).values
+    hl_fast = pd.Series(hl).ewm(span=EMA_FAST).mean().values
+    hl_slow = pd.Series(hl).ewm(span=EMA_SLOW).mean().values
+    for key, span, x, y in [
+            ("ema_fast", EMA_FAST, ta.w_p.values, ta.ema_fast.values),
+            ("ema_slow", EMA_SLOW, ta.w_p.values, ta.ema_slow.values),
+            ("ema_long", EMA_LONG, ta.w_p.values, ta.ema_long.values),
+            ("hl_fast", EMA_FAST, hl, hl_fast),
+            ("hl_slow", EMA_SLOW, hl, hl_slow),
+            ("vol_avg", MA_VOL, ta.Volume.values, ta.vol_avg.values),
+            ("rsi_avg", RSI_AVG, ta.rsi.values, ta.rsi_avg.values),
+        ]:
+        st.ema[key] = EwmState.from_series(span, x, y)
+
+    # Wilder averages, same kernel as mplfin_ta.wilder_rsi
+    w_p = ta.w_p.values
+    diff = np.diff(w_p, prepend=np.nan)
+    with np.errstate(invalid='ignore'):
+        gains = np.where(diff > 0, diff, 0.0)
+        losses = np.where(-diff > 0, -diff, LOSS_FLOOR)
+    start = _first_valid(w_p[:, None])
+    st.gain = wilder_smooth(gains, n, start=start)[-1]
+    st.loss = wilder_smooth(losses, n, start=start)[-1]
+    return st
+
+def _state_with_prev(df, ta, ohlcv):
+    """ _state_from_full with the state before the last bar, so a revised last bar
+    (in-progress intraday bar) right after a full recompute is stepped too
+    """
+    if len(df) < 2:
+        return _state_from_full(df, ta)
+    prev = _state_from_full(df.iloc[:-1], ta.iloc[:-1])
+    st = prev.copy()
+    _step(st, *ohlcv[-1])
+    st.last_index, st.last_bar, st.n_bars, st.prev = df.index[-1], ohlcv[-1], st.n_bars + 1, prev
+    return st
+
+def _step(st, o, h, l, c, v):
+    """ advance st by one OHLCV bar, return the TA row
+    """
+    row = {}
+    w_p = row["w_p"] = 0.25*(2*c + h + l)
+    ema_fast = row["ema_fast"] = st.ema["ema_fast"].update(w_p)
+    ema_slow = row["ema_slow"] = st.ema["ema_slow"].update(w_p)
+    row["ema_long"] = st.ema["ema_long"].update(w_p)
+    hl_fast = st.ema["hl_fast"].update(h - l)
+    row["ema_fast_u"] = ema_fast + 0.5*hl_fast * EMA_FAST_SCALE
+    row["ema_fast_d"] = ema_fast - 0.5*hl_fast * EMA_FAST_SCALE
+    hl_slow = st.ema["hl_slow"].update(h - l)
+    row["ema_slow_u"] = ema_slow + 0.5*hl_slow * EMA_SLOW_SCALE
+    row["ema_slow_d"] = ema_slow - 0.5*hl_slow * EMA_SLOW_SCALE
+    row["Volume"] = v / 1000000
+    row["vol_avg"] = st.ema["vol_avg"].update(row["Volume"])
+
+    n = RSI_PERIOD
+    diff = w_p - st.last_w_p
+    gain = diff if diff > 0 else 0.0
+    loss = -diff if -diff > 0 else LOSS_FLOOR
+    st.gain = gain/n + st.gain*(n-1)/n
+    st.loss = loss/n + st.loss*(n-1)/n
+    st.last_w_p = w_p
+    rsi = row["rsi"] = 100 - (100/(1 + st.gain/st.loss)) - 50
+    rsi_avg = row["rsi_avg"] = st.ema["rsi_avg"].update(rsi)
+    row["rsi_u"] = rsi_avg + RSI_BAND_WIDTH
+    row["rsi_d"] = rsi_avg - RSI_BAND_WIDTH
+    row["rsi_signal"] = rsi - rsi_avg
+    return row
+
+class TaBuffer:
+    """ TA rows kept in a growable float array, a DataFrame is built once per read
+    columns/dtype/max_rows: what is kept (all columns, float64, all rows by default)
+    """
+    def __init__(self, ta, columns=None, dtype=float, max_rows=None):
+        self.columns = ta.columns if columns is None else pd.Index([c for c in columns if c in ta.columns])
+        self.tz, self.name = ta.index.tz, ta.index.name
+        self.unit = getattr(ta.index.dtype, "unit", None) or np.datetime_data(ta.index.dtype)[0]
+        self.max_rows = max_rows
+        self.n = 0
+        self.values = np.empty((0, len(self.columns)), dtype=dtype)
+        self.index = np.empty(0, dtype="int64")
+        self.append(ta.index.asi8, ta[self.columns].values.astype(float))
+
+    def append(self, index_i8, values):
+        k = len(values)
+        if self.max_rows and self.n + k > 2 * self.max_rows:
+            # drop the rows nobody reads, at most once per max_rows appended bars
+            keep = max(0, self.max_rows - k)
+            self.values[:keep] = self.values[self.n-keep:self.n]
+            self.index[:keep] = self.index[self.n-keep:self.n]
+            self.n = keep
+            values, index_i8, k = values[-self.max_rows:], index_i8[-self.max_rows:], min(k, self.max_rows)
+        if self.n + k > len(self.values):
+            cap = max(64, 2 * (self.n + k))
+            if self.max_rows:
+                cap = min(cap, 2 * self.max_rows)
+            self.values = np.resize(self.values, (cap, len(self.columns)))
+            self.index = np.resize(self.index, cap)
+        self.values[self.n:self.n+k] = values
+        self.index[self.n:self.n+k] = index_i8
+        self.n += k
+
+    def trim(self, first_i8):
+        """ drop the rows before first_i8 (start of a moving window)
+        """
+        k = int(np.searchsorted(self.index[:self.n], first_i8))
+        if k:
+            self.values[:self.n-k] = self.values[k:self.n]
+            self.index[:self.n-k] = self.index[k:self.n]
+            self.n -= k
+
+    def nbytes(self):
+        return self.values.nbytes + self.index.nbytes
+
+    def frame(self):
+        start = max(0, self.n - self.max_rows) if self.max_rows else 0
+        index = pd.DatetimeIndex(self.index[start:self.n].view(f"M8[{self.unit}]"), name=self.name)
+        if self.tz is not None:
+            index = index.tz_localize("UTC").tz_convert(self.tz)
+        return pd.DataFrame(self.values[start:self.n].copy(), index=index, columns=self.columns)
+
+class TaEngine:
+    def __init__(self, compact=False):
+        self._lock = Lock()
+        self._cache = {}   # symbol -> (TaState, TaBuffer)
+        self._buffer_params = dict(columns=PLOT_COLUMNS, dtype=COMPACT_DTYPE, max_rows=NUM_DAYS_QUOTE) if compact else {}
+        self.stats = {"full": 0, "incremental": 0, "bars_stepped": 0}
+
+    def clear(self, symbol=None):
+        with self._lock:
+            if symbol is None:
+                self._cache.clear()
+            else:
+                self._cache.pop(symbol, None)
+
+    def update(self, symbol, df, sliding=False):
+        """ TA frame (same columns as _calculate_ta) for the quote history df
+        """
+        with self._lock:
+            return self._advance_locked(symbol, df, sliding).frame()
+
+    def advance(self, symbol, df, sliding=False):
+        """ update without building the TA frame (see last_rows)
+        """
+        with self._lock:
+            self._advance_locked(symbol, df, sliding)
+
+    def last_rows(self, symbols, columns, n=2):
+        """ (array n x symbols x columns, last bar time per symbol) as of the last update,
+        NaN / None where a symbol is not cached or has fewer rows
+        """
+        out = np.full((n, len(symbols), len(columns)), np.nan)
+        times = [None] * len(symbols)
+        indexers = {}   # the buffers share a few column layouts
+        with self._lock:
+            for j, symbol in enumerate(symbols):
+                cached = self._cache.get(symbol)
+                if cached is None or cached[1].n < n:
+                    continue
+                buf = cached[1]
+                layout = tuple(buf.columns)
+                if layout not in indexers:
+                    indexers[layout] = buf.columns.get_indexer(columns)
+                cols = indexers[layout]
+                rows = buf.values[buf.n-n:buf.n]
+                out[:, j] = np.where(cols >= 0, rows[:, cols], np.nan)
+                times[j] = pd.Timestamp(buf.index[buf.n-1], unit=buf.unit, tz=buf.tz)
+        return out, times
+
+    def _advance_locked(self, symbol, df, sliding=False):
+        # caller holds self._lock
+        cached = self._cache.get(symbol)
+        ohlcv = np.column_stack([df[k].values for k in OHLCV_KEY]).astype(float)   # once per update, column access adds up over a universe
+        resume = self._resume_row(cached, df, ohlcv, sliding)
+        if resume is None:
+            ta = _calculate_ta(df.copy())
+            st, buf = _state_with_prev(df, ta, ohlcv), TaBuffer(ta, **self._buffer_params)
+            self.stats["full"] += 1
+        else:
+            start, revised = resume
+            st, buf = cached
+            dropped = st.n_bars - start - revised
+            if dropped:
+                # moving window: n_bars counts the rows of the window
+                for s in (st, st.prev):
+                    if s is not None:
+                        s.first_index, s.n_bars = df.index[0], s.n_bars - dropped
+                buf.trim(df.index[0].as_unit(buf.unit).value)
+            if revised:
+                # last bar revised, resume from the state before it
+                st = st.prev.copy()
+                buf.n -= 1
+            self._advance(st, buf, df.iloc[start:], ohlcv[start:])
+            self.stats["incremental"] += 1
+        self._cache[symbol] = (st, buf)
+        return buf
+
+    def sizes(self):
+        """ {symbol: bytes held}
+        """
+        with self._lock:
+            return {symbol: buf.nbytes() for symbol, (_, buf) in self._cache.items()}
+
+    def _resume_row(self, cached, df, ohlcv, sliding=False):
+        """ (first row of df to step, last bar revised), None when a full recompute is needed
+        """
+        if cached is None or df.empty:
+            return None
+        st = cached[0]
+        n_bars = st.n_bars
+        if n_bars <= RSI_PERIOD + 1 or df.index[0] < st.first_index:
+            return None   # Wilder averages not seeded yet, or a longer history
+        if df.index[0] > st.first_index and not sliding:
+            return None
+        last = int(df.index.searchsorted(st.last_index))
+        if last == len(df) or df.index[last] != st.last_index:
+            return None
+        # same start: the last bar stays at its row, later start: it moved up
+        if (last < n_bars - 1) != (df.index[0] > st.first_index) or last > n_bars - 1:
+            return None
+        if np.array_equal(ohlcv[last], st.last_bar, equal_nan=True):
+            return last + 1, False
+        if st.prev is None or st.prev.n_bars <= RSI_PERIOD + 1:
+            return None
+        return last, True
+
+    def _advance(self, st, buf, new, bars):
+        if new.empty:
+            return
+        rows = []
+        for bar in bars:
+            st.prev = None
+            prev = st.copy()
+            rows.append(_step(st, *bar))
+            st.last_bar = bar
+            st.n_bars += 1
+            st.prev = prev
+        st.last_index = new.index[-1]
+        self.stats["bars_stepped"] += len(rows)
+        values = np.empty((len(rows), len(buf.columns)))
+        for j, col in enumerate(buf.columns):
+            if col in rows[0]:
+                values[:, j] = [row[col] for row in rows]
+            elif col in OHLCV_KEY:
+                values[:, j] = bars[:, OHLCV_KEY.index(col)]
+            else:
+                values[:, j] = new[col].values
+        buf.append(new.index.asi8, values)
+
+_engine = TaEngine(compact=COMPACT_CACHE)
+
+def get_ta_engine():
+    # one engine per process, shared by all sessions
+    return _engine
+
+##############################################
+## replay check
+##############################################
+if __name__ == '__main__':
+    from mplfin_quotes import synthetic_quotes
+    import time
+
+    quotes = synthetic_quotes("SPY", end_date="2024-06-28").tail(1200)
+    engine = TaEngine()
+    n0 = 300
+    engine.update("SPY", quotes.iloc[:n0])
+    rng = np.random.default_rng(0)
+    max_err, t_inc, t_full = 0.0, 0.0, 0.0
+    for k in range(n0 + 1, len(quotes) + 1):
+        df = quotes.iloc[:k].copy()
+        if rng.random() < 0.2:
+            # in-session bar: feed a provisional last bar first, then the final one
+            tmp = df.copy()
+            tmp.iloc[-1, tmp.columns.get_loc("Close")] *= 1.01
+            engine.update("SPY", tmp)
+        t0 = time.perf_counter()
+        ta_inc = engine.update("SPY", df)
+        t1 = time.perf_counter()
+        ta_full = _calculate_ta(df.copy())
+        t2 = time.perf_counter()
+        t_inc, t_full = t_inc + t1 - t0, t_full + t2 - t1
+        for col in TA_COLUMNS + ["Volume"]:
+            np.testing.assert_allclose(ta_inc[col].values, ta_full[col].values, rtol=1e-9, atol=1e-9, equal_nan=True, err_msg=col)
+            max_err = max(max_err, np.nanmax(np.abs(ta_inc[col].values - ta_full[col].values)))
+    n = len(quotes) - n0
+
+    # a window of fixed span moves once a day: recomputed, not resumed
+    n_full = engine.stats["full"]
+    for k in range(len(quotes) - 5, len(quotes) + 1):
+        window = quotes.iloc[k-n0:k]
+        np.testing.assert_allclose(engine.update("SPY", window).rsi.values, _calculate_ta(window.copy()).rsi.values, rtol=1e-12, equal_nan=True)
+    assert engine.stats["full"] == n_full + 6, engine.stats
+    print(f"replay ok: {n} bars, max abs diff {max_err:.2e}, stats {engine.stats}")
+    print(f"per bar: incremental {1e3*t_inc/n:.2f} ms, full recompute {1e3*t_full/n:.2f} ms")
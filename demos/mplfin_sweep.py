@@ -0,0 +1,193 @@
+"""
+Indicator parameter sweep for demo_mplfin.py (ETF parameter sweep page)
+
+RSI_PERIOD, RSI_AVG, EMA_FAST, EMA_SLOW and EMA_LONG are module
+constants in mplfin_core.py; this evaluates a grid of them over the ETF
+universe in one batched pass on the QuotePanel (dates x symbols):
+- strategy per setting: the rsi_signal positions of mplfin_backtest.py,
+  longs dropped while the EMA trend is down (fast < slow < long) and
+  shorts while it is up (see _trend in mplfin_panel.py)
+- shared intermediates: one EMA of w_p per distinct span, one RSI per
+  RSI_PERIOD, one rsi_signal + positions per (RSI_PERIOD, RSI_AVG), one
+  trend mask per (EMA_FAST, EMA_SLOW, EMA_LONG); the settings only
+  combine them
+- every setting is scored from the same first bar (after the longest
+  RSI_PERIOD of the grid), stats in chunks of CHUNK settings (k x bars x symbols)
+
+results are cached per (panel, grid, backtest parameters), see get_sweep().
+best_by_sector() picks the best setting per sector, sector_scores() is the
+setting x sector matrix behind the heatmap.
+
+timing / shared vs per-setting check:
+    python mplfin_sweep.py
+"""
+from itertools import product
+import hashlib
+
+import altair as alt
+import numpy as np
+import pandas as pd
+
+from mplfin_backtest import COST_BPS, THRESHOLD, _stats, positions
+from mplfin_cache import LruCache
+from mplfin_core import EMA_FAST, EMA_SLOW, EMA_LONG, RSI_PERIOD, RSI_AVG
+from mplfin_ta import _first_valid, ewm_mean, wilder_rsi
+
+PARAMS = ["RSI_PERIOD", "RSI_AVG", "EMA_FAST", "EMA_SLOW", "EMA_LONG"]
+DEFAULT_GRID = {
+    "RSI_PERIOD": [14, 50, 100, 150],
+    "RSI_AVG": [10, 25, 50],
+    "EMA_FAST": [10, 15, 20],
+    "EMA_SLOW": [30, 50, 100],
+    "EMA_LONG": [100, 150, 200],
+}
+CURRENT = dict(RSI_PERIOD=RSI_PERIOD, RSI_AVG=RSI_AVG, EMA_FAST=EMA_FAST, EMA_SLOW=EMA_SLOW, EMA_LONG=EMA_LONG)
+METRICS = ["Sharpe", "Return(%)", "Max DD(%)", "Hit rate(%)"]
+CHUNK = 32
+MAX_SWEEP_ENTRIES = 20
+
+def settings(grid):
+    """ valid settings of grid (EMA_FAST < EMA_SLOW < EMA_LONG)
+    """
+    return [dict(zip(PARAMS, v)) for v in product(*(sorted(set(grid[p])) for p in PARAMS))
+            if v[2] < v[3] < v[4]]
+
+def run_sweep(panel, grid=DEFAULT_GRID, mode="long_flat", threshold=THRESHOLD, cost_bps=COST_BPS):
+    """ {metric: dataframe settings x symbols}
+    """
+    combos = settings(grid)
+    if not combos:
+        raise ValueError("no valid setting in the grid (needs EMA_FAST < EMA_SLOW < EMA_LONG)")
+    # indicators on each symbol's own bars (see panel_ta), signals and trend on the dates
+    high, low, close = (panel.bars(panel[c]) for c in ["High", "Low", "Close"])
+    w_p = 0.25*(2*close + high + low)
+
+    # shared intermediates
+    ema = {span: ewm_mean(w_p, span) for span in {c[p] for c in combos for p in ["EMA_FAST", "EMA_SLOW", "EMA_LONG"]}}
+    rsi = {n: wilder_rsi(w_p, n) - 50 for n in {c["RSI_PERIOD"] for c in combos}}
+    signal_pos = {}
+    for n, avg in {(c["RSI_PERIOD"], c["RSI_AVG"]) for c in combos}:
+        signal_pos[n, avg] = positions(panel.expand(rsi[n] - ewm_mean(rsi[n], avg)), threshold, mode)
+    trend = {}
+    for f, s, l in {(c["EMA_FAST"], c["EMA_SLOW"], c["EMA_LONG"]) for c in combos}:
+        up = (ema[f] > ema[s]) & (ema[s] > ema[l])
+        down = (ema[f] < ema[s]) & (ema[s] < ema[l])
+        trend[f, s, l] = panel.expand(up.astype(float)) == 1, panel.expand(down.astype(float)) == 1
+
+    # same scored bars for every setting
+    live = np.arange(len(close))[:, None] >= _first_valid(close) + max(rsi) + 1
+    live = panel.expand(live.astype(float)) == 1
+    live = pd.DataFrame(np.where(live, 1.0, np.nan)).ffill().values == 1   # held over missing bars
+    close = panel["Close"]
+    signal = np.where(live, 0.0, np.nan)   # buy & hold window of _stats
+
+    out = {m: np.empty((len(combos), len(panel))) for m in METRICS}
+    for b in range(0, len(combos), CHUNK):
+        chunk = combos[b:b+CHUNK]
+        pos = np.empty((len(chunk),) + close.shape)
+        for i, c in enumerate(chunk):
+            p = signal_pos[c["RSI_PERIOD"], c["RSI_AVG"]]
+            up, down = trend[c["EMA_FAST"], c["EMA_SLOW"], c["EMA_LONG"]]
+            pos[i] = np.where(((p > 0) & down) | ((p < 0) & up) | ~live, 0.0, p)
+        stats, _ = _stats(close, signal, pos, cost_bps)
+        for m in METRICS:
+            out[m][b:b+len(chunk)] = stats[m]
+    index = pd.MultiIndex.from_frame(pd.DataFrame(combos, columns=PARAMS))
+    return {m: pd.DataFrame(v, index=index, columns=panel.symbols) for m, v in out.items()}
+
+def sweep_key(panel, grid, **backtest_params):
+    key = repr((panel.symbols, [str(d) for d in panel.last_dates], panel.n_bars.tolist(),
+                panel["Close"][-1].tobytes().hex(), sorted((p, sorted(v)) for p, v in grid.items()),
+                sorted(backtest_params.items())))
+    return hashlib.sha1(key.encode()).hexdigest()
+
+_sweep_cache = LruCache(MAX_SWEEP_ENTRIES)
+
+def get_sweep(panel, grid=DEFAULT_GRID, **backtest_params):
+    """ run_sweep, cached by sweep_key; returns (results, cache_hit)
+    """
+    key = sweep_key(panel, grid, **backtest_params)
+    results = _sweep_cache.get(key)
+    if results is not None:
+        return results, True
+    results = run_sweep(panel, grid, **backtest_params)
+    _sweep_cache.put(key, results)
+    return results, False
+
+def sector_scores(results, sector, metric="Sharpe"):
+    """ mean metric per setting (rows) and sector (columns)
+    """
+    df = results[metric]
+    return df.T.groupby(df.columns.map(sector)).mean().T
+
+def best_by_sector(results, sector, metric="Sharpe"):
+    """ best setting per sector, with the score of the current settings (mplfin_core.py)
+    """
+    scores = sector_scores(results, sector, metric)
+    current = tuple(CURRENT[p] for p in PARAMS)
+    rows = []
+    for sect in scores.columns:
+        best = scores[sect].idxmax()
+        rows.append({"Sector": sect, **dict(zip(PARAMS, best)), metric: scores.at[best, sect],
+                     f"{metric} current": scores.at[current, sect] if current in scores.index else np.nan})
+    return pd.DataFrame(rows).set_index("Sector").sort_values(metric, ascending=False)
+
+def setting_label(values):
+    return "RSI {}/{} EMA {}/{}/{}".format(*values)
+
+def heatmap_chart(results, sector, metric="Sharpe", top=25):
+    """ settings (the top settings by universe mean) x sectors, colored by metric
+    """
+    scores = sector_scores(results, sector, metric)
+    order = results[metric].mean(axis=1).sort_values(ascending=False).index[:top]
+    df = scores.loc[order].copy()
+    df.index = [setting_label(v) for v in order]
+    df = df.reset_index(names="Setting").melt(id_vars="Setting", var_name="Sector", value_name=metric)
+    best = scores.idxmax()
+    df["Best"] = [setting_label(best[s]) == setting for s, setting in zip(df["Sector"], df["Setting"])]
+    base = alt.Chart(df).encode(alt.X("Setting:N", sort=list(df["Setting"].unique()), title=None),
+                                alt.Y("Sector:N", title=None))
+    rect = base.mark_rect().encode(alt.Color(f"{metric}:Q", scale=alt.Scale(scheme="redyellowgreen", domainMid=0)),
+                                   tooltip=["Sector", "Setting", alt.Tooltip(f"{metric}:Q", format=".2f")])
+    marks = base.transform_filter("datum.Best").mark_text(text="*", fontSize=16)
+    return (rect + marks).properties(height=30*df["Sector"].nunique())
+
+##############################################
+## timing / check
+##############################################
+if __name__ == '__main__':
+    import time
+    from mplfin_panel import QuotePanel, panel_ta
+    from mplfin_quotes import synthetic_quotes
+
+    symbols = [f"ETF{i:02d}" for i in range(80)]
+    quotes = {s: synthetic_quotes(s, end_date="2024-06-28").tail(1300) for s in symbols}
+    panel = QuotePanel(quotes)
+    t0 = time.perf_counter()
+    results, hit = get_sweep(panel)
+    elapsed = time.perf_counter() - t0
+    assert not hit and get_sweep(panel)[1]
+
+    # a setting scored in a smaller grid (same longest RSI_PERIOD, so same scored bars) agrees
+    grid = {"RSI_PERIOD": [50, 150], "RSI_AVG": [25], "EMA_FAST": [15], "EMA_SLOW": [50], "EMA_LONG": [150]}
+    small = run_sweep(panel, grid)
+    setting = (50, 25, 15, 50, 150)
+    for m in METRICS:
+        np.testing.assert_allclose(small[m].loc[setting].values, results[m].loc[setting].values, equal_nan=True)
+    # the shared rsi_signal is the panel_ta one for the current settings
+    ta = panel_ta(panel)
+    rsi = wilder_rsi(ta["w_p"], RSI_PERIOD) - 50
+    np.testing.assert_allclose(rsi - ewm_mean(rsi, RSI_AVG), ta["rsi_signal"], equal_nan=True)
+    assert CURRENT["RSI_PERIOD"] in DEFAULT_GRID["RSI_PERIOD"]
+    try:
+        run_sweep(panel, dict(grid, EMA_LONG=[20]))
+        raise AssertionError("empty grid accepted")
+    except ValueError:
+        pass
+
+    sector = {s: f"sector{i % 6}" for i, s in enumerate(symbols)}
+    print(best_by_sector(results, sector).round(2))
+    heatmap_chart(results, sector).to_dict()
+    n = len(settings(DEFAULT_GRID))
+    print(f"sweep ok: {n} settings x {len(symbols)} symbols x {len(panel['Close'])} bars in {elapsed:.2f} sec "
+          f"({1e3*elapsed/n:.1f} ms per setting)")
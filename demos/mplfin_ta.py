@@ -0,0 +1,154 @@
+"""
+Vectorized TA kernels for demo_mplfin.py / demo_chart.py
+
+Wilder smoothing is the recursive filter
+    y[n] = mean(x[:n]),  y[i] = x[i]/n + y[i-1]*(n-1)/n
+evaluated here in closed form, block by block, with numpy:
+    y[k] = m^k * (y[0] + a * cumsum(m^-j * x[j]))
+blocks are short enough that m^-k stays far from overflow.
+Inputs may be 1-D (dates) or 2-D (dates x symbols); in 2-D every column
+is seeded from its own first valid price (leading NaN = not listed yet).
+
+parity check + benchmark against the original loop:
+    python mplfin_ta.py
+"""
+import time
+
+import numpy as np
+import pandas as pd
+
+LOSS_FLOOR = 1e-10  # we don't want divide by zero/NaN
+MAX_LOG_RANGE = 40   # keep m^-k below e^40 inside one block
+
+def _first_valid(a):
+    """ index of first non-NaN row per column (len(a) if none)
+    """
+    valid = ~np.isnan(a)
+    return np.where(valid.any(axis=0), valid.argmax(axis=0), len(a))
+
+def ewm_filter(x, alpha, y0=0.0):
+    """ y[i] = alpha*x[i] + (1-alpha)*y[i-1] along axis 0, y[-1] = y0
+    same as ewm(alpha=alpha, adjust=False) seeded with y0, x must not contain NaN
+    """
+    m = 1 - alpha
+    if m <= 0:
+        return np.array(x, dtype=float)
+    block = max(1, int(MAX_LOG_RANGE / -np.log(m)))
+    y = np.empty_like(x, dtype=float)
+    prev = np.broadcast_to(np.asarray(y0, dtype=float), x.shape[1:]).copy()
+    for b in range(0, len(x), block):
+        xb = x[b:b+block]
+        k = np.arange(1, len(xb)+1).reshape((-1,) + (1,)*(x.ndim-1))
+        yb = m**k * (prev + alpha * np.cumsum(xb * m**-k, axis=0))
+        y[b:b+block] = yb
+        prev = yb[-1]
+    return y
+
+def ewm_mean(x, span):
+    """ ewm(span=span, adjust=True).mean() along axis 0 of x (1-D or 2-D),
+    NaN handled like pandas (ignore_na=False): NaN before the first valid value,
+    previous mean carried over a NaN while its weight keeps decaying
+    """
+    x = np.asarray(x, dtype=float)
+    valid = ~np.isnan(x)
+    alpha = 2 / (span + 1)
+    num = ewm_filter(np.where(valid, x, 0.0), alpha)
+    den = ewm_filter(valid.astype(float), alpha)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return np.where(den > 0, num / den, np.nan)
+
+def wilder_smooth(x, n, start=None):
+    """ Wilder smoothing of x (1-D or 2-D), NaN before start+n
+    start: first row of each column to use (default 0)
+    """
+    x = np.asarray(x, dtype=float)
+    is_1d = x.ndim == 1
+    x2 = x.reshape(len(x), -1)
+    n_rows, n_cols = x2.shape
+    start = np.zeros(n_cols, dtype=int) if start is None else np.broadcast_to(start, (n_cols,))
+
+    # zeros before the seed row and seed*n at the seed row make the plain
+    # filter (started from 0) land exactly on y[seed_row] = seed
+    rows = np.arange(n_rows)[:, None]
+    seed_row = start + n
+    z = np.where(rows > seed_row, np.nan_to_num(x2), 0.0)
+    cols = np.flatnonzero(seed_row < n_rows)
+    if len(cols):
+        csum = np.vstack([np.zeros(n_cols), np.nancumsum(x2, axis=0)])
+        z[seed_row[cols], cols] = (csum[seed_row[cols], cols] - csum[start[cols], cols])
+    y = ewm_filter(z, 1/n)
+    y[rows < seed_row] = np.nan
+    return y[:, 0] if is_1d else y
+
+def wilder_rsi(prices, n):
+    """ standard 0..100 RSI of prices (1-D or 2-D) with Wilder smoothing over n bars
+    """
+    prices = np.asarray(prices, dtype=float)
+    p2 = prices.reshape(len(prices), -1)
+    start = _first_valid(p2)
+    diff = np.diff(p2, axis=0, prepend=np.nan)
+    with np.errstate(invalid='ignore'):
+        gains = np.where(diff > 0, diff, 0.0)
+        losses = np.where(-diff > 0, -diff, LOSS_FLOOR)
+    g = wilder_smooth(gains, n, start=start)
+    l = wilder_smooth(losses, n, start=start)
+    rsi = 100 - (100/(1 + g/l))
+    return rsi[:, 0] if prices.ndim == 1 else rsi
+
+##############################################
+## parity check / benchmark
+##############################################
+def _rsi_loop(prices, n):
+    # original python-loop implementation (demo_chart._RSI), kept as reference
+    diff = pd.Series(prices).diff().values
+    gains = diff
+    losses = -diff
+    with np.errstate(invalid='ignore'):
+        gains[(gains<0)|np.isnan(gains)] = 0.0
+        losses[(losses<=0)|np.isnan(losses)] = LOSS_FLOOR
+    m = (n-1) / n
+    ni = 1 / n
+    g = gains[n] = np.nanmean(gains[:n])
+    l = losses[n] = np.nanmean(losses[:n])
+    gains[:n] = losses[:n] = np.nan
+    for i,v in enumerate(gains[n:],n):
+        g = gains[i] = ni*v + m*g
+    for i,v in enumerate(losses[n:],n):
+        l = losses[i] = ni*v + m*l
+    rs = gains / losses
+    return 100 - (100/(1+rs))
+
+def _check_parity(num_days, n, n_symbols=20, seed=0):
+    rng = np.random.default_rng(seed)
+    prices = 100 * np.exp(np.cumsum(rng.normal(0, 0.01, (num_days, n_symbols)), axis=0))
+    # stagger listing dates in the panel
+    for j in range(1, n_symbols, 3):
+        prices[:j*5, j] = np.nan
+    panel = wilder_rsi(prices, n)
+    for j in range(n_symbols):
+        s = _first_valid(prices[:, [j]])[0]
+        ref = np.full(num_days, np.nan)
+        ref[s:] = _rsi_loop(prices[s:, j], n)
+        np.testing.assert_allclose(panel[:, j], ref, rtol=1e-10, atol=1e-10)
+        np.testing.assert_allclose(wilder_rsi(prices[s:, j], n), ref[s:], rtol=1e-10, atol=1e-10)
+    return prices
+
+def _bench(fn, repeat=5):
+    t = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        t.append(time.perf_counter() - t0)
+    return min(t)
+
+if __name__ == '__main__':
+    for num_days, label in [(450, "450 days"), (2520, "10 years")]:
+        for n in (14, 100, 150):
+            prices = _check_parity(num_days, n)
+        p1 = prices[:, 0]
+        t_loop = _bench(lambda: _rsi_loop(p1, 100))
+        t_vec = _bench(lambda: wilder_rsi(p1, 100))
+        t_loop_panel = _bench(lambda: [_rsi_loop(prices[:, j], 100) for j in range(prices.shape[1])], repeat=2)
+        t_vec_panel = _bench(lambda: wilder_rsi(prices, 100))
+        print(f"{label:>9}: parity ok | 1 symbol loop {1e3*t_loop:7.2f} ms  vectorized {1e3*t_vec:6.2f} ms  ({t_loop/t_vec:5.1f}x)"
+              f" | {prices.shape[1]} symbols loop {1e3*t_loop_panel:7.2f} ms  vectorized {1e3*t_vec_panel:6.2f} ms  ({t_loop_panel/t_vec_panel:5.1f}x)")
@@ -0,0 +1,75 @@
+"""
+Background loop thread for demo_mplfin.py (chart janitor, intraday poller, alert scanner)
+
+PeriodicThread runs step() every next_wait() seconds until stop(),
+wake() runs it right away. A failing step() goes to on_error() and the
+loop goes on.
+
+the events are not called _stop: threading.Thread has a private _stop()
+that join() and is_alive() call (and the fork handler of every
+ProcessPoolExecutor worker, through _after_fork)
+
+    python mplfin_worker.py      # wake / stop / join check
+"""
+from threading import Event, Thread
+
+class PeriodicThread(Thread):
+    def __init__(self, name, interval):
+        super().__init__(name=name, daemon=True)
+        self.interval = interval
+        self._wake_event, self._stop_event = Event(), Event()
+
+    def step(self):
+        raise NotImplementedError
+
+    def on_error(self, e):
+        print(f"{self.name}: {e}")
+
+    def next_wait(self):
+        """ seconds until the next step
+        """
+        return self.interval
+
+    def wake(self):
+        self._wake_event.set()
+
+    def stop(self):
+        self._stop_event.set()
+        self._wake_event.set()
+
+    def stopped(self):
+        return self._stop_event.is_set()
+
+    def run(self):
+        while not self._stop_event.is_set():
+            try:
+                self.step()
+            except Exception as e:
+                self.on_error(e)
+            self._wake_event.wait(self.next_wait())
+            self._wake_event.clear()
+
+##############################################
+## check
+##############################################
+if __name__ == '__main__':
+    import time
+
+    class Counter(PeriodicThread):
+        steps = 0
+        def step(self):
+            self.steps += 1
+            if self.steps == 2:
+                raise ValueError("second step fails")
+
+    t = Counter("counter", interval=3600)
+    t.start()
+    time.sleep(0.1)
+    assert t.steps == 1 and t.is_alive()
+    t.wake()
+    time.sleep(0.1)
+    assert t.steps == 2 and t.is_alive()   # the failed step did not end the loop
+    t.stop()
+    t.join(timeout=5)
+    assert not t.is_alive() and t.stopped()
+    print(f"periodic thread ok: {t.steps} steps, joined")